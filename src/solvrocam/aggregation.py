@@ -0,0 +1,109 @@
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import numpy.typing as npt
+
+
+@dataclass
+class _Window:
+    seconds: float
+    # Sequence number of the oldest sample still inside the window
+    tail: int
+    # Number of samples in the window per people count
+    histogram: npt.NDArray[np.int64]
+
+
+class OccupancyAggregator:
+    """Rolling statistics of people counts over several time windows.
+
+    Samples live in a fixed size ring buffer shared by all windows. Each window
+    keeps a histogram of the counts it currently covers, updated as samples
+    enter and expire, so medians, percentiles and maxima never rescan the
+    samples. Counts above `max_count` are clipped.
+    """
+
+    def __init__(
+        self,
+        windows: dict[str, float],
+        capacity: int = 1 << 17,
+        max_count: int = 255,
+    ):
+        self._capacity = capacity
+        self._max_count = max_count
+        self._timestamps = np.zeros(capacity, dtype=np.float64)
+        self._counts = np.zeros(capacity, dtype=np.uint8)
+        # Total number of samples ever added, the next sequence number
+        self._head = 0
+        self._windows = {
+            name: _Window(seconds, 0, np.zeros(max_count + 1, dtype=np.int64))
+            for name, seconds in windows.items()
+        }
+
+    def add(self, count: int, timestamp: float | None = None) -> None:
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        count = min(max(count, 0), self._max_count)
+
+        # The slot about to be overwritten leaves every window still holding it
+        oldest = self._head - self._capacity
+        if oldest >= 0:
+            for window in self._windows.values():
+                if window.tail <= oldest:
+                    self._evict(window)
+
+        index = self._head % self._capacity
+        self._timestamps[index] = timestamp
+        self._counts[index] = count
+        self._head += 1
+
+        for window in self._windows.values():
+            window.histogram[count] += 1
+            cutoff = timestamp - window.seconds
+            while (
+                window.tail < self._head
+                and self._timestamps[window.tail % self._capacity] <= cutoff
+            ):
+                self._evict(window)
+
+    def _evict(self, window: _Window) -> None:
+        window.histogram[self._counts[window.tail % self._capacity]] -= 1
+        window.tail += 1
+
+    @property
+    def windows(self) -> tuple[str, ...]:
+        return tuple(self._windows)
+
+    @property
+    def last(self) -> int | None:
+        if self._head == 0:
+            return None
+        return int(self._counts[(self._head - 1) % self._capacity])
+
+    def percentile(self, window: str, q: float) -> float | None:
+        """Linearly interpolated percentile, matching `np.percentile`."""
+        cumulative = np.cumsum(self._windows[window].histogram)
+        total = int(cumulative[-1])
+        if total == 0:
+            return None
+
+        position = q / 100 * (total - 1)
+        lower = int(np.floor(position))
+        upper = int(np.ceil(position))
+        lower_value, upper_value = np.searchsorted(
+            cumulative, [lower, upper], side="right"
+        )
+        return float(lower_value + (upper_value - lower_value) * (position - lower))
+
+    def median(self, window: str) -> float | None:
+        return self.percentile(window, 50)
+
+    def max(self, window: str) -> int | None:
+        present = np.flatnonzero(self._windows[window].histogram)
+        return int(present[-1]) if present.size > 0 else None
+
+    def mean(self, window: str) -> float | None:
+        histogram = self._windows[window].histogram
+        total = histogram.sum()
+        if total == 0:
+            return None
+        return float((histogram * np.arange(histogram.size)).sum() / total)
@@ -0,0 +1,170 @@
+import json
+import logging
+import time
+from pathlib import Path
+
+import typer
+from typing_extensions import Annotated
+
+from solvrocam.logs import setup_logging
+from solvrocam.person_trackers.person_tracker import TrackerBackend, create_tracker
+from solvrocam.preview import NullPreview
+from solvrocam.profiling import StageTimer, peak_rss_mb
+from solvrocam.sources import open_source
+
+app = typer.Typer()
+
+
+@app.command()
+def bench(
+    path: Annotated[
+        Path,
+        typer.Argument(
+            exists=True,
+            file_okay=True,
+            dir_okay=True,
+            readable=True,
+            help="Path to a video file, a directory of frames or a recording",
+        ),
+    ],
+    json_output: Annotated[
+        Path | None,
+        typer.Option(
+            "--json",
+            "-j",
+            writable=True,
+            help="Write the benchmark report to a JSON file",
+        ),
+    ] = None,
+    tracker: Annotated[
+        TrackerBackend,
+        typer.Option(
+            "--tracker",
+            "-t",
+            case_sensitive=False,
+            envvar="PERSON_TRACKER",
+            help="Person tracker implementation",
+        ),
+    ] = TrackerBackend.ULTRALYTICS,
+    limit: Annotated[
+        int | None,
+        typer.Option("--limit", "-n", help="Process at most this many frames"),
+    ] = None,
+    warmup: Annotated[
+        int,
+        typer.Option(help="Frames processed before measurements start"),
+    ] = 5,
+    annotate: Annotated[
+        bool,
+        typer.Option(help="Render the annotated preview frame for every frame"),
+    ] = True,
+    pipelined: Annotated[
+        bool,
+        typer.Option(help="Overlap preprocessing, inference and tracking"),
+    ] = False,
+    motion_gate: Annotated[
+        bool,
+        typer.Option(help="Skip detection on static frames like the camera service"),
+    ] = False,
+    encode: Annotated[
+        bool,
+        typer.Option(help="JPEG encode every processed frame"),
+    ] = True,
+    ping: Annotated[
+        bool,
+        typer.Option(help="Ping the core at CORE_URL like the camera service does"),
+    ] = False,
+):
+    """
+    Benchmark the processing pipeline on recorded footage.
+    """
+    logger = logging.getLogger(__name__)
+    setup_logging(logger)
+
+    # lazy import to improve cli responsiveness, these imports take 1s
+    from solvrocam.detection import Solvrocam
+
+    solvrocam = Solvrocam(NullPreview(), create_tracker(tracker), logger)
+    if not motion_gate:
+        solvrocam.motion_gate = None
+    profiler = StageTimer()
+
+    try:
+        source = open_source(str(path))
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+    solvrocam.frame_format = source.frame_format
+
+    def processed_frames():
+        frames = iter(source)
+        if pipelined:
+            yield from solvrocam.process_stream(frames)
+        else:
+            for frame in frames:
+                solvrocam.process_frame(frame)
+                yield
+
+    annotated_frame = None
+    processed = 0
+    wall_start = frame_start = time.perf_counter()
+    for index, _ in enumerate(processed_frames()):
+        if index == warmup:
+            # Measure only after the model has been loaded and warmed up
+            solvrocam.profiler = profiler
+            wall_start = frame_start
+
+        if annotate:
+            with solvrocam._stage("annotate"):
+                annotated_frame = solvrocam.tracking_result.annotate(annotated_frame)
+        if encode:
+            solvrocam._encode_image(solvrocam._still_frame())
+        if ping:
+            with solvrocam._stage("ping"):
+                solvrocam.ping()
+
+        # Includes reading the frame, which overlaps with detection when pipelined
+        now = time.perf_counter()
+        if solvrocam.profiler is not None:
+            profiler.record("frame", now - frame_start)
+            processed += 1
+            if limit is not None and processed >= limit:
+                break
+        frame_start = now
+    wall_time = time.perf_counter() - wall_start
+
+    if processed == 0:
+        typer.echo(f"No frames processed after {warmup} warmup frames", err=True)
+        raise typer.Exit(code=1)
+
+    stages = profiler.summary()
+    report = {
+        "source": str(path),
+        "frames": processed,
+        "warmup": warmup,
+        "fps": processed / (stages["frame"]["total"] / 1000),
+        "wall_fps": processed / wall_time,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": stages,
+    }
+
+    typer.echo(
+        f"{'stage':<22}{'count':>7}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}"
+    )
+    for stage, stats in stages.items():
+        typer.echo(
+            f"{stage:<22}{stats['count']:>7}{stats['mean']:>10.2f}"
+            f"{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['p99']:>10.2f}"
+        )
+    typer.echo(
+        f"{processed} frames, {report['fps']:.2f} fps "
+        f"({report['wall_fps']:.2f} fps wall), "
+        f"peak RSS {report['peak_rss_mb']:.1f} MB"
+    )
+
+    if json_output:
+        json_output.write_text(json.dumps(report, indent=2) + "\n")
+        typer.echo(f"Report written to {json_output}")
+
+
+if __name__ == "__main__":
+    app()
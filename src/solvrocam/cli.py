@@ -1,7 +1,12 @@
 import typer
 
+from solvrocam.bench import app as bench
+from solvrocam.clips import app as clips
 from solvrocam.file import app as file
+from solvrocam.history import app as history
 from solvrocam.preview import app as preview
+from solvrocam.replay import app as replay
+from solvrocam.tuning import app as tune
 
 app = typer.Typer()
 
@@ -13,7 +18,12 @@ except ImportError:
     pass
 
 app.add_typer(file)
+app.add_typer(bench)
+app.add_typer(replay)
+app.add_typer(tune)
 app.add_typer(preview, name="preview")
+app.add_typer(clips, name="clips")
+app.add_typer(history, name="history")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,378 @@
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable, Iterator
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+import typer
+from typing_extensions import Annotated
+
+from solvrocam.framebuffer import FrameRing
+from solvrocam.occupancy import OccupancyChange, OccupancyEvent
+from solvrocam.snapshot import SnapshotEncoder
+
+MAGIC = 0x534F4C56434C4950  # "SOLVCLIP"
+VERSION = 1
+
+# Header fields, int64 each
+_MAGIC, _VERSION, _CAPACITY, _MAX_FRAMES, _MAX_EVENTS = range(5)
+_FRAMES, _EVENTS, _HEAD, _VALID_FROM = range(5, 9)
+HEADER_FIELDS = 16
+
+FRAME_ENTRY = np.dtype(
+    [("seq", "<i8"), ("timestamp", "<f8"), ("offset", "<i8"), ("length", "<i8")]
+)
+EVENT_ENTRY = np.dtype(
+    [("seq", "<i8"), ("timestamp", "<f8"), ("event", "<i8"), ("count", "<i8")]
+)
+EVENTS = list(OccupancyEvent)
+
+
+def default_clip_path() -> Path | None:
+    clips = os.getenv("CLIP_BUFFER")
+    if clips:
+        return Path(clips)
+    if os.path.exists("/home/solvrocam/"):
+        return Path("/home/solvrocam/hardware-solvro-bot-office-cam/clips.bin")
+    return None
+
+
+class ClipRing:
+    """JPEG frames of the last minutes in a memory-mapped file of bounded size.
+
+    The file holds a header, a ring of frame entries, a ring of occupancy
+    events and `capacity` bytes of JPEG data written around in a circle, the
+    oldest frames are overwritten first. One process writes, any number can
+    read along. Readers copy a frame and then check it wasn't overwritten
+    meanwhile, so they never need a lock. Wall-clock timestamps are stored so
+    clips can be found by the time of day, and the file survives restarts.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        capacity: int = 64 * 1024 * 1024,
+        max_frames: int | None = None,
+        max_events: int = 1024,
+        readonly: bool = False,
+    ):
+        self.path = path
+        if readonly:
+            self._open(np.memmap(path, dtype=np.uint8, mode="r"))
+            if self._header[_MAGIC] != MAGIC or self._header[_VERSION] != VERSION:
+                raise ValueError(f"Not a clip buffer: {path}")
+            return
+
+        # A JPEG of a small frame is rarely under 4 kB
+        max_frames = max_frames or capacity // 4096
+        size = (
+            HEADER_FIELDS * 8
+            + max_frames * FRAME_ENTRY.itemsize
+            + max_events * EVENT_ENTRY.itemsize
+            + capacity
+        )
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists() and path.stat().st_size == size:
+            self._open(np.memmap(path, dtype=np.uint8, mode="r+"))
+            header = self._header
+            if (
+                header[_MAGIC] == MAGIC
+                and header[_VERSION] == VERSION
+                and (header[_CAPACITY], header[_MAX_FRAMES], header[_MAX_EVENTS])
+                == (capacity, max_frames, max_events)
+            ):
+                return
+        memory = np.memmap(path, dtype=np.uint8, mode="w+", shape=(size,))
+        header = memory[: HEADER_FIELDS * 8].view("<i8")
+        header[:] = 0
+        header[[_CAPACITY, _MAX_FRAMES, _MAX_EVENTS]] = (
+            capacity,
+            max_frames,
+            max_events,
+        )
+        self._open(memory)
+        self._frames["seq"] = -1
+        self._events["seq"] = -1
+        self._header[_VERSION] = VERSION
+        self._header[_MAGIC] = MAGIC
+
+    def _open(self, memory: np.memmap) -> None:
+        self._memory = memory
+        self._header = memory[: HEADER_FIELDS * 8].view("<i8")
+        capacity, max_frames, max_events = (
+            int(value) for value in self._header[_CAPACITY : _MAX_EVENTS + 1]
+        )
+        start = HEADER_FIELDS * 8
+        end = start + max_frames * FRAME_ENTRY.itemsize
+        self._frames = memory[start:end].view(FRAME_ENTRY)
+        start, end = end, end + max_events * EVENT_ENTRY.itemsize
+        self._events = memory[start:end].view(EVENT_ENTRY)
+        self._data = memory[end : end + capacity]
+        self.capacity = capacity
+
+    def write(self, jpeg: bytes, timestamp: float) -> None:
+        length = len(jpeg)
+        if length > self.capacity:
+            raise ValueError(f"Frame of {length} bytes doesn't fit the clip buffer")
+        header = self._header
+        head = int(header[_HEAD])
+        # Readers drop frames before this before any of their bytes change
+        header[_VALID_FROM] = max(head + length - self.capacity, 0)
+
+        start = head % self.capacity
+        first = min(length, self.capacity - start)
+        data = np.frombuffer(jpeg, dtype=np.uint8)
+        self._data[start : start + first] = data[:first]
+        self._data[: length - first] = data[first:]
+
+        seq = int(header[_FRAMES])
+        self._frames[seq % len(self._frames)] = (seq, timestamp, head, length)
+        header[_HEAD] = head + length
+        header[_FRAMES] = seq + 1
+
+    def mark(self, change: OccupancyChange, timestamp: float) -> None:
+        seq = int(self._header[_EVENTS])
+        self._events[seq % len(self._events)] = (
+            seq,
+            timestamp,
+            EVENTS.index(change.event),
+            change.count,
+        )
+        self._header[_EVENTS] = seq + 1
+
+    def frames(
+        self, start: float = 0.0, end: float = float("inf")
+    ) -> Iterator[tuple[float, bytes]]:
+        """Yields the timestamps and JPEGs of the frames still in the buffer."""
+        written = int(self._header[_FRAMES])
+        for seq in range(max(written - len(self._frames), 0), written):
+            entry = self._frames[seq % len(self._frames)].copy()
+            if entry["seq"] != seq or not start <= entry["timestamp"] <= end:
+                continue
+            offset, length = int(entry["offset"]), int(entry["length"])
+            position = offset % self.capacity
+            first = min(length, self.capacity - position)
+            jpeg = (
+                self._data[position : position + first].tobytes()
+                + self._data[: length - first].tobytes()
+            )
+            # The writer may have lapped this frame while it was being copied
+            if offset < self._header[_VALID_FROM]:
+                continue
+            yield float(entry["timestamp"]), jpeg
+
+    def events(self) -> list[tuple[float, OccupancyEvent, int]]:
+        """Occupancy events still in the buffer, oldest first."""
+        written = int(self._header[_EVENTS])
+        events = []
+        for seq in range(max(written - len(self._events), 0), written):
+            entry = self._events[seq % len(self._events)].copy()
+            if entry["seq"] == seq:
+                events.append(
+                    (
+                        float(entry["timestamp"]),
+                        EVENTS[int(entry["event"])],
+                        int(entry["count"]),
+                    )
+                )
+        return events
+
+    @property
+    def span(self) -> tuple[float, float] | None:
+        """Timestamps of the oldest and the newest frame."""
+        frames = self._frames.copy()
+        frames = frames[
+            (frames["seq"] >= 0) & (frames["offset"] >= self._header[_VALID_FROM])
+        ]
+        if not len(frames):
+            return None
+        return float(frames["timestamp"].min()), float(frames["timestamp"].max())
+
+    def flush(self) -> None:
+        self._memory.flush()
+
+
+class ClipRecorder:
+    """Samples frames from the frame ring into a ClipRing on its own thread.
+
+    It reads along with the processing thread without consuming frames, so
+    detection does no extra work. Frames are taken at most `fps` times a
+    second, converted with `to_bgr` and encoded to `max_width`.
+    """
+
+    def __init__(
+        self,
+        ring: FrameRing,
+        clips: ClipRing,
+        to_bgr: Callable[[npt.NDArray[np.uint8]], npt.NDArray[np.uint8]],
+        logger: logging.Logger,
+        fps: float | None = None,
+        max_width: int | None = None,
+        quality: int = 70,
+    ):
+        self._ring = ring
+        self.clips = clips
+        self._to_bgr = to_bgr
+        self._logger = logger
+        self._fps = float(os.getenv("CLIP_FPS", "5")) if fps is None else fps
+        max_width = (
+            int(os.getenv("CLIP_WIDTH", "640")) if max_width is None else max_width
+        )
+        self._encoder = SnapshotEncoder(quality, max_width)
+
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def _worker(self) -> None:
+        seq = 0
+        next_at = 0.0
+        while not self._stopped.is_set():
+            frame = self._ring.get(after=seq, timeout=1, consume=False)
+            if frame is None:
+                continue
+            seq = frame.seq
+            try:
+                if frame.timestamp < next_at:
+                    continue
+                next_at = max(next_at + 1 / self._fps, frame.timestamp)
+                # Frame timestamps are monotonic, clips are looked up by wall clock
+                timestamp = time.time() - (time.monotonic() - frame.timestamp)
+                self.clips.write(
+                    self._encoder.encode(self._to_bgr(frame.array)), timestamp
+                )
+            except Exception as e:
+                self._logger.error(f"Failed to record clip frame: {e}")
+            finally:
+                self._ring.release(frame)
+
+    def mark(self, change: OccupancyChange) -> None:
+        self.clips.mark(change, time.time())
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stopped.set()
+        self._thread.join(timeout)
+        self.clips.flush()
+
+
+app = typer.Typer()
+
+
+def _open_clips(path: Path | None) -> ClipRing:
+    path = path or default_clip_path()
+    if path is None or not path.exists():
+        typer.echo("No clip buffer found, set CLIP_BUFFER", err=True)
+        raise typer.Exit(code=1)
+    try:
+        return ClipRing(path, readonly=True)
+    except ValueError as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(code=1)
+
+
+def _format_time(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).isoformat(sep=" ", timespec="seconds")
+
+
+BufferOption = Annotated[
+    Path | None,
+    typer.Option(
+        "--buffer",
+        "-b",
+        envvar="CLIP_BUFFER",
+        help="Clip buffer file of the camera service",
+    ),
+]
+
+
+@app.command()
+def events(buffer: BufferOption = None):
+    """
+    List the occupancy events that still have footage.
+    """
+    clips = _open_clips(buffer)
+    span = clips.span
+    if span is None:
+        typer.echo("The clip buffer is empty")
+        return
+    typer.echo(f"Footage from {_format_time(span[0])} to {_format_time(span[1])}")
+    for index, (timestamp, event, count) in enumerate(reversed(clips.events())):
+        if timestamp >= span[0]:
+            typer.echo(f"{index:4d}  {_format_time(timestamp)}  {event:9s} {count}")
+
+
+@app.command()
+def export(
+    output: Annotated[
+        Path,
+        typer.Argument(
+            help="Video file (.mp4, .avi) or a directory for the JPEG frames",
+        ),
+    ],
+    at: Annotated[
+        datetime | None,
+        typer.Option(help="Local time to center the clip on"),
+    ] = None,
+    event: Annotated[
+        int | None,
+        typer.Option(help="Occupancy event to center the clip on, 0 is the latest"),
+    ] = None,
+    before: Annotated[
+        float,
+        typer.Option(help="Seconds of footage before the moment"),
+    ] = 10.0,
+    after: Annotated[
+        float,
+        typer.Option(help="Seconds of footage after the moment"),
+    ] = 10.0,
+    buffer: BufferOption = None,
+):
+    """
+    Export the footage around a moment or an occupancy event.
+    """
+    clips = _open_clips(buffer)
+    if at is not None:
+        moment = at.timestamp()
+    else:
+        recorded = clips.events()
+        index = event or 0
+        if index >= len(recorded):
+            typer.echo(f"There are only {len(recorded)} events", err=True)
+            raise typer.Exit(code=1)
+        moment = recorded[-1 - index][0]
+
+    frames = list(clips.frames(moment - before, moment + after))
+    if not frames:
+        typer.echo("No footage around that moment", err=True)
+        raise typer.Exit(code=1)
+
+    if output.suffix.lower() in (".mp4", ".avi"):
+        fps = (len(frames) - 1) / (frames[-1][0] - frames[0][0] or 1) or 1
+        writer = None
+        for _, jpeg in frames:
+            frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+            if writer is None:
+                height, width = frame.shape[:2]
+                fourcc = cv2.VideoWriter_fourcc(
+                    *("mp4v" if output.suffix.lower() == ".mp4" else "MJPG")
+                )
+                writer = cv2.VideoWriter(str(output), fourcc, fps, (width, height))
+            writer.write(frame)
+        assert writer is not None
+        writer.release()
+    else:
+        # The frames are already JPEGs, no need to recompress them
+        output.mkdir(parents=True, exist_ok=True)
+        for timestamp, jpeg in frames:
+            name = datetime.fromtimestamp(timestamp).strftime("%Y%m%d-%H%M%S.%f")
+            (output / f"{name}.jpg").write_bytes(jpeg)
+
+    typer.echo(
+        f"Exported {len(frames)} frames from {_format_time(frames[0][0])} "
+        f"to {_format_time(frames[-1][0])} to {output}"
+    )
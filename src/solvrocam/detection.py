@@ -1,11 +1,14 @@
 import logging
+import math
 import os
 import sys
 import threading
 import time
-from datetime import datetime, timedelta, timezone
-from io import BytesIO
-from queue import Empty, Queue
+from collections import deque
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
 from urllib.parse import urljoin
 
 import cv2
@@ -14,27 +17,40 @@ import numpy.typing as npt
 
 try:
     from picamera2 import Picamera2  # pyright: ignore[reportMissingImports]
-    from picamera2.encoders import H264Encoder  # pyright: ignore[reportMissingImports]
-    from picamera2.outputs import PyavOutput  # pyright: ignore[reportMissingImports]
-    from libcamera import Transform  # pyright: ignore[reportMissingImports]
+
+    from solvrocam.streaming import StreamSupervisor, outputs_from_env
 except ModuleNotFoundError:
     pass
-from requests import Request, Response, Session
 
-from solvrocam.debounce import debounce
-from solvrocam.person_trackers.yolo_bytetracker import (
+from solvrocam.aggregation import OccupancyAggregator
+from solvrocam.clips import ClipRecorder, ClipRing, default_clip_path
+from solvrocam.framebuffer import FrameRing
+from solvrocam.governor import Level, governor_from_env
+from solvrocam.history import HistoryRecorder, default_history_path
+from solvrocam.logs import PeriodicSummary
+from solvrocam.metrics import Metrics, MetricsServer
+from solvrocam.motion import MotionGate
+from solvrocam.occupancy import OccupancyEvent, OccupancyMonitor
+from solvrocam.person_trackers.person_tracker import (
     DetectionResult,
     PersonTracker,
+    TrackerFailed,
+    TrackerUnavailable,
+    load_tracker_config,
+    parse_frame_size,
 )
 from solvrocam.preview import Output, Preview
+from solvrocam.profiling import StageTimer
+from solvrocam.ratelimit import Throttle
+from solvrocam.regions import Regions, default_regions_path, load_regions
+from solvrocam.snapshot import SnapshotEncoder
+from solvrocam.sources import EndOfStream, FrameSource, Picamera2Source
+from solvrocam.startup import StartupProfile, notify
+from solvrocam.uplink import CoreUplink, Ping, default_outbox_dir
 
 
-def print_response(res: Response) -> str:
-    return "HTTP/1.1 {status_code}\n{headers}\n{body}".format(
-        status_code=res.status_code,
-        headers="\n".join("{}: {}".format(k, v) for k, v in res.headers.items()),
-        body=res.text,
-    )
+def _or_nan(value: float | None) -> float:
+    return math.nan if value is None else value
 
 
 class Solvrocam:
@@ -43,68 +59,226 @@ class Solvrocam:
         preview: Preview,
         tracker: PersonTracker,
         logger: logging.Logger,
+        snapshots: SnapshotEncoder | None = None,
+        startup: StartupProfile | None = None,
+        camera: str | None = None,
+        core_url: str | None = None,
+        regions_path: Path | None = None,
+        metrics: Metrics | None = None,
     ):
-        self._downscaled_size = (864, 480)
+        """`camera` names one of several cameras in the process, which keeps its
+        own files and reports `metrics` labelled with its name. `core_url` is the
+        endpoint it pings instead of the one under CORE_URL.
+        """
+        self.camera = camera
+        self._downscaled_size = parse_frame_size(
+            load_tracker_config().get("frame_size") or (864, 480)
+        )
+        # "lores" runs detection on the small YUV420 stream, "main" on the full
+        # resolution RGB stream which is otherwise only captured for stills
+        self.detection_stream = os.getenv("DETECTION_STREAM", "lores")
+        # Pixel layout of the frames passed to process_frame
+        self.frame_format = "BGR"
         self._core_base = os.getenv("CORE_URL")
-        self._core_url = (
+        self._core_url = core_url or (
             urljoin(self._core_base, "office/camera") if self._core_base else None
         )
 
         self._preview: Preview = preview
         self._tracker: PersonTracker = tracker
         self._logger: logging.Logger = logger
+        self.snapshots = snapshots or SnapshotEncoder()
+        self.startup = startup or StartupProfile()
+        # Set once the first frame went through processing
+        self._ready = False
 
         self.frame: npt.NDArray[np.uint8]
         self.downscaled_frame: npt.NDArray[np.uint8]
         self.tracking_result: DetectionResult
-        self.image: bytes
-        self.counts: list[int] = []
-
+        # BGR copy of the current frame shared by the preview and stills
+        self._frame_copy: tuple[npt.NDArray[np.uint8], npt.NDArray[np.uint8]] | None = (
+            None
+        )
+        # Rolling people counts
+        self.occupancy = OccupancyAggregator({"minute": 60, "hour": 3600})
+        # Decides when the core is pinged: right after people enter or leave,
+        # otherwise on a heartbeat
+        self.occupancy_monitor = OccupancyMonitor(
+            heartbeat=float(os.getenv("HEARTBEAT_INTERVAL", "60"))
+        )
+        # Only people standing inside these polygons are counted, detection is
+        # cropped to their bounds
+        self.regions, _ = load_regions(regions_path or default_regions_path())
+        self._relative_regions: dict[tuple[int, int], Regions] = {}
+        # Skips detection on static scenes, reusing the last result
+        self.motion_gate: MotionGate | None = (
+            MotionGate() if os.getenv("MOTION_GATE", "1") != "0" else None
+        )
+        # Set by the bench command to collect per-stage timings
+        self.profiler: StageTimer | None = None
+        # Whoever passes the metrics serves them
+        self._serve_metrics = metrics is None
+        self.metrics = (
+            Metrics() if metrics is None else metrics.with_labels(camera=camera or "")
+        )
+        self._metrics_server: MetricsServer | None = None
+        # Per-frame activity only reaches the logs in these summaries
+        self._summary = PeriodicSummary(
+            self._logger,
+            "Processing summary",
+            interval=float(os.getenv("LOG_SUMMARY_INTERVAL", "60")),
+        )
+        # Lowers the frame rate, detection size and detection frequency when
+        # processing falls behind or the Pi gets hot
+        self.governor = governor_from_env(self._logger, self.metrics)
+        self._detection_interval = 0.0
+        self._last_detection = float("-inf")
+
+        self.source: FrameSource | None = None
+        # Set when the source is the camera, for streaming its feed
         self.picam2: Picamera2 | None = None
         self.running = False
         self._needs_restart = False
 
         self.activity_lock = threading.Lock()
         self.last_activity_timestamp = time.time()
+        # Tells the watchdog whether a stall is inside the tracker
+        self._detecting = False
 
-        self.rtmp_thread: threading.Thread | None = None
+        self.stream_supervisor: StreamSupervisor | None = None
         self.watchdog_thread: threading.Thread | None = None
         self.processing_thread: threading.Thread | None = None
-        self.frame_queue: Queue = Queue(maxsize=1)
+        # Recent footage for exporting clips, sampled from the frame ring
+        self._clip_path = self._camera_path(
+            default_clip_path() if os.getenv("CLIP_BUFFER_MB", "64") != "0" else None
+        )
+        self.clip_recorder: ClipRecorder | None = None
+        # Latest captured frame, slots are reused so readers copy what they keep.
+        # The clip recorder holds one more slot while it encodes
+        self.frame_ring = FrameRing(slots=3 if self._clip_path is None else 4)
+        # Reported occupancy per second, kept locally for `solvrocam history`
+        self.history_recorder: HistoryRecorder | None = None
+
+        self._frames_captured = self.metrics.counter(
+            "frames_captured", "Frames captured from the camera"
+        )
+        self._frames_dropped = self.metrics.counter(
+            "frames_dropped", "Captured frames replaced before processing"
+        )
+        self._frames_processed = self.metrics.counter(
+            "frames_processed", "Frames that went through processing"
+        )
+        self._capture_errors = self.metrics.counter(
+            "capture_errors", "Failed frame captures"
+        )
+        self._watchdog_triggers = self.metrics.counter(
+            "watchdog_triggers", "Restarts requested by the watchdog"
+        )
+        self._detections_skipped = self.metrics.counter(
+            "detections_skipped", "Frames not detected because the tracker was down"
+        )
+        self.metrics.gauge(
+            "frame_pending",
+            "Whether a captured frame is waiting to be processed",
+            lambda: self.frame_ring.pending,
+        )
+        self.metrics.gauge(
+            "people",
+            "People counted in the last frame",
+            lambda: self.occupancy.last or 0,
+        )
+        for window in self.occupancy.windows:
+            for name, help, stat in (
+                ("people_median", "Median", self.occupancy.median),
+                (
+                    "people_p95",
+                    "95th percentile of the",
+                    lambda window: self.occupancy.percentile(window, 95),
+                ),
+                ("people_max", "Most", self.occupancy.max),
+                ("people_mean", "Mean", self.occupancy.mean),
+            ):
+                self.metrics.gauge(
+                    name,
+                    f"{help} people counted over the window",
+                    lambda stat=stat, window=window: _or_nan(stat(window)),
+                    window=window,
+                )
+
+        self._uplink: CoreUplink | None = None
+        # A flapping count can't flood the core, the latest ping still goes out
+        self._send_ping: Throttle | None = None
+        if self._core_url is not None:
+            self._uplink = CoreUplink(
+                self._core_url,
+                self._logger,
+                self._encode_image,
+                outbox_dir=self._camera_dir(default_outbox_dir()),
+                metrics=self.metrics,
+            )
+            self._send_ping = Throttle(self._uplink.send, interval=2, trailing=True)
+        self._log_no_core = Throttle(self._logger.error, interval=60)
+        self._log_tracker_failure = Throttle(self._logger.error, interval=60)
 
-    def start_camera(self) -> None:
+    def start_camera(self, source: FrameSource | None = None) -> None:
+        """Starts capturing from `source`, by default the camera."""
         self._logger.info("Starting camera...")
-        self.picam2 = Picamera2()
-
-        main_size = (4608, 2592)
-        main_format = "RGB888"
-        # This resolution MUST be at most 1920x1080 or else the encoder fails
-        lores_size = (1920, 1080)
-        # lores stream MUST be YUV420
-        lores_format = "YUV420"
-        framerate = 30
-        video_config = self.picam2.create_video_configuration(
-            main={"size": main_size, "format": main_format},
-            lores={"size": lores_size, "format": lores_format},
-            display=None,
-            transform=Transform(hflip=True, vflip=True),
-            encode="lores",
-            buffer_count=5,
-            controls={"FrameRate": framerate},
-        )
+        self.source = source or Picamera2Source(self.detection_stream)
+        with self.startup.step("start camera"):
+            self.source.start()
+        if isinstance(self.source, Picamera2Source):
+            self.picam2 = self.source.picam2
+            self._logger.info("Camera hardware started.")
+            self._logger.info(
+                f"Running detection on the {self.detection_stream} stream."
+            )
+        else:
+            self._logger.info(f"Reading frames from {type(self.source).__name__}.")
+        self.frame_format = self.source.frame_format
+
+        if self._clip_path is not None and self.clip_recorder is None:
+            try:
+                clips = ClipRing(
+                    self._clip_path, int(os.getenv("CLIP_BUFFER_MB", "64")) << 20
+                )
+                self.clip_recorder = ClipRecorder(
+                    self.frame_ring, clips, self._to_bgr, self._logger
+                )
+            except OSError as e:
+                self._logger.error(f"Failed to open clip buffer: {e}")
 
-        self.picam2.configure(video_config)
-        self.picam2.start()
-        self._logger.info("Camera hardware started.")
+        history_path = self._camera_path(default_history_path())
+        if history_path is not None and self.history_recorder is None:
+            self.history_recorder = HistoryRecorder(history_path, self._logger)
 
         self.running = True
 
-        # Start all threads
-        self.rtmp_thread = threading.Thread(
-            target=self._rtmp_connection_thread, daemon=True
-        )
-        self.rtmp_thread.start()
+        metrics_port = os.getenv("METRICS_PORT")
+        if metrics_port and self._serve_metrics and self._metrics_server is None:
+            try:
+                self._metrics_server = MetricsServer(
+                    self.metrics,
+                    os.getenv("METRICS_HOST", "127.0.0.1"),
+                    int(metrics_port),
+                    self._logger,
+                )
+            except OSError as e:
+                self._logger.error(f"Failed to start metrics endpoint: {e}")
+
+        if self.picam2 is not None and self.camera is not None:
+            self._logger.info("Streaming is disabled when running several cameras.")
+        elif self.picam2 is not None:
+            outputs = outputs_from_env(self._logger, self.metrics)
+            if outputs:
+                self.stream_supervisor = StreamSupervisor(
+                    self.picam2, outputs, self._logger
+                )
+            else:
+                self._logger.warning(
+                    "Neither RTMP_SERVER nor STREAM_SEGMENTS set, not streaming."
+                )
 
+        # Start all threads
         self.watchdog_thread = threading.Thread(target=self._watchdog, daemon=True)
         self.watchdog_thread.start()
 
@@ -115,47 +289,53 @@ class Solvrocam:
 
         self._logger.info("All threads started.")
 
-    def stop_camera(self) -> None:
+    def _camera_path(self, path: Path | None) -> Path | None:
+        """`path` with the camera's name appended to the file name."""
+        if path is None or self.camera is None:
+            return path
+        return path.with_name(f"{path.stem}-{self.camera}{path.suffix}")
+
+    def _camera_dir(self, path: Path | None) -> Path | None:
+        if path is None or self.camera is None:
+            return path
+        return path / self.camera
+
+    @property
+    def needs_restart(self) -> bool:
+        """Whether the watchdog or the tracker asked for a restart."""
+        return self._needs_restart
+
+    def stop_camera(self, exit_code: int = 1) -> None:
+        """Stops everything and exits, by default with a failure so systemd restarts it."""
+        self.shutdown()
+        sys.exit(exit_code)
+
+    def shutdown(self) -> None:
+        """Stops capturing, the threads and the camera."""
         self._logger.info("Stopping camera...")
+        notify("STOPPING=1")
         self.running = False
         self._preview.output = Output.OFF
 
-        if self.rtmp_thread and self.rtmp_thread.is_alive():
-            self.rtmp_thread.join()
+        if self.stream_supervisor:
+            self.stream_supervisor.stop()
         if self.processing_thread and self.processing_thread.is_alive():
             self.processing_thread.join()
-
-        if self.picam2:
-            if self.picam2.encoders:
-                self.picam2.stop_recording()
-            self.picam2.stop()
+        if self._send_ping:
+            self._send_ping.flush()
+        if self._uplink:
+            self._uplink.stop()
+        if self._metrics_server:
+            self._metrics_server.stop()
+        if self.clip_recorder:
+            self.clip_recorder.stop()
+        if self.history_recorder:
+            self.history_recorder.stop()
+        self.frame_ring.close()
+
+        if self.source:
+            self.source.stop()
         self._logger.info("Camera system stopped.")
-        sys.exit(1)
-
-    def _rtmp_connection_thread(self) -> None:
-        rtmp_server = os.getenv("RTMP_SERVER")
-        if not rtmp_server:
-            self._logger.warning("RTMP_SERVER not set, streaming thread will exit.")
-            return
-
-        encoder = H264Encoder(repeat=True)
-        output = PyavOutput(rtmp_server, format="flv")
-
-        while self.running:
-            if self.picam2 and not self.picam2.encoders:
-                try:
-                    self._logger.info(f"Attempting to start stream to {rtmp_server}...")
-                    self.picam2.start_recording(encoder, output)
-                    self._logger.info("SUCCESS: Background stream started.")
-                except Exception as e:
-                    self._logger.error(
-                        f"Failed to start recording: {e}. Retrying in 1 minute..."
-                    )
-            # Wait for retry, but check for stop signal
-            for _ in range(60):
-                if not self.running:
-                    break
-                time.sleep(1)
 
     def _restart_camera(self) -> None:
         self._logger.warning("Restarting camera")
@@ -167,6 +347,14 @@ class Solvrocam:
             with self.activity_lock:
                 last_activity = self.last_activity_timestamp
             if time.time() - last_activity > timeout:
+                self._watchdog_triggers.inc()
+                # A hung tracker worker can be replaced without restarting the camera
+                if self._detecting and self._tracker.restart():
+                    self._logger.warning(
+                        f"Watchdog: Detection stuck for {timeout} seconds. Restarting the tracker."
+                    )
+                    self.signal_activity()
+                    continue
                 self._logger.warning(
                     f"Watchdog: No activity for {timeout} seconds. Triggering restart."
                 )
@@ -179,52 +367,147 @@ class Solvrocam:
         with self.activity_lock:
             self.last_activity_timestamp = time.time()
 
-    def capture_and_queue(self, array_name: str) -> None:
-        if not self.picam2:
-            return
+    def capture_and_queue(self) -> bool:
+        """Captures the next frame into the ring, False once the source ran out."""
+        if not self.source:
+            return False
         if self._needs_restart:
             self.stop_camera()
         try:
-            # capture async so that if the camera crashes the thread doesn't hang waiting
-            # async allows to wait with a timeout
-            job = self.picam2.capture_array(array_name, wait=False)
-            frame = self.picam2.wait(job, timeout=0.3)
-
-            if not self.frame_queue.full():
-                self.frame_queue.put(frame)
+            with self._stage("capture"):
+                # Copies straight from the source buffer into a ring slot
+                dropped = self.source.capture(self.frame_ring.write)
+            self._frames_captured.inc()
+            if self.frame_ring.seq == 1:
+                self.startup.mark("first frame captured")
+            if dropped:
+                self._frames_dropped.inc()
+        except EndOfStream:
+            return False
         except Exception as e:
+            self._capture_errors.inc()
             self._logger.error(f"Failed to capture frame: {e}")
+        return True
 
     def _processing_loop(self):
+        # Frames keep being captured, and replaced, while the model loads
+        try:
+            while self.running and not self._tracker.wait_ready(1):
+                self.signal_activity()
+        except RuntimeError:
+            self._restart_camera()
+            return
+
+        seq = 0
         while self.running:
-            try:
-                frame = self.frame_queue.get(timeout=1)
-            except Empty:
+            frame = self.frame_ring.get(after=seq, timeout=1)
+            if frame is None:
                 continue
+            seq = frame.seq
             self.signal_activity()  # Signal that the thread is alive
-            self.process_frame(frame)
-            self.show()
-            self.ping()
+            start = time.perf_counter()
+            try:
+                with self._stage("frame"):
+                    self.process_frame(frame.array)
+                    with self._stage("preview"):
+                        self.show()
+                    with self._stage("ping"):
+                        self.ping()
+                    if (
+                        self.history_recorder is not None
+                        and self.occupancy_monitor.count is not None
+                    ):
+                        self.history_recorder.add(self.occupancy_monitor.count)
+            finally:
+                self.frame_ring.release(frame)
+            self._record_stage("latency", time.monotonic() - frame.timestamp)
+            processing = time.perf_counter() - start
+            self._summary.observe("frame_ms", processing * 1000)
+            if self.governor is not None:
+                level = self.governor.record(processing)
+                if level is not None:
+                    self._apply_level(level)
+            if not self._ready:
+                self._on_ready()
+
+    def _apply_level(self, level: Level) -> None:
+        assert self.source is not None
+        try:
+            self.source.set_frame_rate(level.fps)
+        except Exception as e:
+            self._logger.error(f"Failed to set the frame rate: {e}")
+        self._detection_interval = level.interval
+
+    def _on_ready(self) -> None:
+        self._ready = True
+        self.startup.mark("first frame processed")
+        notify("READY=1")
+        self._logger.info(
+            f"Ready, first frame processed {self.startup.elapsed:.2f} seconds after start."
+        )
+        if self.startup.report:
+            print(self.startup.format(), file=sys.stderr, flush=True)
 
     def show(self):
         match self._preview.output:
             case Output.OFF:
                 pass
             case Output.CAPTURED:
-                self._preview.show(self.frame)
+                # The preview encodes on its own thread, after the slot is reused
+                self._preview.show(self._bgr_frame(copy=True))
             case Output.DOWNSCALED:
+                if self._tracker.full_resolution:
+                    # Only the preview needs the downscaled frame then
+                    self._downscale_frame()
                 self._preview.show(self.downscaled_frame)
             case Output.ANNOTATED:
-                self._preview.show(np.array(self.tracking_result.processed_frame))
+                annotated_frame = self.tracking_result.processed_frame
+                if annotated_frame is not None:
+                    self._preview.show(annotated_frame)
 
     def process_frame(self, frame: npt.NDArray[np.uint8]):
         self.frame = frame
-        self._downscale_frame()
-        self._run_detection()
-        self.counts.append(
-            len(self.tracking_result.ids) if self.tracking_result.ids is not None else 0
-        )
-        self._logger.debug(f"People detected: {self.counts[-1]}")
+        if self._should_detect():
+            self._run_detection()
+        self._count_people()
+
+    def process_stream(
+        self, frames: Iterable[npt.NDArray[np.uint8]]
+    ) -> Iterator[DetectionResult]:
+        """Processes recorded frames with detection pipelined across threads.
+
+        Every frame is detected, the motion gate only applies to live capture.
+        """
+        # Full frames waiting for their detection to come out of the pipeline
+        pending: deque[npt.NDArray[np.uint8]] = deque()
+
+        def detection_frames():
+            for frame in frames:
+                pending.append(frame)
+                yield self._detection_input(frame)
+
+        for result in self._tracker.track_stream(detection_frames()):
+            self.frame = pending.popleft()
+            if not self._tracker.full_resolution:
+                self.downscaled_frame = result.frame  # pyright: ignore[reportAttributeAccessIssue]
+            self.tracking_result = result
+            self._record_detection_timings()
+            self._count_people()
+            yield result
+
+    def _count_people(self):
+        self._frames_processed.inc()
+        result = self.tracking_result
+        count = len(result.ids) if result.ids is not None else 0
+        if count and self.regions is not None and result.frame is not None:
+            inside = self._detection_regions().contains(
+                result.boxes, result.frame.shape
+            )
+            count = int(np.count_nonzero(inside))
+        self.occupancy.add(count)
+        self._summary.count("frames")
+        self._summary.observe("people", count)
+        self._summary.maybe_log()
 
     @property
     def preview_output(self) -> Output:
@@ -234,59 +517,208 @@ class Solvrocam:
     def preview_output(self, output: Output):
         self._preview.output = output
 
-    def _encode_image(self):
-        self.image = BytesIO(cv2.imencode(".jpeg", self.frame)[1].tobytes()).getvalue()
+    @contextmanager
+    def _stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record_stage(name, time.perf_counter() - start)
+
+    def _record_stage(self, stage: str, seconds: float) -> None:
+        self.metrics.record(stage, seconds)
+        if self.profiler is not None:
+            self.profiler.record(stage, seconds)
+
+    def _bgr_frame(self, copy: bool = False) -> npt.NDArray[np.uint8]:
+        """Returns the current frame as BGR, `copy` makes sure it doesn't alias it."""
+        if not copy:
+            return self._to_bgr(self.frame)
+        if self._frame_copy is None or self._frame_copy[0] is not self.frame:
+            self._frame_copy = (self.frame, self._to_bgr(self.frame, copy=True))
+        return self._frame_copy[1]
+
+    def _to_bgr(
+        self, frame: npt.NDArray[np.uint8], copy: bool = False
+    ) -> npt.NDArray[np.uint8]:
+        if self.frame_format == "YUV420":
+            return cv2.cvtColor(frame, cv2.COLOR_YUV2BGR_I420)
+        return frame.copy() if copy else frame
+
+    def _frame_size(self, frame: npt.NDArray[np.uint8]) -> tuple[int, int]:
+        """Width and height of the image, I420 frames stack the planes vertically."""
+        if self.frame_format == "YUV420":
+            return frame.shape[1], frame.shape[0] * 2 // 3
+        return frame.shape[1], frame.shape[0]
+
+    def _still_frame(self) -> npt.NDArray[np.uint8]:
+        """Returns the highest resolution BGR image of the current scene."""
+        if self.source is not None:
+            try:
+                still = self.source.still()
+                if still is not None:
+                    return still
+            except Exception as e:
+                self._logger.error(f"Failed to capture still: {e}")
+        return self._bgr_frame(copy=True)
 
-    @debounce().time(timedelta(seconds=15))
-    def ping(self):
-        if self._core_url is not None:
-            count = 0
+    def _encode_image(self, frame: npt.NDArray[np.uint8]) -> bytes:
+        with self._stage("encode"):
+            return self.snapshots.encode(frame)
 
-            # This removes false negatives where there would be detections between pings, but the frame that is sent doesn't have any.
-            # it also improves count accuracy
-            detections = np.array([num for num in self.counts if num != 0])
-            if detections.size > 0:
-                count = int(np.median(detections))
-            # Once the ping is called, we clear this
-            self.counts.clear()
+    def ping(self):
+        count = self.occupancy.last
+        if count is None:
+            return
+        change = self.occupancy_monitor.update(count)
+        if change is None:
+            return
+        self._logger.info(
+            f"Occupancy {change.event}: {change.previous} -> {change.count} people"
+        )
+        if self.clip_recorder is not None and change.event != OccupancyEvent.HEARTBEAT:
+            self.clip_recorder.mark(change)
 
+        if self._send_ping is not None:
             timestamp = datetime.now(timezone.utc).isoformat(sep=" ")
-            data = {
-                "timestamp": timestamp,
-                "count": count,
-            }
-            with Session() as session:
-                req = Request("POST", url=self._core_url, data=data)
-                if count > 0:
-                    self._encode_image()
-                    req.files = {
-                        "file": (
-                            "image.jpeg",
-                            self.image,
-                            "image/jpeg",
-                        )
-                    }
-                prepped = session.prepare_request(req)
-
-                content = data
-                content.update({"file": count > 0})
-                self._logger.info(f"Pinging core:\n{content}\n")
-                try:
-                    res = session.send(prepped)
-                    self._logger.debug(print_response(res))
-                except Exception as e:
-                    self._logger.error(f"Failed to ping core: {e}")
+            # Only changes carry a still, heartbeats just confirm the count
+            frame = None
+            if change.event != OccupancyEvent.HEARTBEAT and change.count > 0:
+                # A ping the throttle holds back may be replaced by a later one,
+                # it isn't worth capturing a still for
+                frame = (
+                    self._still_frame()
+                    if self._send_ping.ready()
+                    else self._bgr_frame(copy=True)
+                )
+            # Encoding and sending happen on the uplink thread
+            self._send_ping(
+                Ping(
+                    timestamp=timestamp,
+                    count=change.count,
+                    camera=self.camera,
+                    frame=frame,
+                )
+            )
         else:
-            self._logger.error(
+            self._log_no_core(
                 "CORE_URL environment variable is not set. Cannot ping core."
             )
 
+    def _should_detect(self) -> bool:
+        if not hasattr(self, "tracking_result"):
+            return True
+        if time.monotonic() - self._last_detection < self._detection_interval:
+            return False
+        if self.motion_gate is None:
+            return True
+        with self._stage("motion"):
+            if self.frame_format == "YUV420":
+                # The Y plane is already a grayscale image
+                luma = self.frame[: self.frame.shape[0] * 2 // 3]
+                return self.motion_gate.should_detect(luma)
+            return self.motion_gate.should_detect(self.frame)
+
     def _downscale_frame(self):
-        self.downscaled_frame = cv2.resize(
-            self.frame,
-            self._downscaled_size,
+        self.downscaled_frame = self._downscale(self.frame)
+
+    def _crop_bounds(self, width: int, height: int) -> tuple[int, int, int, int]:
+        """Part of the frame detection runs on, even aligned for the I420 planes."""
+        if self.regions is None or self._tracker.full_resolution:
+            return 0, 0, width, height
+        return self.regions.pixel_bounds(width, height, align=2)
+
+    def _downscaled_size_of(self, width: int, height: int) -> tuple[int, int]:
+        if self.regions is None:
+            return self._downscaled_size
+        # Crops keep their aspect ratio, sizes stay even for I420
+        scale = min(self._downscaled_size[0] / width, self._downscaled_size[1] / height)
+        return round(width * scale / 2) * 2, round(height * scale / 2) * 2
+
+    def _detection_regions(self) -> Regions:
+        """The regions in the coordinates of the frames passed to the tracker."""
+        assert self.regions is not None
+        if self._tracker.full_resolution:
+            return self.regions
+        width, height = self._frame_size(self.frame)
+        regions = self._relative_regions.get((width, height))
+        if regions is None:
+            x1, y1, x2, y2 = self._crop_bounds(width, height)
+            regions = self._relative_regions[(width, height)] = (
+                self.regions.relative_to(
+                    (x1 / width, y1 / height, x2 / width, y2 / height)
+                )
+            )
+        return regions
+
+    def _detection_input(self, frame: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8]:
+        if self._tracker.full_resolution:
+            with self._stage("convert"):
+                # The result keeps the frame for annotation, it can't alias a ring slot
+                return self._to_bgr(frame, copy=True)
+        return self._downscale(frame)
+
+    def _downscale(self, frame: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8]:
+        with self._stage("downscale"):
+            if self.frame_format == "YUV420":
+                return self._downscale_yuv420(frame)
+            x1, y1, x2, y2 = self._crop_bounds(*self._frame_size(frame))
+            return cv2.resize(
+                frame[y1:y2, x1:x2],
+                self._downscaled_size_of(x2 - x1, y2 - y1),
+                interpolation=cv2.INTER_AREA,
+            ).astype(np.uint8)
+
+    def _downscale_yuv420(self, frame: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8]:
+        """Downscales the planes of an I420 frame and only then converts to BGR."""
+        width, height = self._frame_size(frame)
+        x1, y1, x2, y2 = self._crop_bounds(width, height)
+        out_width, out_height = self._downscaled_size_of(x2 - x1, y2 - y1)
+
+        # U and V planes follow the Y plane, each a quarter of its size
+        chroma = frame[height:].reshape(2, height // 2, width // 2)
+        downscaled = np.empty((out_height * 3 // 2, out_width), dtype=np.uint8)
+        downscaled[:out_height] = cv2.resize(
+            frame[y1:y2, x1:x2],
+            (out_width, out_height),
             interpolation=cv2.INTER_AREA,
-        ).astype(np.uint8)
+        )
+        downscaled_chroma = downscaled[out_height:].reshape(
+            2, out_height // 2, out_width // 2
+        )
+        for plane in range(2):
+            downscaled_chroma[plane] = cv2.resize(
+                chroma[plane, y1 // 2 : y2 // 2, x1 // 2 : x2 // 2],
+                (out_width // 2, out_height // 2),
+                interpolation=cv2.INTER_AREA,
+            )
+        return cv2.cvtColor(downscaled, cv2.COLOR_YUV2BGR_I420)
 
     def _run_detection(self):
-        self.tracking_result = self._tracker.track_person(self.downscaled_frame)
+        self._last_detection = time.monotonic()
+        frame = self._detection_input(self.frame)
+        if not self._tracker.full_resolution:
+            self.downscaled_frame = frame
+        self._detecting = True
+        try:
+            with self._stage("detection"):
+                self.tracking_result = self._tracker.track_person(frame)
+        except TrackerUnavailable as e:
+            # Counting goes on with the last result until the tracker is back
+            if isinstance(e, TrackerFailed):
+                self._log_tracker_failure(str(e))
+            self._detections_skipped.inc()
+            self._summary.count("detections_skipped")
+            if not hasattr(self, "tracking_result"):
+                self.tracking_result = DetectionResult(
+                    boxes=np.empty((0, 4), dtype=int)
+                )
+            return
+        finally:
+            self._detecting = False
+        self._summary.count("detections")
+        self._record_detection_timings()
+
+    def _record_detection_timings(self):
+        for stage, seconds in self.tracking_result.timings.items():
+            self._record_stage(f"detection.{stage}", seconds)
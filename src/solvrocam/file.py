@@ -2,6 +2,7 @@ import logging
 import os
 import subprocess
 import sys
+from pathlib import Path
 
 import cv2
 import numpy as np
@@ -9,7 +10,9 @@ import typer
 from typing_extensions import Annotated
 
 from solvrocam.logs import setup_logging
+from solvrocam.person_trackers.person_tracker import TrackerBackend, create_tracker
 from solvrocam.preview import CV2Preview, Output
+from solvrocam.sources import VideoSource
 
 app = typer.Typer()
 
@@ -34,20 +37,29 @@ def file(
             help="Processing stage for the preview to output",
         ),
     ] = Output.ANNOTATED,
+    tracker: Annotated[
+        TrackerBackend,
+        typer.Option(
+            "--tracker",
+            "-t",
+            case_sensitive=False,
+            envvar="PERSON_TRACKER",
+            help="Person tracker implementation",
+        ),
+    ] = TrackerBackend.ULTRALYTICS,
 ):
     logger = logging.getLogger(__name__)
     setup_logging(logger)
 
     # lazy import to improve cli responsiveness, these imports take 1s
     from solvrocam.detection import Solvrocam
-    from solvrocam.person_trackers.yolo_bytetracker import YOLOByteTracker
 
     preview_process = subprocess.Popen(
         [sys.executable, "-m", "solvrocam", "preview", "start"]
     )
 
     try:
-        solvrocam = Solvrocam(CV2Preview(logger), YOLOByteTracker(), logger)
+        solvrocam = Solvrocam(CV2Preview(logger), create_tracker(tracker), logger)
         solvrocam.preview_output = output
 
         ext = os.path.splitext(file_path)[1].lower()
@@ -62,18 +74,17 @@ def file(
                 solvrocam.show()
 
         else:
-            cap = cv2.VideoCapture(file_path)
-            if not cap.isOpened():
-                logger.error(f"Failed to open video: {file_path}")
+            try:
+                source = VideoSource(Path(file_path))
+            except ValueError as e:
+                logger.error(str(e))
                 raise typer.Exit(code=1)
 
-            while solvrocam.preview_output != Output.OFF:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                solvrocam.process_frame(frame.astype(np.uint8))
+            # Decoding, preprocessing and inference overlap across threads
+            for _ in solvrocam.process_stream(source):
                 solvrocam.show()
-            cap.release()
+                if solvrocam.preview_output == Output.OFF:
+                    break
     finally:
         preview_process.terminate()
 
@@ -0,0 +1,142 @@
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import numpy.typing as npt
+
+
+@dataclass
+class Frame:
+    # View into a ring slot, only valid until the frame is released
+    array: npt.NDArray[np.uint8]
+    seq: int
+    # time.monotonic() when the frame was written
+    timestamp: float
+    slot: int
+
+
+class FrameRing:
+    """Preallocated frame slots passed from the capture thread to its readers.
+
+    `write` copies a frame into a free slot and publishes it as the latest one,
+    readers always get the newest frame and hold its slot until they release
+    it. A frame replaced before anyone read it counts as dropped. Slots are
+    allocated on the first write.
+    """
+
+    def __init__(self, slots: int = 3):
+        # One slot being written, one published and one per concurrent reader
+        if slots < 3:
+            raise ValueError("A frame ring needs at least 3 slots")
+        self._slots = slots
+        self._buffers: npt.NDArray[np.uint8] | None = None
+
+        self._condition = threading.Condition()
+        self._seq = [0] * slots
+        self._timestamps = [0.0] * slots
+        self._readers = [0] * slots
+        self._latest: int | None = None
+        self._latest_read = True
+        self._next_seq = 1
+        self._closed = False
+        self.dropped = 0
+
+    @property
+    def shape(self) -> tuple[int, ...] | None:
+        return self._buffers.shape[1:] if self._buffers is not None else None
+
+    @property
+    def pending(self) -> bool:
+        """Whether the latest frame hasn't been read yet."""
+        return not self._latest_read
+
+    @property
+    def seq(self) -> int:
+        """Sequence number of the latest frame, 0 before the first write."""
+        return self._next_seq - 1
+
+    def write(
+        self, frame: npt.NDArray[np.uint8], timestamp: float | None = None
+    ) -> bool:
+        """Copies `frame` into the ring, returns whether an unread frame was dropped."""
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        if self._buffers is None:
+            self._buffers = np.empty((self._slots, *frame.shape), dtype=frame.dtype)
+        assert self._buffers is not None
+        if frame.shape != self._buffers.shape[1:]:
+            raise ValueError(
+                f"Frame shape {frame.shape} doesn't match the ring {self._buffers.shape[1:]}"
+            )
+
+        with self._condition:
+            slot = next(
+                (
+                    slot
+                    for slot in range(self._slots)
+                    if self._readers[slot] == 0 and slot != self._latest
+                ),
+                None,
+            )
+            if slot is None:
+                # Every slot is held by a reader, the incoming frame is lost
+                self.dropped += 1
+                return True
+            # Marks the slot as busy while copying outside the lock
+            self._readers[slot] = -1
+
+        np.copyto(self._buffers[slot], frame)
+
+        with self._condition:
+            dropped = not self._latest_read
+            if dropped:
+                self.dropped += 1
+            self._readers[slot] = 0
+            self._seq[slot] = self._next_seq
+            self._timestamps[slot] = timestamp
+            self._next_seq += 1
+            self._latest = slot
+            self._latest_read = False
+            self._condition.notify_all()
+        return dropped
+
+    def get(
+        self, after: int = 0, timeout: float | None = None, consume: bool = True
+    ) -> Frame | None:
+        """Waits for a frame newer than sequence number `after` and holds its slot.
+
+        Readers that only look along, with `consume` unset, don't count as
+        having read the frame. Returns None on timeout or once the ring is closed.
+        """
+        with self._condition:
+            if not self._condition.wait_for(
+                lambda: (
+                    self._closed
+                    or (self._latest is not None and self._seq[self._latest] > after)
+                ),
+                timeout,
+            ):
+                return None
+            if self._closed or self._latest is None:
+                return None
+            assert self._buffers is not None
+            slot = self._latest
+            self._readers[slot] += 1
+            if consume:
+                self._latest_read = True
+            return Frame(
+                array=self._buffers[slot],
+                seq=self._seq[slot],
+                timestamp=self._timestamps[slot],
+                slot=slot,
+            )
+
+    def release(self, frame: Frame) -> None:
+        with self._condition:
+            self._readers[frame.slot] -= 1
+
+    def close(self) -> None:
+        """Wakes up waiting readers."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
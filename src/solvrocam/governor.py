@@ -0,0 +1,229 @@
+import logging
+import math
+import os
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+
+from solvrocam.metrics import Metrics
+
+
+@dataclass(frozen=True)
+class Level:
+    # Frames captured per second
+    fps: float
+    # Minimum seconds between detections, counting reuses the last result
+    interval: float
+
+
+# From full quality to what still counts people on a throttled Pi
+LEVELS = (
+    Level(fps=30, interval=0.0),
+    Level(fps=20, interval=0.0),
+    Level(fps=15, interval=0.25),
+    Level(fps=10, interval=0.5),
+    Level(fps=5, interval=1.0),
+)
+
+
+def read_temperature(root: Path) -> float | None:
+    """Hottest thermal zone under `root` (/sys/class/thermal) in °C."""
+    temperatures = []
+    for zone in root.glob("thermal_zone*/temp"):
+        try:
+            temperatures.append(int(zone.read_text()) / 1000)
+        except (OSError, ValueError):
+            continue
+    return max(temperatures, default=None)
+
+
+def cpu_load(stat: Path = Path("/proc/stat")) -> float:
+    """Runnable tasks per CPU right now, above 1 they wait for a core.
+
+    Unlike the load average, which trails by minutes, this shows the effect of
+    a level change at the next check.
+    """
+    cpus = os.cpu_count() or 1
+    try:
+        lines = stat.read_text().splitlines()
+    except OSError:
+        return os.getloadavg()[0] / cpus
+    for line in lines:
+        if line.startswith("procs_running "):
+            # Not counting the thread reading it
+            return max(int(line.split()[1]) - 1, 0) / cpus
+    return os.getloadavg()[0] / cpus
+
+
+class Governor:
+    """Steps through `levels` to keep per-frame processing within `budget`.
+
+    Every `period` seconds the smoothed processing time and load and the CPU
+    temperature are checked. Any of them over its limit steps down to the
+    next cheaper level, at most once every `hold` seconds so the effect of a
+    step is measured before the next one. Stepping back up needs all of them
+    comfortably below the limits, processing under `headroom` of the budget
+    and the temperature `hysteresis` °C below the maximum, for `recover`
+    seconds, so the levels don't flap around a limit.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        metrics: Metrics | None = None,
+        budget: float = 0.25,
+        levels: tuple[Level, ...] = LEVELS,
+        max_temperature: float = 75.0,
+        hysteresis: float = 5.0,
+        max_load: float = 1.5,
+        headroom: float = 0.6,
+        period: float = 1.0,
+        hold: float = 10.0,
+        recover: float = 30.0,
+        thermal_root: Path = Path("/sys/class/thermal"),
+        load: Callable[[], float] = cpu_load,
+    ):
+        self._logger = logger
+        self.budget = budget
+        self.levels = levels
+        self._max_temperature = max_temperature
+        self._hysteresis = hysteresis
+        self._max_load = max_load
+        self._headroom = headroom
+        self._period = period
+        self._hold = hold
+        self._recover = recover
+        self._thermal_root = thermal_root
+        self._load = load
+
+        self.index = 0
+        # Exponentially weighted processing time per frame
+        self.processing: float | None = None
+        self.temperature: float | None = None
+        # Exponentially weighted over the checks, settles well within `hold`
+        self.load: float | None = None
+        self._next_check: float | None = None
+        self._last_change = float("-inf")
+        self._calm_since: float | None = None
+
+        metrics = metrics or Metrics()
+        metrics.gauge(
+            "governor_level",
+            "Governor level, 0 is full quality",
+            lambda: self.index,
+        )
+        metrics.gauge(
+            "governor_frame_rate",
+            "Frames per second the governor captures at",
+            lambda: self.level.fps,
+        )
+        metrics.gauge(
+            "governor_detection_interval",
+            "Minimum seconds between detections set by the governor",
+            lambda: self.level.interval,
+        )
+        metrics.gauge(
+            "cpu_temperature_celsius",
+            "Hottest thermal zone",
+            lambda: math.nan if self.temperature is None else self.temperature,
+        )
+        self._steps_down = metrics.counter(
+            "governor_changes", "Levels changed by the governor", direction="down"
+        )
+        self._steps_up = metrics.counter(
+            "governor_changes", "Levels changed by the governor", direction="up"
+        )
+
+    @property
+    def level(self) -> Level:
+        return self.levels[self.index]
+
+    def record(self, seconds: float, now: float | None = None) -> Level | None:
+        """Adds the processing time of a frame, returns the new level on a change."""
+        now = time.monotonic() if now is None else now
+        if self.processing is None:
+            self.processing = seconds
+        else:
+            self.processing += 0.2 * (seconds - self.processing)
+
+        if self._next_check is None:
+            self._next_check = now + self._period
+        if now < self._next_check:
+            return None
+        self._next_check = now + self._period
+        return self._check(now)
+
+    def _check(self, now: float) -> Level | None:
+        assert self.processing is not None
+        self.temperature = read_temperature(self._thermal_root)
+        load = self._load()
+        self.load = load if self.load is None else self.load + 0.3 * (load - self.load)
+
+        reasons = []
+        if self.processing > self.budget:
+            reasons.append(
+                f"processing takes {self.processing * 1000:.0f} ms "
+                f"of a {self.budget * 1000:.0f} ms budget"
+            )
+        if self.temperature is not None and self.temperature >= self._max_temperature:
+            reasons.append(f"CPU at {self.temperature:.1f} °C")
+        if self.load >= self._max_load:
+            reasons.append(f"load {self.load:.2f} per CPU")
+
+        if reasons:
+            self._calm_since = None
+            if (
+                self.index + 1 < len(self.levels)
+                and now - self._last_change >= self._hold
+            ):
+                return self._change(self.index + 1, now, ", ".join(reasons))
+            return None
+
+        calm = (
+            self.processing < self.budget * self._headroom
+            and (
+                self.temperature is None
+                or self.temperature <= self._max_temperature - self._hysteresis
+            )
+            and self.load < self._max_load * self._headroom
+        )
+        if not calm:
+            self._calm_since = None
+            return None
+        if self._calm_since is None:
+            self._calm_since = now
+        if self.index > 0 and now - self._calm_since >= self._recover:
+            # Another recovery period before the next step up
+            self._calm_since = now
+            return self._change(self.index - 1, now, "back within limits")
+        return None
+
+    def _change(self, index: int, now: float, reason: str) -> Level:
+        down = index > self.index
+        self.index = index
+        self._last_change = now
+        (self._steps_down if down else self._steps_up).inc()
+        level = self.level
+        log = self._logger.warning if down else self._logger.info
+        interval = f", detecting every {level.interval:g} s" if level.interval else ""
+        log(
+            f"Governor {'down' if down else 'up'} to level {index} ({reason}): "
+            f"{level.fps:g} fps{interval}"
+        )
+        return level
+
+
+def governor_from_env(
+    logger: logging.Logger, metrics: Metrics | None = None
+) -> Governor | None:
+    """GOVERNOR=0 disables it, GOVERNOR_BUDGET_MS and GOVERNOR_MAX_TEMP set the limits."""
+    if os.getenv("GOVERNOR", "1") == "0":
+        return None
+    return Governor(
+        logger,
+        metrics,
+        budget=float(os.getenv("GOVERNOR_BUDGET_MS", "250")) / 1000,
+        max_temperature=float(os.getenv("GOVERNOR_MAX_TEMP", "75")),
+        thermal_root=Path(os.getenv("THERMAL_ROOT", "/sys/class/thermal")),
+    )
@@ -0,0 +1,390 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import typer
+from typing_extensions import Annotated
+
+from solvrocam.logs import setup_logging
+
+# Seconds each resolution is kept for, None keeps it forever
+RETENTION = {"second": 7 * 86400, "minute": 180 * 86400, "hour": None}
+ROLLUPS = {"minute": 60, "hour": 3600}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS second (ts INTEGER PRIMARY KEY, count INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS minute (
+    ts INTEGER PRIMARY KEY,
+    samples INTEGER NOT NULL,
+    occupied INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    peak INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS hour (
+    ts INTEGER PRIMARY KEY,
+    samples INTEGER NOT NULL,
+    occupied INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    peak INTEGER NOT NULL
+);
+"""
+
+
+def default_history_path() -> Path | None:
+    history = os.getenv("HISTORY_DB")
+    if history:
+        return Path(history)
+    if os.path.exists("/home/solvrocam/"):
+        return Path("/home/solvrocam/hardware-solvro-bot-office-cam/history.sqlite3")
+    return None
+
+
+class HistoryStore:
+    """Occupancy per second in SQLite, rolled up into minutes and hours.
+
+    Every table is keyed by the Unix time its bucket starts at, so range
+    queries are primary key scans. Rollups keep the number of seconds, the
+    seconds with anyone in, the sum and the peak of the counts, which is
+    enough for means and occupancy shares over any range of buckets.
+    """
+
+    def __init__(self, path: Path, readonly: bool = False):
+        if readonly:
+            self._db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path)
+            # Readers like `solvrocam history` don't block the camera service
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def add(self, samples: list[tuple[int, int]]) -> None:
+        """Stores (second, count) samples and updates the rollups they fall into."""
+        if not samples:
+            return
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO second VALUES (?, ?)", samples)
+            # Rebuilt from the finer table, so writing a second twice is harmless
+            source = "second"
+            for table, seconds in ROLLUPS.items():
+                start = min(ts for ts, _ in samples) // seconds * seconds
+                end = max(ts for ts, _ in samples) // seconds * seconds + seconds
+                if source == "second":
+                    select = (
+                        "SELECT ts / :size * :size, COUNT(*), SUM(count > 0), "
+                        "SUM(count), MAX(count) FROM second"
+                    )
+                else:
+                    select = (
+                        "SELECT ts / :size * :size, SUM(samples), SUM(occupied), "
+                        f"SUM(total), MAX(peak) FROM {source}"
+                    )
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO {table} {select} "
+                    "WHERE ts >= :start AND ts < :end GROUP BY ts / :size",
+                    {"size": seconds, "start": start, "end": end},
+                )
+                source = table
+
+    def expire(self, now: float | None = None) -> None:
+        now = time.time() if now is None else now
+        with self._db:
+            for table, seconds in RETENTION.items():
+                if seconds is not None:
+                    self._db.execute(
+                        f"DELETE FROM {table} WHERE ts < ?", (int(now - seconds),)
+                    )
+
+    def counts(self, start: float, end: float) -> list[tuple[int, int]]:
+        """Per second counts in [start, end), only as far back as they're kept."""
+        return self._db.execute(
+            "SELECT ts, count FROM second WHERE ts >= ? AND ts < ? ORDER BY ts",
+            (int(start), int(end)),
+        ).fetchall()
+
+    def buckets(
+        self, start: float, end: float, resolution: str
+    ) -> list[tuple[int, int, int, int, int]]:
+        """(start, samples, occupied, total, peak) of every stored bucket in the range.
+
+        `resolution` is one of the rollups or "day", days start at local midnight.
+        """
+        params = (int(start), int(end))
+        if resolution == "day":
+            return self._db.execute(
+                "SELECT MIN(ts), SUM(samples), SUM(occupied), SUM(total), MAX(peak) "
+                "FROM hour WHERE ts >= ? AND ts < ? "
+                "GROUP BY date(ts, 'unixepoch', 'localtime') ORDER BY ts",
+                params,
+            ).fetchall()
+        if resolution not in ROLLUPS:
+            raise ValueError(f"Unknown resolution {resolution}")
+        return self._db.execute(
+            f"SELECT ts, samples, occupied, total, peak FROM {resolution} "
+            "WHERE ts >= ? AND ts < ? ORDER BY ts",
+            params,
+        ).fetchall()
+
+    def summary(self, start: float, end: float) -> tuple[int, int, int, int]:
+        """(samples, occupied, total, peak) over the range.
+
+        Uses minutes while they are kept, hours beyond that.
+        """
+        minutes = RETENTION["minute"]
+        table = (
+            "minute" if minutes is None or start >= time.time() - minutes else "hour"
+        )
+        samples, occupied, total, peak = self._db.execute(
+            "SELECT COALESCE(SUM(samples), 0), COALESCE(SUM(occupied), 0), "
+            f"COALESCE(SUM(total), 0), COALESCE(MAX(peak), 0) FROM {table} "
+            "WHERE ts >= ? AND ts < ?",
+            (int(start), int(end)),
+        ).fetchone()
+        return samples, occupied, total, peak
+
+
+class HistoryRecorder:
+    """Records the occupancy once a second from the processing loop.
+
+    Samples are written in batches every `interval` seconds on the
+    recorder's own thread, which also applies the retention, so the SD card
+    sees few writes and the processing loop never waits on SQLite.
+    """
+
+    def __init__(self, path: Path, logger: logging.Logger, interval: float = 10.0):
+        self._path = path
+        self._logger = logger
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._pending: list[tuple[int, int]] = []
+        self._second: int | None = None
+        self._count = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def add(self, count: int, timestamp: float | None = None) -> None:
+        """Records the count at `timestamp`, the last one of each second is kept."""
+        second = int(time.time() if timestamp is None else timestamp)
+        if self._second is not None and second != self._second:
+            with self._lock:
+                self._pending.append((self._second, self._count))
+        self._second = second
+        self._count = count
+
+    def _worker(self) -> None:
+        try:
+            store = HistoryStore(self._path)
+        except sqlite3.Error as e:
+            self._logger.error(f"Failed to open occupancy history {self._path}: {e}")
+            return
+        next_expiry = 0.0
+        try:
+            while not self._stopped.wait(self._interval):
+                self._flush(store)
+                if time.monotonic() >= next_expiry:
+                    next_expiry = time.monotonic() + 3600
+                    try:
+                        store.expire()
+                    except sqlite3.Error as e:
+                        self._logger.error(f"Failed to expire occupancy history: {e}")
+            self._flush(store)
+        finally:
+            store.close()
+
+    def _flush(self, store: HistoryStore) -> None:
+        with self._lock:
+            samples, self._pending = self._pending, []
+        try:
+            store.add(samples)
+        except sqlite3.Error as e:
+            self._logger.error(f"Failed to write occupancy history: {e}")
+
+    def stop(self, timeout: float = 5) -> None:
+        if self._second is not None:
+            with self._lock:
+                self._pending.append((self._second, self._count))
+            self._second = None
+        self._stopped.set()
+        self._thread.join(timeout)
+
+
+app = typer.Typer()
+
+DatabaseOption = Annotated[
+    Path | None,
+    typer.Option(
+        "--database",
+        "-d",
+        envvar="HISTORY_DB",
+        help="Occupancy history of the camera service",
+    ),
+]
+SinceOption = Annotated[
+    datetime | None,
+    typer.Option(help="Local time to start at, by default a day ago"),
+]
+UntilOption = Annotated[
+    datetime | None,
+    typer.Option(help="Local time to end at, by default now"),
+]
+
+
+def _open_store(path: Path | None) -> HistoryStore:
+    path = path or default_history_path()
+    if path is None or not path.exists():
+        typer.echo("No occupancy history found, set HISTORY_DB", err=True)
+        raise typer.Exit(code=1)
+    return HistoryStore(path, readonly=True)
+
+
+def _range(since: datetime | None, until: datetime | None) -> tuple[float, float]:
+    end = until or datetime.now()
+    start = since or end - timedelta(days=1)
+    return start.timestamp(), end.timestamp()
+
+
+def _format_time(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).isoformat(sep=" ", timespec="seconds")
+
+
+@app.command()
+def show(
+    every: Annotated[
+        str,
+        typer.Option(help="Bucket size: minute, hour or day"),
+    ] = "hour",
+    since: SinceOption = None,
+    until: UntilOption = None,
+    database: DatabaseOption = None,
+):
+    """
+    Show the mean and peak occupancy over time.
+    """
+    store = _open_store(database)
+    try:
+        buckets = store.buckets(*_range(since, until), every)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+    typer.echo(f"{'from':<21}{'mean':>7}{'peak':>6}{'occupied':>10}")
+    for start, samples, occupied, total, peak in buckets:
+        typer.echo(
+            f"{_format_time(start):<21}{total / samples:>7.2f}{peak:>6}"
+            f"{occupied / samples:>10.0%}"
+        )
+
+
+@app.command()
+def stats(
+    since: SinceOption = None,
+    until: UntilOption = None,
+    database: DatabaseOption = None,
+):
+    """
+    Summarize the occupancy over a range, e.g. how busy the office was last month.
+    """
+    store = _open_store(database)
+    start, end = _range(since, until)
+    samples, occupied, total, peak = store.summary(start, end)
+    if samples == 0:
+        typer.echo("No occupancy recorded in that range")
+        return
+    typer.echo(f"From {_format_time(start)} to {_format_time(end)}")
+    typer.echo(f"Recorded: {samples / 3600:.1f} hours")
+    typer.echo(f"Occupied: {occupied / samples:.0%} of the time")
+    typer.echo(
+        f"Mean: {total / samples:.2f} people, {total / max(occupied, 1):.2f} when occupied"
+    )
+    typer.echo(f"Peak: {peak} people")
+
+
+@app.command()
+def backfill(
+    since: SinceOption = None,
+    until: UntilOption = None,
+    heartbeat: Annotated[
+        float,
+        typer.Option(
+            envvar="HEARTBEAT_INTERVAL",
+            help="Seconds between pings while the occupancy doesn't change",
+        ),
+    ] = 60,
+    core_url: Annotated[
+        str | None,
+        typer.Option(envvar="CORE_URL", help="Base URL of the core"),
+    ] = None,
+    camera: Annotated[
+        str | None,
+        typer.Option(
+            help="Name of the camera the history is from, sent with the pings"
+        ),
+    ] = None,
+    dry_run: Annotated[
+        bool,
+        typer.Option(help="Only print the pings"),
+    ] = False,
+    database: DatabaseOption = None,
+):
+    """
+    Send the core the occupancy it missed, from the per second history.
+
+    Like the camera service, the core gets a ping whenever the occupancy
+    changes and a heartbeat otherwise. Per second counts are kept for a week.
+    """
+    from urllib.parse import urljoin
+
+    from requests import RequestException, Session
+
+    logger = logging.getLogger(__name__)
+    setup_logging(logger)
+
+    if core_url is None and not dry_run:
+        raise typer.BadParameter("Pass --core-url or set CORE_URL")
+    store = _open_store(database)
+    counts = store.counts(*_range(since, until))
+    if not counts:
+        typer.echo("No per second occupancy recorded in that range")
+        return
+
+    session = Session()
+    # CORE_URL is set on the camera, a dry run must not ping it anyway
+    url = None if dry_run or not core_url else urljoin(core_url, "office/camera")
+    sent = 0
+    previous: int | None = None
+    last_ping = float("-inf")
+    for second, count in counts:
+        if count == previous and second - last_ping < heartbeat:
+            continue
+        previous, last_ping = count, second
+        # Formatted like the camera service's pings
+        timestamp = datetime.fromtimestamp(second, timezone.utc).isoformat(sep=" ")
+        if url is None:
+            typer.echo(f"{timestamp} {count}")
+            continue
+        data: dict = {"timestamp": timestamp, "count": count}
+        if camera is not None:
+            data["camera"] = camera
+        try:
+            res = session.post(url, data=data, timeout=(3.05, 10))
+            failed = res.status_code >= 500
+        except RequestException as e:
+            logger.error(f"Failed to ping core: {e}")
+            failed = True
+        if failed:
+            typer.echo(
+                f"Core unreachable after {sent} pings, resume with "
+                f"--since '{_format_time(second)}'",
+                err=True,
+            )
+            raise typer.Exit(code=1)
+        sent += 1
+    if url is not None:
+        typer.echo(f"Sent {sent} pings to the core")
@@ -1,42 +1,170 @@
+import atexit
+import copy
 import logging
 import os
 import sys
-from logging.handlers import TimedRotatingFileHandler
-
-journal_handler: logging.Handler | None = None
-try:
-    from systemd.journal import JournalHandler  # pyright: ignore[reportMissingImports]
-
-    journal_handler = JournalHandler()
-    journal_handler.setLevel(logging.INFO)  # pyright: ignore[reportOptionalMemberAccess]
-    journal_handler.setFormatter(logging.Formatter("%(levelname)s - %(message)s"))  # pyright: ignore[reportOptionalMemberAccess]
-except ImportError:
-    pass
-
-file_handler: logging.Handler | None = None
-if os.path.exists("/home/solvrocam/"):
-    if not os.path.isdir("/home/solvrocam/hardware-solvro-bot-office-cam/logs"):
-        os.mkdir("/home/solvrocam/hardware-solvro-bot-office-cam/logs")
-
-    file_handler = TimedRotatingFileHandler(
-        "/home/solvrocam/hardware-solvro-bot-office-cam/logs/log",
-        when="D",
-        backupCount=7,
-    )
-    file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(
-        logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-    )
+import time
+from collections import defaultdict
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+from queue import SimpleQueue
+
+# Attributes every LogRecord has, anything else was passed through `extra`
+_RECORD_ATTRIBUTES = set(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {
+    "message",
+    "asctime",
+}
+
+_listener: QueueListener | None = None
+_queue: SimpleQueue = SimpleQueue()
+
+
+def _fields(record: logging.LogRecord) -> dict:
+    return {
+        key: value
+        for key, value in record.__dict__.items()
+        if key not in _RECORD_ATTRIBUTES
+    }
+
+
+class FieldsFormatter(logging.Formatter):
+    """Appends the fields passed with `extra` as key=value pairs."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        fields = _fields(record)
+        if not fields:
+            return message
+        return (
+            message + " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        )
+
+
+def _journal_record(record: logging.LogRecord) -> logging.LogRecord:
+    """A copy of the record with its fields in upper case, which journald keeps.
+
+    The record itself is shared with the other handlers, which would print
+    both spellings.
+    """
+    fields = {
+        key.upper(): value
+        for key, value in _fields(record).items()
+        if not key.isupper()
+    }
+    if not fields:
+        return record
+    record = copy.copy(record)
+    record.__dict__.update(fields)
+    return record
+
+
+def _handlers() -> list[logging.Handler]:
+    """Created on first use, so importing this module has no side effects."""
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(FieldsFormatter("%(message)s"))
+    handlers: list[logging.Handler] = [stream_handler]
+
+    try:
+        from systemd.journal import JournalHandler  # pyright: ignore[reportMissingImports]
+
+        class FieldsJournalHandler(JournalHandler):
+            def emit(self, record: logging.LogRecord) -> None:
+                super().emit(_journal_record(record))
+
+        journal_handler = FieldsJournalHandler()
+        journal_handler.setLevel(logging.INFO)
+        journal_handler.setFormatter(logging.Formatter("%(levelname)s - %(message)s"))
+        handlers.append(journal_handler)
+    except ImportError:
+        pass
+
+    if os.path.exists("/home/solvrocam/"):
+        logs = "/home/solvrocam/hardware-solvro-bot-office-cam/logs"
+        os.makedirs(logs, exist_ok=True)
+        file_handler = TimedRotatingFileHandler(f"{logs}/log", when="D", backupCount=7)
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(
+            FieldsFormatter("%(asctime)s - %(levelname)s - %(message)s")
+        )
+        handlers.append(file_handler)
+    return handlers
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener runs in this process, the record can be formatted there
+        # instead of on the logging thread
+        return record
 
 
 # Configure logging
 def setup_logging(logger: logging.Logger) -> None:
+    """Sends the logger's records through a queue to the handlers.
+
+    The calling thread only enqueues the record, writing to stderr, the
+    journal and the log file happens on the listener's thread. Records still
+    queued are written at exit.
+    """
+    global _listener
+    if _listener is None:
+        _listener = QueueListener(_queue, *_handlers(), respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
     logger.propagate = False
     level = os.getenv("LOG_LEVEL", "DEBUG").upper()
     logger.setLevel(level=getattr(logging, level, logging.DEBUG))
-    logger.addHandler(logging.StreamHandler(sys.stderr))
+    if not any(isinstance(handler, QueueHandler) for handler in logger.handlers):
+        logger.addHandler(_QueueHandler(_queue))
+
+
+class PeriodicSummary:
+    """Aggregates per-frame values into one record every `interval` seconds.
+
+    Logging every frame costs more than processing some of them, the summary
+    carries the totals, means and maxima as structured fields instead.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        message: str,
+        interval: float = 60.0,
+        level: int = logging.INFO,
+    ):
+        self._logger = logger
+        self._message = message
+        self._interval = interval
+        self._level = level
+        self._start = time.monotonic()
+        self._counts: dict[str, int] = defaultdict(int)
+        self._totals: dict[str, float] = defaultdict(float)
+        self._samples: dict[str, int] = defaultdict(int)
+        self._maxima: dict[str, float] = {}
+
+    def count(self, name: str, amount: int = 1) -> None:
+        self._counts[name] += amount
+
+    def observe(self, name: str, value: float) -> None:
+        self._totals[name] += value
+        self._samples[name] += 1
+        self._maxima[name] = max(self._maxima.get(name, value), value)
 
-    if journal_handler is not None:
-        logger.addHandler(journal_handler)
-    if file_handler is not None:
-        logger.addHandler(file_handler)
+    def maybe_log(self, now: float | None = None) -> bool:
+        """Logs and starts over once the interval passed, returns whether it did."""
+        now = time.monotonic() if now is None else now
+        elapsed = now - self._start
+        if elapsed < self._interval:
+            return False
+        fields: dict[str, float] = {"seconds": round(elapsed, 1)}
+        fields.update(sorted(self._counts.items()))
+        for name, total in sorted(self._totals.items()):
+            fields[f"{name}_mean"] = round(total / self._samples[name], 3)
+            fields[f"{name}_max"] = round(self._maxima[name], 3)
+        if self._logger.isEnabledFor(self._level):
+            self._logger.log(self._level, self._message, extra=fields)
+        self._start = now
+        self._counts.clear()
+        self._totals.clear()
+        self._samples.clear()
+        self._maxima.clear()
+        return True
@@ -0,0 +1,243 @@
+import copy
+import logging
+import math
+import threading
+from bisect import bisect_left
+from collections.abc import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Generic, TypeVar
+
+# Seconds, spanning sub-millisecond stages up to a stalled ping
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = (f'{name}="{_escape(value)}"' for name, value in labels.items())
+    return "{" + ",".join(pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Counter:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def _samples(self, name: str, labels: dict[str, str]) -> list[str]:
+        return [f"{name}_total{_format_labels(labels)} {_format_value(self._value)}"]
+
+
+class Gauge:
+    """A value that is either set directly or read from `function` on scrape."""
+
+    def __init__(self, function: Callable[[], float] | None = None):
+        self._value = 0.0
+        self._function = function
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    @property
+    def value(self) -> float:
+        return self._function() if self._function else self._value
+
+    def _samples(self, name: str, labels: dict[str, str]) -> list[str]:
+        return [f"{name}{_format_labels(labels)} {_format_value(self.value)}"]
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self._buckets = buckets
+        # Per bucket counts, cumulated only when scraped
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def _samples(self, name: str, labels: dict[str, str]) -> list[str]:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        samples = []
+        cumulative = 0
+        for bound, count in zip((*self._buckets, math.inf), counts):
+            cumulative += count
+            bucket_labels = labels | {"le": _format_value(bound)}
+            samples.append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+        samples.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+        samples.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        return samples
+
+
+_Metric = TypeVar("_Metric", Counter, Gauge, Histogram)
+
+
+class _Family(Generic[_Metric]):
+    def __init__(self, name: str, help: str, kind: str, factory: Callable[[], _Metric]):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self._factory = factory
+        self._children: dict[tuple[tuple[str, str], ...], _Metric] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels: str) -> _Metric:
+        return self.child(labels)
+
+    def child(
+        self, labels: dict[str, str], *, factory: Callable[[], _Metric] | None = None
+    ) -> _Metric:
+        """The metric with `labels`, created by `factory` if it's the first use."""
+        key = tuple(sorted(labels.items()))
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, (factory or self._factory)())
+        return child
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in list(self._children.items()):
+            lines.extend(child._samples(self.name, dict(key)))
+        return lines
+
+
+class Metrics:
+    """Registry of the service's metrics, rendered in the Prometheus text format.
+
+    Recording is a few additions under an uncontended lock, all formatting
+    happens when the endpoint is scraped.
+    """
+
+    def __init__(self, namespace: str = "solvrocam"):
+        self._namespace = namespace
+        # Added to everything recorded through this registry, see with_labels
+        self._labels: dict[str, str] = {}
+        self._families: dict[str, _Family] = {}
+        self._lock = threading.Lock()
+        self._stages = self.histogram(
+            "stage_duration_seconds", "Duration of processing stages"
+        )
+
+    def with_labels(self, **labels: str) -> "Metrics":
+        """A view of the same metrics that adds `labels` to everything it records.
+
+        Lets several cameras in one process report the same metrics apart.
+        """
+        view = copy.copy(self)
+        view._labels = self._labels | labels
+        return view
+
+    def _family(
+        self, name: str, help: str, kind: str, factory: Callable[[], _Metric]
+    ) -> _Family[_Metric]:
+        name = f"{self._namespace}_{name}"
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = _Family(name, help, kind, factory)
+        return family
+
+    def counter(self, name: str, help: str, **labels: str) -> Counter:
+        return self._family(name, help, "counter", Counter).child(self._labels | labels)
+
+    def gauge(
+        self,
+        name: str,
+        help: str,
+        function: Callable[[], float] | None = None,
+        **labels: str,
+    ) -> Gauge:
+        def factory() -> Gauge:
+            return Gauge(function)
+
+        # Every labelled gauge reads its own function
+        return self._family(name, help, "gauge", factory).child(
+            self._labels | labels, factory=factory
+        )
+
+    def histogram(self, name: str, help: str) -> _Family[Histogram]:
+        """Returns the family, pick a labelled histogram with `.labels()`.
+
+        The labels of `with_labels` aren't added, pass them to `.labels()`.
+        """
+        return self._family(name, help, "histogram", Histogram)
+
+    def record(self, stage: str, seconds: float) -> None:
+        """Observes a stage duration, with the same signature as StageTimer."""
+        self._stages.child(self._labels | {"stage": stage}).observe(seconds)
+
+    def render(self) -> str:
+        with self._lock:
+            families = list(self._families.values())
+        return "\n".join(line for family in families for line in family.render()) + "\n"
+
+
+class MetricsServer:
+    """Serves `/metrics` from a daemon thread."""
+
+    def __init__(self, metrics: Metrics, host: str, port: int, logger: logging.Logger):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header(
+                    "Content-Type", "text/plain; version=0.0.4; charset=utf-8"
+                )
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._logger = logger
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        self._logger.info(f"Metrics endpoint listening on {host}:{port}")
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,75 @@
+import time
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+
+
+class MotionGate:
+    """Decides whether a frame is worth running the detector on.
+
+    Frames are reduced to a tiny blurred grayscale thumbnail and compared with
+    a running background. While the scene is static the detection interval
+    doubles up to `max_interval` seconds, any motion drops it back to zero.
+    """
+
+    def __init__(
+        self,
+        thumbnail_size: tuple[int, int] = (64, 36),
+        pixel_threshold: int = 12,
+        motion_ratio: float = 0.002,
+        learning_rate: float = 0.05,
+        min_interval: float = 0.5,
+        max_interval: float = 10.0,
+    ):
+        self._thumbnail_size = thumbnail_size
+        self._pixel_threshold = pixel_threshold
+        self._motion_ratio = motion_ratio
+        self._learning_rate = learning_rate
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+
+        self._background: npt.NDArray[np.float32] | None = None
+        self._interval = 0.0
+        self._last_detection = float("-inf")
+        self.motion = True
+
+    def _thumbnail(self, frame: npt.NDArray[np.uint8]) -> npt.NDArray[np.float32]:
+        # Resize before the color conversion, frames can be full resolution
+        thumbnail = cv2.resize(
+            frame, self._thumbnail_size, interpolation=cv2.INTER_AREA
+        )
+        if thumbnail.ndim == 3:
+            thumbnail = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(thumbnail, (3, 3), 0).astype(np.float32)
+
+    def _detect_motion(self, frame: npt.NDArray[np.uint8]) -> bool:
+        thumbnail = self._thumbnail(frame)
+        if self._background is None:
+            self._background = thumbnail
+            return True
+
+        changed = np.count_nonzero(
+            cv2.absdiff(thumbnail, self._background) > self._pixel_threshold
+        )
+        cv2.accumulateWeighted(thumbnail, self._background, self._learning_rate)
+        return changed >= self._motion_ratio * thumbnail.size
+
+    def should_detect(
+        self, frame: npt.NDArray[np.uint8], now: float | None = None
+    ) -> bool:
+        now = time.monotonic() if now is None else now
+        self.motion = self._detect_motion(frame)
+
+        if self.motion:
+            self._interval = 0.0
+        elif now - self._last_detection >= self._interval:
+            # Nothing changed since the last detection, back off further
+            self._interval = min(
+                max(self._interval * 2, self._min_interval), self._max_interval
+            )
+        else:
+            return False
+
+        self._last_detection = now
+        return True
@@ -0,0 +1,162 @@
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+import yaml
+
+from solvrocam.metrics import Metrics, MetricsServer
+from solvrocam.person_trackers.shared_tracker import DetectionEngine
+from solvrocam.preview import NullPreview
+from solvrocam.snapshot import SnapshotEncoder
+from solvrocam.sources import open_source
+from solvrocam.startup import StartupProfile
+
+
+@dataclass
+class CameraConfig:
+    name: str
+    # Anything `open_source` opens, "camera:1" is the second Pi camera
+    source: str = "camera"
+    # Endpoint pinged with this camera's counts, by default the one under CORE_URL
+    core_url: str | None = None
+    # REGIONS_CONFIG of this camera
+    regions: Path | None = None
+
+
+def load_cameras(path: Path) -> list[CameraConfig]:
+    """Reads the cameras served by one process from a YAML file.
+
+    ```yaml
+    cameras:
+      - name: office
+        source: camera:0
+      - name: kitchen
+        source: camera:1
+        core_url: https://core.example/kitchen/camera
+        regions: /home/solvrocam/kitchen-regions.yaml
+    ```
+    """
+    config = yaml.safe_load(path.read_text()) or {}
+    cameras = []
+    for entry in config.get("cameras") or []:
+        regions = entry.get("regions")
+        cameras.append(
+            CameraConfig(
+                name=str(entry["name"]),
+                source=str(entry.get("source", "camera")),
+                core_url=entry.get("core_url"),
+                regions=Path(regions) if regions else None,
+            )
+        )
+    names = [camera.name for camera in cameras]
+    if not cameras or len(set(names)) != len(names):
+        raise ValueError(f"{path} needs cameras with unique names")
+    return cameras
+
+
+def _camera_logger(logger: logging.Logger, name: str) -> logging.Logger:
+    """A child of `logger` whose records carry camera=`name`."""
+    child = logger.getChild(name)
+
+    def add_camera(record: logging.LogRecord) -> bool:
+        record.camera = name
+        return True
+
+    child.addFilter(add_camera)
+    return child
+
+
+def run_cameras(
+    cameras: list[CameraConfig],
+    engine: DetectionEngine,
+    logger: logging.Logger,
+    startup: StartupProfile | None = None,
+    stream: str = "lores",
+) -> int:
+    """Runs a camera service per camera until one of them stops.
+
+    Each has its own capture thread, tracks and counts, detection goes
+    through the shared `engine`. Returns the exit code: 1 if a camera needs a
+    restart, which restarts them all, 0 if the sources ran out.
+    """
+    # lazy import to improve cli responsiveness, these imports take 1s
+    from solvrocam.detection import Solvrocam
+
+    metrics = Metrics()
+    metrics_server: MetricsServer | None = None
+    metrics_port = os.getenv("METRICS_PORT")
+    if metrics_port:
+        try:
+            metrics_server = MetricsServer(
+                metrics,
+                os.getenv("METRICS_HOST", "127.0.0.1"),
+                int(metrics_port),
+                logger,
+            )
+        except OSError as e:
+            logger.error(f"Failed to start metrics endpoint: {e}")
+
+    snapshots = SnapshotEncoder()
+    services: list[Solvrocam] = []
+    for camera in cameras:
+        # The preview can only show one camera, its ports would collide
+        service = Solvrocam(
+            NullPreview(),
+            engine.tracker(camera.name),
+            _camera_logger(logger, camera.name),
+            snapshots,
+            startup,
+            camera=camera.name,
+            core_url=camera.core_url,
+            regions_path=camera.regions,
+            metrics=metrics,
+        )
+        service.detection_stream = stream
+        services.append(service)
+
+    stopped = threading.Event()
+    exit_codes: dict[str, int] = {}
+
+    def capture(name: str, service: Solvrocam) -> None:
+        try:
+            while not stopped.is_set() and not service.needs_restart:
+                if not service.capture_and_queue():
+                    logger.info(f"Frame source of {name} ran out.")
+                    exit_codes[name] = 0
+                    break
+            else:
+                exit_codes[name] = 1 if service.needs_restart else 0
+        except Exception as e:
+            logger.critical(f"Capture from {name} failed: {e}")
+            exit_codes[name] = 1
+        finally:
+            # capture_and_queue exits this thread with SystemExit when the
+            # watchdog asks for a restart right after the check above
+            exit_codes.setdefault(name, 1)
+            stopped.set()
+
+    threads = []
+    try:
+        for camera, service in zip(cameras, services):
+            service.start_camera(open_source(camera.source, stream=stream))
+            thread = threading.Thread(
+                target=capture, args=(camera.name, service), daemon=True
+            )
+            thread.start()
+            threads.append(thread)
+        stopped.wait()
+    except KeyboardInterrupt:
+        logger.info("Received keyboard interrupt, shutting down...")
+    finally:
+        stopped.set()
+        for thread in threads:
+            thread.join()
+        for service in services:
+            if service.running:
+                service.shutdown()
+        engine.stop()
+        if metrics_server is not None:
+            metrics_server.stop()
+    return max(exit_codes.values(), default=0)
@@ -0,0 +1,82 @@
+import time
+from dataclasses import dataclass
+from enum import StrEnum, auto, unique
+
+
+@unique
+class OccupancyEvent(StrEnum):
+    ENTER = auto()
+    LEAVE = auto()
+    HEARTBEAT = auto()
+
+
+@dataclass
+class OccupancyChange:
+    event: OccupancyEvent
+    count: int
+    previous: int | None
+
+
+class OccupancyMonitor:
+    """Turns per-frame people counts into enter, leave and heartbeat events.
+
+    A different count only becomes the reported occupancy once it held for
+    `enter_seconds` (more people) or `leave_seconds` (fewer people), which
+    rides over missed detections and tracker id switches. While the
+    occupancy doesn't change a heartbeat is emitted every `heartbeat` seconds.
+    """
+
+    def __init__(
+        self,
+        enter_seconds: float = 1.0,
+        leave_seconds: float = 5.0,
+        heartbeat: float = 60.0,
+    ):
+        self._enter_seconds = enter_seconds
+        self._leave_seconds = leave_seconds
+        self._heartbeat = heartbeat
+
+        self.count: int | None = None
+        self._last_event = 0.0
+        # Start of the current run of counts differing from self.count in one
+        # direction, and the count they all agree on
+        self._pending_since: float | None = None
+        self._pending_count = 0
+
+    def update(self, count: int, now: float | None = None) -> OccupancyChange | None:
+        now = time.monotonic() if now is None else now
+
+        if self.count is None:
+            return self._emit(OccupancyEvent.HEARTBEAT, count, now)
+
+        if count == self.count:
+            self._pending_since = None
+        elif self._pending_since is None or (count > self.count) != (
+            self._pending_count > self.count
+        ):
+            self._pending_since = now
+            self._pending_count = count
+        else:
+            # Settle on what every frame of the run agrees on, the fewest
+            # people when more entered and the most when some left
+            self._pending_count = (
+                min(self._pending_count, count)
+                if count > self.count
+                else max(self._pending_count, count)
+            )
+            entering = self._pending_count > self.count
+            hold = self._enter_seconds if entering else self._leave_seconds
+            if now - self._pending_since >= hold:
+                event = OccupancyEvent.ENTER if entering else OccupancyEvent.LEAVE
+                return self._emit(event, self._pending_count, now)
+
+        if now - self._last_event >= self._heartbeat:
+            return self._emit(OccupancyEvent.HEARTBEAT, self.count, now)
+        return None
+
+    def _emit(self, event: OccupancyEvent, count: int, now: float) -> OccupancyChange:
+        change = OccupancyChange(event, count, self.count)
+        self.count = count
+        self._last_event = now
+        self._pending_since = None
+        return change
@@ -0,0 +1,389 @@
+"""NumPy implementation of ByteTrack (https://arxiv.org/abs/2110.06864).
+
+Follows the ultralytics tracker so both backends produce the same tracks from
+the same detections, without importing torch.
+"""
+
+from enum import IntEnum
+from typing import Any
+
+import lap
+import numpy as np
+
+
+class KalmanFilterXYAH:
+    """Constant velocity Kalman filter over box center, aspect ratio and height."""
+
+    _std_weight_position = 1 / 20
+    _std_weight_velocity = 1 / 160
+
+    def __init__(self):
+        self._motion_mat = np.eye(8)
+        for i in range(4):
+            self._motion_mat[i, 4 + i] = 1
+        self._update_mat = np.eye(4, 8)
+
+    def initiate(self, measurement: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        mean = np.r_[measurement, np.zeros_like(measurement)]
+        height = measurement[3]
+        std = [
+            2 * self._std_weight_position * height,
+            2 * self._std_weight_position * height,
+            1e-2,
+            2 * self._std_weight_position * height,
+            10 * self._std_weight_velocity * height,
+            10 * self._std_weight_velocity * height,
+            1e-5,
+            10 * self._std_weight_velocity * height,
+        ]
+        return mean, np.diag(np.square(std))
+
+    def multi_predict(
+        self, mean: np.ndarray, covariance: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        height = mean[:, 3]
+        std = np.stack(
+            [
+                self._std_weight_position * height,
+                self._std_weight_position * height,
+                np.full_like(height, 1e-2),
+                self._std_weight_position * height,
+                self._std_weight_velocity * height,
+                self._std_weight_velocity * height,
+                np.full_like(height, 1e-5),
+                self._std_weight_velocity * height,
+            ],
+            axis=1,
+        )
+        motion_cov = np.zeros_like(covariance)
+        diagonal = np.arange(8)
+        motion_cov[:, diagonal, diagonal] = np.square(std)
+
+        mean = mean @ self._motion_mat.T
+        covariance = self._motion_mat @ covariance @ self._motion_mat.T + motion_cov
+        return mean, covariance
+
+    def update(
+        self, mean: np.ndarray, covariance: np.ndarray, measurement: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        height = mean[3]
+        std = [
+            self._std_weight_position * height,
+            self._std_weight_position * height,
+            1e-1,
+            self._std_weight_position * height,
+        ]
+        projected_mean = self._update_mat @ mean
+        projected_cov = self._update_mat @ covariance @ self._update_mat.T + np.diag(
+            np.square(std)
+        )
+
+        kalman_gain = np.linalg.solve(
+            projected_cov, (covariance @ self._update_mat.T).T
+        ).T
+        new_mean = mean + (measurement - projected_mean) @ kalman_gain.T
+        new_covariance = covariance - kalman_gain @ projected_cov @ kalman_gain.T
+        return new_mean, new_covariance
+
+
+class TrackState(IntEnum):
+    NEW = 0
+    TRACKED = 1
+    LOST = 2
+    REMOVED = 3
+
+
+class STrack:
+    def __init__(self, xyxy: np.ndarray, score: float, idx: int):
+        self._tlwh = np.asarray(
+            [xyxy[0], xyxy[1], xyxy[2] - xyxy[0], xyxy[3] - xyxy[1]], dtype=np.float64
+        )
+        self.score = score
+        self.idx = idx
+        self.mean: np.ndarray | None = None
+        self.covariance: np.ndarray | None = None
+        self.state = TrackState.NEW
+        self.is_activated = False
+        self.track_id = 0
+        self.frame_id = 0
+        self.start_frame = 0
+        self.tracklet_len = 0
+
+    @property
+    def tlwh(self) -> np.ndarray:
+        if self.mean is None:
+            return self._tlwh.copy()
+        tlwh = self.mean[:4].copy()
+        tlwh[2] *= tlwh[3]
+        tlwh[:2] -= tlwh[2:] / 2
+        return tlwh
+
+    @property
+    def xyxy(self) -> np.ndarray:
+        xyxy = self.tlwh
+        xyxy[2:] += xyxy[:2]
+        return xyxy
+
+    @property
+    def xyah(self) -> np.ndarray:
+        xyah = self.tlwh
+        xyah[:2] += xyah[2:] / 2
+        xyah[2] /= xyah[3]
+        return xyah
+
+    @property
+    def end_frame(self) -> int:
+        return self.frame_id
+
+    def activate(self, kalman_filter: KalmanFilterXYAH, frame_id: int, track_id: int):
+        self.track_id = track_id
+        self.mean, self.covariance = kalman_filter.initiate(self.xyah)
+        self.tracklet_len = 0
+        self.state = TrackState.TRACKED
+        if frame_id == 1:
+            self.is_activated = True
+        self.frame_id = frame_id
+        self.start_frame = frame_id
+
+    def update(
+        self, kalman_filter: KalmanFilterXYAH, detection: "STrack", frame_id: int
+    ):
+        assert self.mean is not None and self.covariance is not None
+        self.mean, self.covariance = kalman_filter.update(
+            self.mean, self.covariance, detection.xyah
+        )
+        self.tracklet_len += 1
+        self.state = TrackState.TRACKED
+        self.is_activated = True
+        self.frame_id = frame_id
+        self.score = detection.score
+        self.idx = detection.idx
+
+    def re_activate(
+        self, kalman_filter: KalmanFilterXYAH, detection: "STrack", frame_id: int
+    ):
+        self.update(kalman_filter, detection, frame_id)
+        self.tracklet_len = 0
+
+
+def _iou_distance(tracks: list[STrack], detections: list[STrack]) -> np.ndarray:
+    if not tracks or not detections:
+        return np.zeros((len(tracks), len(detections)))
+    a = np.array([track.xyxy for track in tracks])
+    b = np.array([detection.xyxy for detection in detections])
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return 1 - intersection / np.maximum(union, 1e-7)
+
+
+def _fuse_score(cost: np.ndarray, detections: list[STrack]) -> np.ndarray:
+    if cost.size == 0:
+        return cost
+    scores = np.array([detection.score for detection in detections])
+    return 1 - (1 - cost) * scores[None, :]
+
+
+def _linear_assignment(
+    cost: np.ndarray, threshold: float
+) -> tuple[list[tuple[int, int]], np.ndarray, np.ndarray]:
+    if cost.size == 0:
+        return [], np.arange(cost.shape[0]), np.arange(cost.shape[1])
+    _, x, y = lap.lapjv(cost, extend_cost=True, cost_limit=threshold)
+    matches = [(i, int(j)) for i, j in enumerate(x) if j >= 0]
+    return matches, np.flatnonzero(x < 0), np.flatnonzero(y < 0)
+
+
+def _joint(a: list[STrack], b: list[STrack]) -> list[STrack]:
+    ids = {track.track_id for track in a}
+    return a + [track for track in b if track.track_id not in ids]
+
+
+def _subtract(a: list[STrack], b: list[STrack]) -> list[STrack]:
+    ids = {track.track_id for track in b}
+    return [track for track in a if track.track_id not in ids]
+
+
+def _remove_duplicates(
+    a: list[STrack], b: list[STrack]
+) -> tuple[list[STrack], list[STrack]]:
+    distance = _iou_distance(a, b)
+    duplicates_a, duplicates_b = set(), set()
+    for p, q in zip(*np.nonzero(distance < 0.15)):
+        age_p = a[p].frame_id - a[p].start_frame
+        age_q = b[q].frame_id - b[q].start_frame
+        if age_p > age_q:
+            duplicates_b.add(q)
+        else:
+            duplicates_a.add(p)
+    return (
+        [track for i, track in enumerate(a) if i not in duplicates_a],
+        [track for i, track in enumerate(b) if i not in duplicates_b],
+    )
+
+
+class ByteTracker:
+    """Associates detections across frames into tracks with stable ids.
+
+    `config` takes the keys of the ultralytics bytetrack.yaml.
+    """
+
+    def __init__(self, config: dict[str, Any], frame_rate: int = 30):
+        self._high_threshold = config["track_high_thresh"]
+        self._low_threshold = config["track_low_thresh"]
+        self._new_track_threshold = config["new_track_thresh"]
+        self._match_threshold = config["match_thresh"]
+        self._fuse_score = config.get("fuse_score", True)
+        self._max_time_lost = int(frame_rate / 30 * config["track_buffer"])
+        self._kalman_filter = KalmanFilterXYAH()
+        self.reset()
+
+    def reset(self) -> None:
+        self._tracked: list[STrack] = []
+        self._lost: list[STrack] = []
+        self._frame_id = 0
+        self._next_id = 0
+
+    def _new_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    def _predict(self, tracks: list[STrack]) -> None:
+        if not tracks:
+            return
+        mean = np.array([track.mean for track in tracks])
+        covariance = np.array([track.covariance for track in tracks])
+        for i, track in enumerate(tracks):
+            if track.state != TrackState.TRACKED:
+                mean[i][7] = 0
+        mean, covariance = self._kalman_filter.multi_predict(mean, covariance)
+        for track, track_mean, track_covariance in zip(tracks, mean, covariance):
+            track.mean = track_mean
+            track.covariance = track_covariance
+
+    def track(
+        self, boxes: np.ndarray, scores: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns the boxes, ids and scores of the tracks after this frame.
+
+        Like ultralytics, frames without detections don't update the tracker.
+        """
+        if len(boxes) == 0:
+            return (
+                np.empty((0, 4), dtype=int),
+                np.empty(0, dtype=int),
+                np.empty(0, dtype=float),
+            )
+        tracks = self.update(boxes, scores)
+        return tracks[:, :4].astype(int), tracks[:, 4].astype(int), tracks[:, 5]
+
+    def update(self, boxes: np.ndarray, scores: np.ndarray) -> np.ndarray:
+        """Takes xyxy boxes and scores of one frame.
+
+        Returns an array with a row per confirmed track, with the columns
+        x1, y1, x2, y2, track id, score and index of the matched detection.
+        """
+        self._frame_id += 1
+        activated, refound, lost, removed = [], [], [], []
+
+        high = scores >= self._high_threshold
+        low = (scores > self._low_threshold) & ~high
+        detections = [
+            STrack(box, score, idx)
+            for box, score, idx in zip(boxes[high], scores[high], np.flatnonzero(high))
+        ]
+        detections_low = [
+            STrack(box, score, idx)
+            for box, score, idx in zip(boxes[low], scores[low], np.flatnonzero(low))
+        ]
+
+        unconfirmed = [track for track in self._tracked if not track.is_activated]
+        tracked = [track for track in self._tracked if track.is_activated]
+
+        # First association, with the high score detections
+        pool = _joint(tracked, self._lost)
+        self._predict(pool)
+        cost = _iou_distance(pool, detections)
+        if self._fuse_score:
+            cost = _fuse_score(cost, detections)
+        matches, unmatched_tracks, unmatched_detections = _linear_assignment(
+            cost, self._match_threshold
+        )
+        for i, j in matches:
+            track = pool[i]
+            if track.state == TrackState.TRACKED:
+                track.update(self._kalman_filter, detections[j], self._frame_id)
+                activated.append(track)
+            else:
+                track.re_activate(self._kalman_filter, detections[j], self._frame_id)
+                refound.append(track)
+
+        # Second association, the remaining tracks with the low score detections
+        remaining = [
+            pool[i] for i in unmatched_tracks if pool[i].state == TrackState.TRACKED
+        ]
+        cost = _iou_distance(remaining, detections_low)
+        matches, unmatched_tracks, _ = _linear_assignment(cost, 0.5)
+        for i, j in matches:
+            track = remaining[i]
+            if track.state == TrackState.TRACKED:
+                track.update(self._kalman_filter, detections_low[j], self._frame_id)
+                activated.append(track)
+            else:
+                track.re_activate(
+                    self._kalman_filter, detections_low[j], self._frame_id
+                )
+                refound.append(track)
+        for i in unmatched_tracks:
+            track = remaining[i]
+            if track.state != TrackState.LOST:
+                track.state = TrackState.LOST
+                lost.append(track)
+
+        # Tracks seen in a single frame so far get one more chance to match
+        detections = [detections[i] for i in unmatched_detections]
+        cost = _iou_distance(unconfirmed, detections)
+        if self._fuse_score:
+            cost = _fuse_score(cost, detections)
+        matches, unmatched_unconfirmed, unmatched_detections = _linear_assignment(
+            cost, 0.7
+        )
+        for i, j in matches:
+            unconfirmed[i].update(self._kalman_filter, detections[j], self._frame_id)
+            activated.append(unconfirmed[i])
+        for i in unmatched_unconfirmed:
+            unconfirmed[i].state = TrackState.REMOVED
+            removed.append(unconfirmed[i])
+
+        for i in unmatched_detections:
+            track = detections[i]
+            if track.score < self._new_track_threshold:
+                continue
+            track.activate(self._kalman_filter, self._frame_id, self._new_id())
+            activated.append(track)
+
+        for track in self._lost:
+            if self._frame_id - track.end_frame > self._max_time_lost:
+                track.state = TrackState.REMOVED
+                removed.append(track)
+
+        self._tracked = [
+            track for track in self._tracked if track.state == TrackState.TRACKED
+        ]
+        self._tracked = _joint(_joint(self._tracked, activated), refound)
+        self._lost = _subtract(self._lost, self._tracked)
+        self._lost.extend(lost)
+        self._lost = _subtract(self._lost, removed)
+        self._tracked, self._lost = _remove_duplicates(self._tracked, self._lost)
+
+        return np.array(
+            [
+                [*track.xyxy, track.track_id, track.score, track.idx]
+                for track in self._tracked
+                if track.is_activated
+            ],
+            dtype=np.float32,
+        ).reshape(-1, 7)
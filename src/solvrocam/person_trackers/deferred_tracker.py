@@ -0,0 +1,75 @@
+import logging
+import threading
+from collections.abc import Callable, Iterable, Iterator
+
+import numpy as np
+
+from solvrocam.person_trackers.person_tracker import DetectionResult, PersonTracker
+from solvrocam.startup import StartupProfile
+
+
+class DeferredTracker(PersonTracker):
+    """Loads and warms up a tracker on a background thread.
+
+    The model imports, loading and the first inference overlap with starting
+    the camera. Everything but `wait_ready` blocks until the tracker is there,
+    and re-raises if loading it failed.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], PersonTracker],
+        logger: logging.Logger,
+        startup: StartupProfile | None = None,
+    ) -> None:
+        self._factory = factory
+        self._logger = logger
+        self._startup = startup or StartupProfile()
+        self._tracker: PersonTracker | None = None
+        self._error: BaseException | None = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._load, daemon=True)
+        self._thread.start()
+
+    def _load(self) -> None:
+        try:
+            with self._startup.step("load tracker"):
+                tracker = self._factory()
+            with self._startup.step("warm up tracker"):
+                tracker.warm_up()
+            self._tracker = tracker
+            self._logger.info("Person tracker ready.")
+        except BaseException as e:
+            self._error = e
+            self._logger.critical(f"Failed to load the person tracker: {e}")
+        finally:
+            self._ready.set()
+
+    def wait_ready(self, timeout: float | None = None) -> bool:
+        if not self._ready.wait(timeout):
+            return False
+        if self._error is not None:
+            raise RuntimeError("Person tracker failed to load") from self._error
+        return True
+
+    @property
+    def tracker(self) -> PersonTracker:
+        self.wait_ready()
+        assert self._tracker is not None
+        return self._tracker
+
+    @property
+    def full_resolution(self) -> bool:  # pyright: ignore[reportIncompatibleVariableOverride]
+        return self.tracker.full_resolution
+
+    def track_person(self, frame: np.ndarray) -> DetectionResult:
+        return self.tracker.track_person(frame)
+
+    def track_stream(self, frames: Iterable[np.ndarray]) -> Iterator[DetectionResult]:
+        return self.tracker.track_stream(frames)
+
+    def restart(self) -> bool:
+        return self._ready.is_set() and self.tracker.restart()
+
+    def warm_up(self) -> None:
+        self.wait_ready()
@@ -0,0 +1,195 @@
+import os
+import time
+from pathlib import Path
+
+import cv2
+import ncnn
+import numpy as np
+import yaml
+
+from solvrocam.person_trackers.bytetrack import ByteTracker
+from solvrocam.person_trackers.person_tracker import (
+    DetectionResult,
+    PersonTracker,
+    load_tracker_config,
+)
+
+
+class NCNNByteTracker(PersonTracker):
+    """Runs the exported YOLO NCNN model directly, without ultralytics or torch.
+
+    Preprocessing, decoding and NMS mirror what `YOLOByteTracker` gets from
+    ultralytics with the arguments `model.track` uses, so both trackers give
+    the same counts.
+    """
+
+    def __init__(
+        self,
+        detection_model: str | None = None,
+        tracking_method: str | None = None,
+        threads: int | None = None,
+        confidence_threshold: float = 0.1,
+        iou_threshold: float = 0.7,
+        max_detections: int = 300,
+        precision: str | None = None,
+    ) -> None:
+        if not detection_model:
+            # Without an explicit model, use the variant `solvrocam tune` picked
+            config = load_tracker_config()
+            detection_model = config.get("model") or str(
+                (Path(__file__).parent / "models" / "yolo11n_ncnn_model").resolve()
+            )
+            precision = precision or config.get("precision")
+        if not tracking_method:
+            tracking_method = str(
+                (Path(__file__).parent / "models" / "bytetrack.yaml").resolve()
+            )
+        if threads is None:
+            threads = int(os.getenv("NCNN_THREADS", os.cpu_count() or 1))
+
+        model_dir = Path(detection_model)
+        metadata = yaml.safe_load((model_dir / "metadata.yaml").read_text())
+        self._input_height, self._input_width = metadata["imgsz"]
+
+        self.net = ncnn.Net()
+        self.net.opt.use_vulkan_compute = False
+        self.net.opt.num_threads = threads
+        if precision == "fp32":
+            # ncnn stores and computes in fp16 where the CPU supports it
+            self.net.opt.use_fp16_packed = False
+            self.net.opt.use_fp16_storage = False
+            self.net.opt.use_fp16_arithmetic = False
+        elif precision not in (None, "fp16"):
+            raise ValueError(f"Unknown precision {precision}, expected fp16 or fp32")
+        self.net.load_param(str(model_dir / "model.ncnn.param"))
+        self.net.load_model(str(model_dir / "model.ncnn.bin"))
+
+        # Cameras sharing this detector each track with their own ByteTracker
+        self.tracking_config = yaml.safe_load(Path(tracking_method).read_text())
+        self.tracker = ByteTracker(self.tracking_config)
+        self.person_class_id = 0
+        self._confidence_threshold = confidence_threshold
+        self._iou_threshold = iou_threshold
+        self._max_detections = max_detections
+
+        # Letterboxed network input, padding stays filled between frames
+        self._input = np.empty(
+            (3, self._input_height, self._input_width), dtype=np.float32
+        )
+        self._letterbox: tuple[float, int, int, int, int] | None = None
+
+    def _preprocess(self, frame: np.ndarray) -> None:
+        height, width = frame.shape[:2]
+        gain = min(self._input_height / height, self._input_width / width)
+        resized_width = round(width * gain)
+        resized_height = round(height * gain)
+        pad_width = (self._input_width - resized_width) / 2
+        pad_height = (self._input_height - resized_height) / 2
+        top = round(pad_height - 0.1)
+        left = round(pad_width - 0.1)
+        letterbox = (gain, top, left, resized_height, resized_width)
+
+        if letterbox != self._letterbox:
+            self._input.fill(114 / 255)
+            self._letterbox = letterbox
+
+        if (resized_width, resized_height) != (width, height):
+            frame = cv2.resize(
+                frame, (resized_width, resized_height), interpolation=cv2.INTER_LINEAR
+            )
+        # BGR HWC uint8 to RGB CHW float in [0, 1], written straight into the input
+        np.multiply(
+            frame[..., ::-1].transpose(2, 0, 1),
+            1 / 255,
+            out=self._input[:, top : top + resized_height, left : left + resized_width],
+            casting="unsafe",
+        )
+
+    def _infer(self) -> np.ndarray:
+        # Extractors are cheap, reusing one via clear() crashes pyncnn
+        with self.net.create_extractor() as extractor:
+            extractor.input("in0", ncnn.Mat(self._input))
+            _, output = extractor.extract("out0")
+            # One column per anchor: cx, cy, w, h and a score per class
+            return np.array(output)
+
+    def _decode(self, output: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        scores = output[4 + self.person_class_id]
+        candidates = np.flatnonzero(scores > self._confidence_threshold)
+        # ultralytics assigns every box its best class before filtering by class
+        candidates = candidates[
+            output[4:, candidates].argmax(axis=0) == self.person_class_id
+        ]
+        scores = scores[candidates]
+
+        order = np.argsort(-scores)[:30000]
+        candidates, scores = candidates[order], scores[order]
+        center, size = output[:2, candidates].T, output[2:4, candidates].T
+        boxes = np.concatenate([center - size / 2, center + size / 2], axis=1)
+
+        keep = _nms(boxes, self._iou_threshold, self._max_detections)
+        return boxes[keep], scores[keep]
+
+    def _scale_boxes(self, boxes: np.ndarray, shape: tuple[int, ...]) -> np.ndarray:
+        assert self._letterbox is not None
+        gain, top, left, _, _ = self._letterbox
+        boxes = (boxes - [left, top, left, top]) / gain
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, shape[1])
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, shape[0])
+        return boxes
+
+    @property
+    def input_size(self) -> tuple[int, int]:
+        """Network input as width, height."""
+        return self._input_width, self._input_height
+
+    def warm_up(self) -> None:
+        self.detect(np.zeros((self._input_height, self._input_width, 3), np.uint8))
+
+    def detect(self, frame: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Returns xyxy person boxes in frame coordinates and their scores."""
+        self._preprocess(frame)
+        boxes, scores = self._decode(self._infer())
+        return self._scale_boxes(boxes, frame.shape), scores
+
+    def track_person(self, frame: np.ndarray) -> DetectionResult:
+        start = time.perf_counter()
+        self._preprocess(frame)
+        preprocessed = time.perf_counter()
+        output = self._infer()
+        inferred = time.perf_counter()
+        boxes, scores = self._decode(output)
+        boxes = self._scale_boxes(boxes, frame.shape)
+        decoded = time.perf_counter()
+
+        tracked_boxes, ids, confidences = self.tracker.track(boxes, scores)
+        tracked = time.perf_counter()
+
+        return DetectionResult(
+            boxes=tracked_boxes,
+            ids=ids,
+            confidences=confidences,
+            frame=frame,
+            timings={
+                "preprocess": preprocessed - start,
+                "inference": inferred - preprocessed,
+                "postprocess": decoded - inferred,
+                "tracking": tracked - decoded,
+            },
+        )
+
+
+def _nms(boxes: np.ndarray, iou_threshold: float, max_detections: int) -> np.ndarray:
+    """Greedy NMS over boxes sorted by descending score, returns kept indices."""
+    areas = np.prod(boxes[:, 2:] - boxes[:, :2], axis=1)
+    order = np.arange(len(boxes))
+    keep = []
+    while order.size > 0 and len(keep) < max_detections:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        top_left = np.maximum(boxes[best, :2], boxes[rest, :2])
+        bottom_right = np.minimum(boxes[best, 2:], boxes[rest, 2:])
+        intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=1)
+        iou = intersection / (areas[best] + areas[rest] - intersection + 1e-7)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=int)
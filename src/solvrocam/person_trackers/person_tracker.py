@@ -1,6 +1,42 @@
+import os
+import cv2
 import numpy as np
+import yaml
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from enum import StrEnum, auto, unique
+from pathlib import Path
+
+
+def annotate_frame(
+    frame: np.ndarray,
+    boxes: np.ndarray,
+    ids: np.ndarray | None,
+    out: np.ndarray | None = None,
+) -> np.ndarray:
+    """Draws boxes and ids onto a copy of the frame, reusing `out` if it fits."""
+    if out is None or out.shape != frame.shape or out.dtype != frame.dtype:
+        out = frame.copy()
+    else:
+        np.copyto(out, frame)
+
+    if ids is None:
+        return out
+
+    for box, person_id in zip(boxes, ids):
+        cv2.rectangle(out, (box[0], box[1]), (box[2], box[3]), (255, 0, 255), 2)
+        cv2.putText(
+            out,
+            f"{person_id}",
+            (box[0], box[1] - 10),
+            cv2.FONT_HERSHEY_COMPLEX,
+            0.9,
+            (255, 0, 255),
+            2,
+        )
+
+    return out
 
 
 @dataclass
@@ -8,10 +44,38 @@ class DetectionResult:
     boxes: np.ndarray
     ids: np.ndarray | None = None
     confidences: np.ndarray | None = None
-    processed_frame: np.ndarray | None = None
+    # The frame the detections were made on, annotated only on demand
+    frame: np.ndarray | None = None
+    # Per-stage durations in seconds, filled in by trackers that measure them
+    timings: dict[str, float] = field(default_factory=dict)
+    _processed_frame: np.ndarray | None = field(default=None, init=False, repr=False)
+
+    @property
+    def processed_frame(self) -> np.ndarray | None:
+        if self._processed_frame is None and self.frame is not None:
+            self._processed_frame = self.annotate()
+        return self._processed_frame
+
+    def annotate(self, out: np.ndarray | None = None) -> np.ndarray:
+        """Renders the annotated frame, into `out` when it is a reusable buffer."""
+        if self.frame is None:
+            raise ValueError("DetectionResult has no frame to annotate")
+        return annotate_frame(self.frame, self.boxes, self.ids, out)
+
+
+class TrackerUnavailable(RuntimeError):
+    """The tracker can't process frames right now, e.g. while it restarts."""
+
+
+class TrackerFailed(TrackerUnavailable):
+    """Tracking one frame failed, the next one may well succeed."""
 
 
 class PersonTracker(ABC):
+    # Trackers that tile frames themselves get full resolution frames instead
+    # of downscaled ones
+    full_resolution: bool = False
+
     @abstractmethod
     def __init__(self, detection_model: str, tracking_method: str) -> None:
         pass
@@ -19,3 +83,81 @@ class PersonTracker(ABC):
     @abstractmethod
     def track_person(self, frame: np.ndarray) -> DetectionResult:
         pass
+
+    def track_stream(self, frames: Iterable[np.ndarray]) -> Iterator[DetectionResult]:
+        """Tracks people across a sequence of frames, yielding results in order."""
+        for frame in frames:
+            yield self.track_person(frame)
+
+    def restart(self) -> bool:
+        """Recovers a hung or crashed tracker, returns whether it can."""
+        return False
+
+    def warm_up(self) -> None:
+        """Runs the model once so the first frame doesn't pay for lazy setup."""
+
+    def wait_ready(self, timeout: float | None = None) -> bool:
+        """Waits for a tracker loading in the background, returns whether it's ready."""
+        return True
+
+
+def default_tracker_config_path() -> Path | None:
+    config = os.getenv("TRACKER_CONFIG")
+    if config:
+        return Path(config)
+    if os.path.exists("/home/solvrocam/"):
+        return Path("/home/solvrocam/hardware-solvro-bot-office-cam/tracker.yaml")
+    return None
+
+
+def load_tracker_config(path: Path | None = None) -> dict:
+    """Reads the NCNN detector settings picked by `solvrocam tune`.
+
+    ```yaml
+    model: /path/to/yolo11n_ncnn_model
+    precision: fp16
+    # Frames are downscaled to this width, height before detection
+    frame_size: [640, 352]
+    ```
+
+    Missing keys keep the defaults, there are none without the file.
+    """
+    path = path or default_tracker_config_path()
+    if path is None or not path.exists():
+        return {}
+    return yaml.safe_load(path.read_text()) or {}
+
+
+def parse_frame_size(value: Iterable[int | str]) -> tuple[int, int]:
+    """Validates a width, height pair frames are downscaled to."""
+    try:
+        width, height = (int(size) for size in value)
+    except (TypeError, ValueError):
+        raise ValueError(f"A frame size is a width and a height, not {value}")
+    if width <= 0 or height <= 0 or width % 2 or height % 2:
+        # I420 frames need even sizes
+        raise ValueError(f"{width}x{height} isn't an even frame size")
+    return width, height
+
+
+@unique
+class TrackerBackend(StrEnum):
+    ULTRALYTICS = auto()
+    NCNN = auto()
+    TILED = auto()
+
+
+def create_tracker(backend: TrackerBackend) -> PersonTracker:
+    # lazy imports, only the ultralytics tracker needs torch
+    if backend == TrackerBackend.NCNN:
+        from solvrocam.person_trackers.ncnn_bytetracker import NCNNByteTracker
+
+        return NCNNByteTracker()
+    if backend == TrackerBackend.TILED:
+        from solvrocam.person_trackers.tiled_tracker import TiledTracker
+
+        return TiledTracker.from_config()
+
+    from solvrocam.person_trackers.yolo_bytetracker import YOLOByteTracker
+
+    return YOLOByteTracker()
@@ -0,0 +1,219 @@
+import atexit
+import logging
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+
+import numpy as np
+
+from solvrocam.person_trackers.person_tracker import (
+    DetectionResult,
+    PersonTracker,
+    TrackerBackend,
+    TrackerFailed,
+    TrackerUnavailable,
+    create_tracker,
+)
+
+
+def _track(
+    tracker: PersonTracker,
+    memory: shared_memory.SharedMemory,
+    shape: tuple[int, ...],
+    dtype: str,
+) -> tuple:
+    start = time.perf_counter()
+    frame = np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+    try:
+        result = tracker.track_person(frame)
+    except Exception as e:
+        return ("error", repr(e))
+    timings = result.timings | {"worker": time.perf_counter() - start}
+    return ("result", result.boxes, result.ids, result.confidences, timings)
+
+
+def _worker(backend: TrackerBackend, conn: Connection) -> None:
+    tracker = create_tracker(backend)
+    tracker.warm_up()
+    conn.send(("ready", tracker.full_resolution))
+
+    memory: shared_memory.SharedMemory | None = None
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+
+        name, shape, dtype = message
+        if memory is None or memory.name != name:
+            if memory is not None:
+                memory.close()
+            memory = shared_memory.SharedMemory(name=name)
+        conn.send(_track(tracker, memory, shape, dtype))
+
+    if memory is not None:
+        memory.close()
+
+
+class ProcessTracker(PersonTracker):
+    """Runs a tracker in a worker process, away from the GIL of the camera threads.
+
+    Frames are passed through a shared memory block and only the detections
+    are pickled back. A worker that dies or doesn't answer within `timeout`
+    seconds is killed and respawned, frames arriving while it starts raise
+    TrackerUnavailable.
+    """
+
+    def __init__(
+        self,
+        backend: TrackerBackend,
+        logger: logging.Logger,
+        timeout: float = 10.0,
+        startup_timeout: float = 120.0,
+        max_backoff: float = 60.0,
+    ) -> None:
+        self._backend = backend
+        self._logger = logger
+        self._timeout = timeout
+        self._max_backoff = max_backoff
+        # spawn, forking a process that already runs camera threads isn't safe
+        self._context = multiprocessing.get_context("spawn")
+
+        self._process: BaseProcess | None = None
+        self._conn: Connection | None = None
+        self._ready = False
+        self._failures = 0
+        self._respawn_at = 0.0
+        self._memory: shared_memory.SharedMemory | None = None
+
+        self._spawn()
+        assert self._conn is not None
+        if not self._conn.poll(startup_timeout) or not self._poll_ready():
+            self.close()
+            raise TrackerUnavailable(f"Person tracker worker didn't start ({backend})")
+        atexit.register(self.close)
+
+    def _spawn(self) -> None:
+        self._conn, child = self._context.Pipe()
+        self._process = self._context.Process(
+            target=_worker,
+            args=(self._backend, child),
+            name="person-tracker",
+            daemon=True,
+        )
+        self._process.start()
+        child.close()
+        self._ready = False
+        self._logger.info(f"Started person tracker worker {self._process.pid}")
+
+    def _poll_ready(self) -> bool:
+        assert self._conn is not None
+        if not self._ready and self._conn.poll():
+            try:
+                _, self.full_resolution = self._conn.recv()
+            except (EOFError, OSError):
+                return False
+            self._ready = True
+            self._logger.info("Person tracker worker is ready")
+        return self._ready
+
+    def _discard_worker(self, reason: str) -> None:
+        assert self._process is not None and self._conn is not None
+        if self._process.is_alive():
+            self._process.kill()
+        self._process.join()
+        self._conn.close()
+        self._failures += 1
+        delay = min(2.0 ** (self._failures - 1), self._max_backoff)
+        self._respawn_at = time.monotonic() + delay
+        self._logger.error(
+            f"Person tracker worker {reason} (exit code {self._process.exitcode}), "
+            f"respawning in {delay:.0f} seconds"
+        )
+        self._process = None
+        self._conn = None
+
+    def _ensure_worker(self) -> Connection:
+        if self._process is not None and not self._process.is_alive():
+            self._discard_worker("died")
+        if self._process is None:
+            if time.monotonic() < self._respawn_at:
+                raise TrackerUnavailable("Person tracker worker is down")
+            self._spawn()
+        if not self._poll_ready():
+            if not self._process.is_alive():  # pyright: ignore[reportOptionalMemberAccess]
+                self._discard_worker("died while starting")
+            raise TrackerUnavailable("Person tracker worker is starting")
+        assert self._conn is not None
+        return self._conn
+
+    def _write_input(self, frame: np.ndarray) -> str:
+        if self._memory is None or self._memory.size < frame.nbytes:
+            self._free_input()
+            self._memory = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+        np.copyto(
+            np.ndarray(frame.shape, dtype=frame.dtype, buffer=self._memory.buf), frame
+        )
+        return self._memory.name
+
+    def _free_input(self) -> None:
+        if self._memory is not None:
+            self._memory.close()
+            self._memory.unlink()
+            self._memory = None
+
+    def track_person(self, frame: np.ndarray) -> DetectionResult:
+        conn = self._ensure_worker()
+        start = time.perf_counter()
+        conn.send((self._write_input(frame), frame.shape, frame.dtype.str))
+
+        deadline = time.monotonic() + self._timeout
+        while not conn.poll(0.1):
+            if not self._process.is_alive():  # pyright: ignore[reportOptionalMemberAccess]
+                break
+            if time.monotonic() > deadline:
+                self._discard_worker(f"didn't answer within {self._timeout} seconds")
+                raise TrackerUnavailable("Person tracker worker hung")
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            self._discard_worker("died")
+            raise TrackerUnavailable("Person tracker worker died")
+        self._failures = 0
+
+        if message[0] == "error":
+            raise TrackerFailed(f"Person tracker failed: {message[1]}")
+        _, boxes, ids, confidences, timings = message
+        timings["transfer"] = time.perf_counter() - start - timings.pop("worker")
+        return DetectionResult(
+            boxes=boxes,
+            ids=ids,
+            confidences=confidences,
+            frame=frame,
+            timings=timings,
+        )
+
+    def restart(self) -> bool:
+        """Kills the worker, a call blocked on it raises and the next one respawns it."""
+        process = self._process
+        if process is not None and process.is_alive():
+            process.kill()
+        return True
+
+    def close(self) -> None:
+        if self._conn is not None and self._process is not None:
+            try:
+                self._conn.send(None)
+            except OSError:
+                pass
+            self._process.join(5)
+            if self._process.is_alive():
+                self._process.kill()
+            self._conn.close()
+            self._process = None
+            self._conn = None
+        self._free_input()
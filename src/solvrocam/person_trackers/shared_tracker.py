@@ -0,0 +1,167 @@
+import logging
+import threading
+import time
+from collections.abc import Callable
+
+import numpy as np
+
+from solvrocam.person_trackers.bytetrack import ByteTracker
+from solvrocam.person_trackers.ncnn_bytetracker import NCNNByteTracker
+from solvrocam.person_trackers.person_tracker import DetectionResult, PersonTracker
+from solvrocam.startup import StartupProfile
+
+
+class _Request:
+    def __init__(self, frame: np.ndarray):
+        self.frame = frame
+        self.result: tuple[np.ndarray, np.ndarray] | None = None
+        self.error: BaseException | None = None
+        self.done = threading.Event()
+
+
+class DetectionEngine:
+    """One detector serving the cameras of a process on its own thread.
+
+    The model is loaded and warmed up on that thread, like `DeferredTracker`
+    does. Cameras wait for their frame's detections, so each has at most one
+    frame queued. Every round the engine takes the waiting frames in turn,
+    starting after the camera that went first last time, which runs them
+    back to back on the loaded model and keeps a busy camera from starving
+    the others.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], NCNNByteTracker],
+        logger: logging.Logger,
+        startup: StartupProfile | None = None,
+    ) -> None:
+        self._factory = factory
+        self._logger = logger
+        self._startup = startup or StartupProfile()
+        self.detector: NCNNByteTracker | None = None
+        self._error: BaseException | None = None
+        self._ready = threading.Event()
+
+        self._condition = threading.Condition()
+        self._cameras: list[str] = []
+        self._pending: dict[str, _Request] = {}
+        self._next = 0
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def tracker(self, camera: str) -> "SharedTracker":
+        """A tracker for `camera`, with tracks of its own."""
+        with self._condition:
+            if camera in self._cameras:
+                raise ValueError(f"Camera {camera} already has a tracker")
+            self._cameras.append(camera)
+        return SharedTracker(self, camera)
+
+    def wait_ready(self, timeout: float | None = None) -> bool:
+        if not self._ready.wait(timeout):
+            return False
+        if self._error is not None:
+            raise RuntimeError("Person detector failed to load") from self._error
+        return True
+
+    def detect(self, camera: str, frame: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Waits for the detections of `frame` in its camera's turn."""
+        self.wait_ready()
+        request = _Request(frame)
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("Detection engine stopped")
+            self._pending[camera] = request
+            self._condition.notify()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        assert request.result is not None
+        return request.result
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join(5)
+
+    def _run(self) -> None:
+        try:
+            with self._startup.step("load tracker"):
+                detector = self._factory()
+            with self._startup.step("warm up tracker"):
+                detector.warm_up()
+            self.detector = detector
+            self._logger.info("Shared person detector ready.")
+        except BaseException as e:
+            self._error = e
+            self._logger.critical(f"Failed to load the person detector: {e}")
+            return
+        finally:
+            self._ready.set()
+
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    for request in self._pending.values():
+                        request.error = RuntimeError("Detection engine stopped")
+                        request.done.set()
+                    return
+                batch = self._take_round()
+            for request in batch:
+                try:
+                    request.result = detector.detect(request.frame)
+                except Exception as e:
+                    request.error = e
+                request.done.set()
+
+    def _take_round(self) -> list[_Request]:
+        """The waiting frames, one per camera in round-robin order."""
+        order = self._cameras[self._next :] + self._cameras[: self._next]
+        batch = []
+        for camera in order:
+            request = self._pending.pop(camera, None)
+            if request is not None:
+                if not batch:
+                    self._next = (self._cameras.index(camera) + 1) % len(self._cameras)
+                batch.append(request)
+        return batch
+
+
+class SharedTracker(PersonTracker):
+    """Tracks people of one camera on detections from a shared engine."""
+
+    def __init__(self, engine: DetectionEngine, camera: str) -> None:
+        self._engine = engine
+        self.camera = camera
+        self.tracker: ByteTracker | None = None
+
+    def wait_ready(self, timeout: float | None = None) -> bool:
+        return self._engine.wait_ready(timeout)
+
+    def warm_up(self) -> None:
+        self._engine.wait_ready()
+
+    def track_person(self, frame: np.ndarray) -> DetectionResult:
+        start = time.perf_counter()
+        boxes, scores = self._engine.detect(self.camera, frame)
+        detected = time.perf_counter()
+
+        if self.tracker is None:
+            assert self._engine.detector is not None
+            self.tracker = ByteTracker(self._engine.detector.tracking_config)
+        tracked_boxes, ids, confidences = self.tracker.track(boxes, scores)
+        tracked = time.perf_counter()
+
+        return DetectionResult(
+            boxes=tracked_boxes,
+            ids=ids,
+            confidences=confidences,
+            frame=frame,
+            # Includes waiting for the other cameras' frames
+            timings={"detection": detected - start, "tracking": tracked - detected},
+        )
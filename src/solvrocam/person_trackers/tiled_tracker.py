@@ -0,0 +1,97 @@
+import time
+
+import numpy as np
+
+from solvrocam.person_trackers.ncnn_bytetracker import NCNNByteTracker
+from solvrocam.person_trackers.person_tracker import DetectionResult, PersonTracker
+from solvrocam.regions import (
+    Regions,
+    default_regions_path,
+    load_regions,
+    merge_tiles,
+    plan_tiles,
+)
+
+
+class TiledTracker(PersonTracker):
+    """Detects people on overlapping crops of a full resolution frame.
+
+    Each tile is detected at the model's input resolution, so people far from
+    the camera keep enough pixels to be found. Only the bounds of the regions
+    are tiled, detections from all tiles are merged before ByteTrack.
+    """
+
+    full_resolution = True
+
+    def __init__(
+        self,
+        detection_model: str | None = None,
+        tracking_method: str | None = None,
+        regions: Regions | None = None,
+        rows: int = 1,
+        columns: int | None = None,
+        overlap: float = 0.15,
+        merge_threshold: float = 0.6,
+    ) -> None:
+        self.detector = NCNNByteTracker(detection_model, tracking_method)
+        self.tracker = self.detector.tracker
+        self._regions = regions
+        self._rows = rows
+        self._columns = columns
+        self._overlap = overlap
+        self._merge_threshold = merge_threshold
+        self._tiles: dict[tuple[int, int], list[tuple[int, int, int, int]]] = {}
+
+    @classmethod
+    def from_config(cls) -> "TiledTracker":
+        regions, tiles = load_regions(default_regions_path())
+        return cls(regions=regions, **tiles)
+
+    def warm_up(self) -> None:
+        self.detector.warm_up()
+
+    def tiles(self, shape: tuple[int, ...]) -> list[tuple[int, int, int, int]]:
+        height, width = shape[:2]
+        tiles = self._tiles.get((height, width))
+        if tiles is None:
+            bounds = (
+                self._regions.pixel_bounds(width, height)
+                if self._regions
+                else (0, 0, width, height)
+            )
+            tiles = self._tiles[(height, width)] = plan_tiles(
+                bounds,
+                self.detector.input_size,
+                rows=self._rows,
+                columns=self._columns,
+                overlap=self._overlap,
+            )
+        return tiles
+
+    def track_person(self, frame: np.ndarray) -> DetectionResult:
+        start = time.perf_counter()
+        tile_boxes, tile_scores, tile_indices = [], [], []
+        for index, (x1, y1, x2, y2) in enumerate(self.tiles(frame.shape)):
+            boxes, scores = self.detector.detect(frame[y1:y2, x1:x2])
+            tile_boxes.append(boxes + [x1, y1, x1, y1])
+            tile_scores.append(scores)
+            tile_indices.append(np.full(len(boxes), index))
+        boxes = np.concatenate(tile_boxes)
+        scores = np.concatenate(tile_scores)
+        detected = time.perf_counter()
+
+        keep = merge_tiles(
+            boxes, scores, np.concatenate(tile_indices), self._merge_threshold
+        )
+        boxes, scores = boxes[keep], scores[keep]
+
+        tracked_boxes, ids, confidences = self.tracker.track(boxes, scores)
+        tracked = time.perf_counter()
+
+        return DetectionResult(
+            boxes=tracked_boxes,
+            ids=ids,
+            confidences=confidences,
+            frame=frame,
+            timings={"detection": detected - start, "tracking": tracked - detected},
+        )
@@ -1,10 +1,33 @@
-import cv2
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from itertools import chain
+from queue import Empty, Full, Queue
+from typing import Any, TypeVar
+
 import torch
 import numpy as np
 from ultralytics import YOLO
+from ultralytics.engine.results import Boxes
+from ultralytics.trackers.byte_tracker import BYTETracker
+from ultralytics.utils import YAML, IterableSimpleNamespace, ops
 from pathlib import Path
 
-from solvrocam.person_trackers.person_tracker import PersonTracker, DetectionResult
+from solvrocam.person_trackers.person_tracker import (
+    PersonTracker,
+    DetectionResult,
+    TrackerUnavailable,
+)
+
+# Frame, preprocessed image and timings
+_Preprocessed = tuple[np.ndarray, Any, dict[str, float]]
+# Frame, preprocessed image, predictions and timings
+_Inferred = tuple[np.ndarray, Any, Any, dict[str, float]]
+_Item = TypeVar("_Item")
+
+# What `YOLO.track` detects at by default, ByteTrack's second association
+# (track_low_thresh) relies on these low score detections
+TRACK_CONFIDENCE = 0.1
 
 
 class YOLOByteTracker(PersonTracker):
@@ -24,13 +47,28 @@ class YOLOByteTracker(PersonTracker):
         self.tracking_config = tracking_method
         self.person_class_id = 0
 
+    def warm_up(self) -> None:
+        # predict builds the same predictor as track, without tracker state
+        self.model.predict(
+            np.zeros((480, 864, 3), dtype=np.uint8),
+            classes=[self.person_class_id],
+            conf=TRACK_CONFIDENCE,
+            verbose=False,
+        )
+
     def track_person(self, frame: np.ndarray) -> DetectionResult:
+        start = time.perf_counter()
         results = self.model.track(
             source=frame,
             persist=True,
             tracker=self.tracking_config,
             classes=[self.person_class_id],
+            conf=TRACK_CONFIDENCE,
         )
+        track_time = time.perf_counter() - start
+        # ultralytics profiles preprocess, inference and postprocess in ms,
+        # the tracker update runs in a callback outside of those profilers
+        inference_time = sum(results[0].speed.values()) / 1000
 
         boxes = np.empty((0, 4), dtype=int)
         ids = np.empty(0, dtype=int)
@@ -47,13 +85,15 @@ class YOLOByteTracker(PersonTracker):
             if results[0].boxes.id is not None:
                 ids = self._to_numpy(results[0].boxes.id).astype(int)
 
-        annotated_frame = self.annotate_frame(frame, boxes, ids)
-
         return DetectionResult(
             boxes=boxes,
             ids=ids,
             confidences=confidences,
-            processed_frame=annotated_frame,
+            frame=frame,
+            timings={
+                "inference": inference_time,
+                "tracking": max(track_time - inference_time, 0.0),
+            },
         )
 
     def _to_numpy(self, array: np.ndarray | torch.Tensor) -> np.ndarray:
@@ -61,23 +101,145 @@ class YOLOByteTracker(PersonTracker):
             return array.cpu().numpy()
         return np.asarray(array)
 
-    def annotate_frame(
-        self, frame: np.ndarray, boxes: np.ndarray, ids: np.ndarray
-    ) -> np.ndarray:
-        annotated_frame = frame.copy()
+    def track_stream(
+        self, frames: Iterable[np.ndarray], depth: int = 2
+    ) -> Iterator[DetectionResult]:
+        """Tracks people across a sequence of frames with a three stage pipeline.
 
-        for box, person_id in zip(boxes, ids):
-            cv2.rectangle(
-                annotated_frame, (box[0], box[1]), (box[2], box[3]), (255, 0, 255), 2
+        Preprocessing of frame N+1 and inference of frame N run on their own
+        threads while NMS and the tracker update of frame N-1 run on the caller's
+        thread, so results still reach ByteTrack in order. `depth` bounds the
+        number of frames waiting between stages. The stream gets its own
+        tracker state, independent of `track_person`.
+        """
+        iterator = iter(frames)
+        first = next(iterator, None)
+        if first is None:
+            return
+        if self.model.predictor is None:
+            # Sets up the predictor with the same arguments track_person uses
+            self.model.predict(
+                source=first,
+                classes=[self.person_class_id],
+                conf=TRACK_CONFIDENCE,
+                verbose=False,
             )
-            cv2.putText(
-                annotated_frame,
-                f"{person_id}",
-                (box[0], box[1] - 10),
-                cv2.FONT_HERSHEY_COMPLEX,
-                0.9,
-                (255, 0, 255),
-                2,
+        predictor = self.model.predictor
+        if predictor is None:
+            raise TrackerUnavailable("The detection model has no predictor")
+        tracker = BYTETracker(
+            args=IterableSimpleNamespace(**YAML.load(self.tracking_config)),
+            frame_rate=30,
+        )
+
+        # None marks the end of the frames flowing through the pipeline
+        preprocessed: Queue[_Preprocessed | Exception | None] = Queue(maxsize=depth)
+        inferred: Queue[_Inferred | Exception | None] = Queue(maxsize=depth)
+        stopped = threading.Event()
+
+        def put(queue: Queue[_Item], item: _Item) -> bool:
+            while not stopped.is_set():
+                try:
+                    queue.put(item, timeout=0.1)
+                    return True
+                except Full:
+                    pass
+            return False
+
+        def get(queue: Queue[_Item | None]) -> _Item | None:
+            while not stopped.is_set():
+                try:
+                    return queue.get(timeout=0.1)
+                except Empty:
+                    pass
+            return None
+
+        def preprocess_worker():
+            try:
+                for frame in chain([first], iterator):
+                    start = time.perf_counter()
+                    image = predictor.preprocess([frame])
+                    timings = {"preprocess": time.perf_counter() - start}
+                    if not put(preprocessed, (frame, image, timings)):
+                        return
+                put(preprocessed, None)
+            except Exception as e:
+                put(preprocessed, e)
+
+        def inference_worker():
+            while (item := get(preprocessed)) is not None:
+                if isinstance(item, Exception):
+                    put(inferred, item)
+                    return
+                frame, image, timings = item
+                try:
+                    start = time.perf_counter()
+                    with torch.inference_mode():
+                        preds = predictor.inference(image)
+                    timings["inference"] = time.perf_counter() - start
+                except Exception as e:
+                    put(inferred, e)
+                    return
+                if not put(inferred, (frame, image, preds, timings)):
+                    return
+            put(inferred, None)
+
+        workers = [
+            threading.Thread(target=preprocess_worker, daemon=True),
+            threading.Thread(target=inference_worker, daemon=True),
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            while (item := get(inferred)) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                frame, image, preds, timings = item
+                start = time.perf_counter()
+                result = self._update_tracker(tracker, predictor, frame, image, preds)
+                result.timings = timings | {"tracking": time.perf_counter() - start}
+                yield result
+        finally:
+            stopped.set()
+            for worker in workers:
+                worker.join()
+
+    def _update_tracker(
+        self,
+        tracker: BYTETracker,
+        predictor,
+        frame: np.ndarray,
+        image: torch.Tensor,
+        preds,
+    ) -> DetectionResult:
+        # Not predictor.args.conf, a plain predict call may have changed it
+        detections = ops.non_max_suppression(
+            preds,
+            TRACK_CONFIDENCE,
+            predictor.args.iou,
+            [self.person_class_id],
+            max_det=predictor.args.max_det,
+        )[0]
+        detections[:, :4] = ops.scale_boxes(
+            image.shape[2:], detections[:, :4], frame.shape
+        )
+
+        boxes = np.empty((0, 4), dtype=int)
+        ids = np.empty(0, dtype=int)
+        confidences = np.empty(0, dtype=float)
+
+        # Like track_person, frames without detections don't update the tracker
+        if len(detections) > 0:
+            tracks = tracker.update(
+                Boxes(detections.cpu().numpy(), frame.shape[:2]), frame
             )
+            if len(tracks) > 0:
+                # Columns are x1, y1, x2, y2, track id, score, class, index
+                boxes = tracks[:, :4].astype(int)
+                ids = tracks[:, 4].astype(int)
+                confidences = tracks[:, 5]
 
-        return annotated_frame
+        return DetectionResult(
+            boxes=boxes, ids=ids, confidences=confidences, frame=frame
+        )
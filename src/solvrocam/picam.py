@@ -1,17 +1,66 @@
 import logging
+import os
 import sys
+from pathlib import Path
 
 import typer
+from typing_extensions import Annotated
 
 from solvrocam.logs import setup_logging
+from solvrocam.person_trackers.deferred_tracker import DeferredTracker
+from solvrocam.person_trackers.person_tracker import (
+    PersonTracker,
+    TrackerBackend,
+    create_tracker,
+)
 from solvrocam.preview import CV2Preview  # pyright: ignore[reportMissingImports]
+from solvrocam.snapshot import SnapshotEncoder
+from solvrocam.startup import StartupProfile
 
 
 app = typer.Typer()
 
 
 @app.command()
-def camera():
+def camera(
+    tracker: Annotated[
+        TrackerBackend,
+        typer.Option(
+            "--tracker",
+            "-t",
+            case_sensitive=False,
+            envvar="PERSON_TRACKER",
+            help="Person tracker implementation",
+        ),
+    ] = TrackerBackend.ULTRALYTICS,
+    isolate: Annotated[
+        bool,
+        typer.Option(
+            "--isolate",
+            envvar="TRACKER_PROCESS",
+            help="Run the person tracker in a separate, automatically respawned process",
+        ),
+    ] = False,
+    profile_startup: Annotated[
+        bool,
+        typer.Option(
+            "--profile-startup",
+            help="Print how long each startup step took once the first frame is processed",
+        ),
+    ] = False,
+    cameras: Annotated[
+        Path | None,
+        typer.Option(
+            "--cameras",
+            envvar="CAMERAS_CONFIG",
+            exists=True,
+            dir_okay=False,
+            help="YAML file with several cameras to serve with one NCNN detector, --tracker and --isolate don't apply",
+        ),
+    ] = None,
+):
+    startup = StartupProfile(report=profile_startup)
+    startup.mark("command")
     logger = logging.getLogger(__name__)
     setup_logging(logger)
 
@@ -26,20 +75,55 @@ def camera():
 
     sys.excepthook = handle_exception
 
+    if cameras is not None:
+        sys.exit(_camera_group(cameras, logger, startup))
+
+    def load_tracker() -> PersonTracker:
+        if isolate:
+            from solvrocam.person_trackers.process_tracker import ProcessTracker
+
+            return ProcessTracker(tracker, logger)
+        return create_tracker(tracker)
+
+    # The model loads and warms up while the camera starts, the first frame
+    # waits for it
+    person_tracker = DeferredTracker(load_tracker, logger, startup)
+
     # lazy import to improve cli responsiveness, these imports take 1s
-    from solvrocam.person_trackers.yolo_bytetracker import YOLOByteTracker
-    from solvrocam.detection import Solvrocam
-    solvrocam = Solvrocam(CV2Preview(logger), YOLOByteTracker(), logger)
+    with startup.step("import pipeline"):
+        from solvrocam.detection import Solvrocam
+
+    snapshots = SnapshotEncoder()
+    solvrocam = Solvrocam(
+        CV2Preview(logger, snapshots), person_tracker, logger, snapshots, startup
+    )
     solvrocam.start_camera()
 
     try:
         while True:
-            solvrocam.capture_and_queue("main")
+            solvrocam.capture_and_queue()
     except KeyboardInterrupt:
         logger.info("Received keyboard interrupt, shutting down...")
     finally:
         solvrocam.stop_camera()
 
 
+def _camera_group(config: Path, logger: logging.Logger, startup: StartupProfile) -> int:
+    """Serves the cameras in `config` with one NCNN detector loaded for all."""
+    from solvrocam.multicam import load_cameras, run_cameras
+    from solvrocam.person_trackers.ncnn_bytetracker import NCNNByteTracker
+    from solvrocam.person_trackers.shared_tracker import DetectionEngine
+
+    try:
+        cameras = load_cameras(config)
+    except (ValueError, KeyError) as e:
+        raise typer.BadParameter(f"Invalid camera configuration: {e}")
+    logger.info(f"Serving cameras {', '.join(camera.name for camera in cameras)}.")
+    engine = DetectionEngine(NCNNByteTracker, logger, startup)
+    return run_cameras(
+        cameras, engine, logger, startup, os.getenv("DETECTION_STREAM", "lores")
+    )
+
+
 if __name__ == "__main__":
     camera()
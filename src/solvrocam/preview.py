@@ -2,18 +2,22 @@ import logging
 import socket
 import struct
 from abc import ABC, abstractmethod
-from enum import StrEnum, auto, unique
+from enum import IntEnum, StrEnum, auto, unique
 from os import getenv
 from pathlib import Path
 from queue import Empty, Full, Queue
-from threading import Thread, current_thread
+from threading import Event, Lock, Thread, current_thread
+from time import time
 
 import cv2
 import numpy as np
 import numpy.typing as npt
+import simplejpeg
 import typer
 from typing_extensions import Annotated
 
+from solvrocam.snapshot import SnapshotEncoder
+
 
 @unique
 class Output(StrEnum):
@@ -23,6 +27,62 @@ class Output(StrEnum):
     ANNOTATED = auto()
 
 
+@unique
+class Encoding(IntEnum):
+    RAW = 0
+    JPEG = 1
+
+
+# Every frame on the preview stream is prefixed with this header:
+# magic, protocol version, encoding, channels, height, width, capture timestamp
+# and the payload size in bytes. Raw payloads are always uint8.
+FRAME_MAGIC = b"SCAM"
+PROTOCOL_VERSION = 1
+FRAME_HEADER = struct.Struct(">4sBBBIIdI")
+
+
+def encode_frame(
+    frame: npt.NDArray[np.uint8],
+    encoding: Encoding,
+    quality: int = 80,
+    timestamp: float | None = None,
+    encoder: SnapshotEncoder | None = None,
+) -> bytes:
+    height, width = frame.shape[:2]
+    channels = frame.shape[2] if frame.ndim == 3 else 1
+    if encoding == Encoding.JPEG and encoder is not None:
+        # Same encoder settings as the stills sent to the core
+        payload = encoder.encode(frame, quality=quality, max_width=0)
+    elif encoding == Encoding.JPEG:
+        payload = simplejpeg.encode_jpeg(
+            np.ascontiguousarray(frame).reshape(height, width, channels),
+            quality=quality,
+            colorspace="BGR" if channels == 3 else "GRAY",
+        )
+    else:
+        payload = frame.tobytes()
+    header = FRAME_HEADER.pack(
+        FRAME_MAGIC,
+        PROTOCOL_VERSION,
+        encoding,
+        channels,
+        height,
+        width,
+        time() if timestamp is None else timestamp,
+        len(payload),
+    )
+    return header + payload
+
+
+def decode_frame(header: tuple, payload: bytes | bytearray) -> npt.NDArray[np.uint8]:
+    _, _, encoding, channels, height, width, _, _ = header
+    if encoding == Encoding.JPEG:
+        return simplejpeg.decode_jpeg(
+            bytes(payload), colorspace="BGR" if channels == 3 else "GRAY"
+        )
+    return np.frombuffer(payload, dtype=np.uint8).reshape(height, width, channels)
+
+
 class Preview(ABC):
     @abstractmethod
     def __init__(self):
@@ -43,16 +103,40 @@ class Preview(ABC):
         pass
 
 
+class NullPreview(Preview):
+    """Preview that never outputs anything, for headless runs."""
+
+    def __init__(self):
+        pass
+
+    def show(self, frame: npt.NDArray[np.uint8]):
+        pass
+
+    @property
+    def output(self) -> Output:
+        return Output.OFF
+
+    @output.setter
+    def output(self, output: Output):
+        pass
+
+
 class CV2Preview(Preview):
-    def __init__(self, logger: logging.Logger):
+    def __init__(self, logger: logging.Logger, encoder: SnapshotEncoder | None = None):
         self._output: Output = Output.OFF
         self._logger = logger
+        self._encoder = encoder
         self._port = int(getenv("PREVIEW_PORT", "6900"))
         self._stream_port = int(getenv("PREVIEW_STREAM_PORT", "6901"))
+        self._encoding = Encoding[getenv("PREVIEW_ENCODING", "jpeg").upper()]
+        self._quality = int(getenv("PREVIEW_QUALITY", "80"))
         self._socket_thread = Thread(target=self._socket_listener, daemon=True)
         self._socket_thread.start()
         self._frame_queue: Queue = Queue(maxsize=1)
         self._frame_sender_thread: Thread | None = None
+        # One single-slot queue of encoded frames per connected viewer
+        self._clients: set[Queue] = set()
+        self._clients_lock = Lock()
 
     @property
     def output(self) -> Output:
@@ -85,7 +169,7 @@ class CV2Preview(Preview):
         if self.output != Output.OFF:
             try:
                 # Non-blocking put
-                self._frame_queue.put_nowait(frame)
+                self._frame_queue.put_nowait((frame, time()))
             except Full:
                 # Queue is full, drop frame
                 pass
@@ -93,38 +177,90 @@ class CV2Preview(Preview):
     def _frame_sender_worker(self):
         PORT = self._stream_port
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.setsockopt(
-            socket.SOL_SOCKET, socket.SO_SNDBUF, socket.SO_VM_SOCKETS_BUFFER_MAX_SIZE
-        )
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        accept_thread: Thread | None = None
         try:
             sock.bind(("127.0.0.1", PORT))
             sock.listen()
+            sock.settimeout(0.1)
             self._logger.info(f"Preview stream socket listening on port {PORT}")
-            conn, _ = sock.accept()
-            with conn:
-                self._logger.info("Preview client connected")
-                while self.output != Output.OFF:
+            # Set once a viewer connected, after it's registered in the clients
+            connected = Event()
+            accept_thread = Thread(
+                target=self._accept_clients, args=(sock, connected), daemon=True
+            )
+            accept_thread.start()
+            while self.output != Output.OFF:
+                try:
+                    frame, timestamp = self._frame_queue.get(timeout=0.1)
+                except Empty:
+                    frame, timestamp = None, None
+
+                had_clients = connected.is_set()
+                with self._clients_lock:
+                    clients = list(self._clients)
+                if had_clients and not clients:
+                    self._logger.info("All preview clients disconnected")
+                    break
+                if frame is None or not clients:
+                    continue
+
+                # Encode once, fan out to every viewer
+                packet = encode_frame(
+                    frame, self._encoding, self._quality, timestamp, self._encoder
+                )
+                for client in clients:
                     try:
-                        frame = self._frame_queue.get(timeout=0.1)
-                        # Send frame metadata (shape)
-                        shape = frame.shape
-                        header = struct.pack(">III", *shape)
-                        conn.sendall(header)
-                        # Send frame data
-                        conn.sendall(frame.tobytes())
-                    except Empty:
-                        pass  # No new frame
-                    except (BrokenPipeError, ConnectionResetError):
-                        self._logger.info("Preview client disconnected")
-                        break  # client disconnected, wait for new one
+                        client.put_nowait(packet)
+                    except Full:
+                        # The client is still sending the previous frame, replace it
+                        try:
+                            client.get_nowait()
+                        except Empty:
+                            pass
+                        client.put_nowait(packet)
         except Exception as e:
             self._logger.error(f"Frame sender error: {e}", exc_info=True)
         finally:
             self.output = Output.OFF
+            if accept_thread is not None:
+                accept_thread.join()
             sock.close()
             self._logger.info("Preview stream socket closed")
 
+    def _accept_clients(self, sock: socket.socket, connected: Event):
+        """Accepts viewers on their own thread, so frames never wait for accept()."""
+        while self.output != Output.OFF:
+            try:
+                conn, _ = sock.accept()
+            except socket.timeout:
+                continue
+            except OSError as e:
+                self._logger.error(f"Failed to accept preview client: {e}")
+                break
+            packets: Queue = Queue(maxsize=1)
+            # Registered before its thread runs, the sender can't miss it
+            with self._clients_lock:
+                self._clients.add(packets)
+            connected.set()
+            Thread(
+                target=self._client_worker, args=(conn, packets), daemon=True
+            ).start()
+
+    def _client_worker(self, conn: socket.socket, packets: Queue):
+        with conn:
+            self._logger.info("Preview client connected")
+            while self.output != Output.OFF:
+                try:
+                    conn.sendall(packets.get(timeout=0.1))
+                except Empty:
+                    pass  # No new frame
+                except OSError:
+                    self._logger.info("Preview client disconnected")
+                    break
+        with self._clients_lock:
+            self._clients.discard(packets)
+
     def _socket_listener(self):
         PORT = self._port
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -234,10 +370,6 @@ def start(
 
     PORT = int(getenv("PREVIEW_STREAM_PORT", "6901"))
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.setsockopt(
-        socket.SOL_SOCKET, socket.SO_RCVBUF, socket.SO_VM_SOCKETS_BUFFER_MAX_SIZE
-    )
-    header_size = struct.calcsize(">III")
     video_writer = None
 
     try:
@@ -248,19 +380,25 @@ def start(
 
         while True:
             # Receive header
-            header_data = _recv_all(sock, header_size)
+            header_data = _recv_all(sock, FRAME_HEADER.size)
             if not header_data:
                 break
-            shape = struct.unpack(">III", header_data)
+            header = FRAME_HEADER.unpack(header_data)
+            magic, version = header[:2]
+            if magic != FRAME_MAGIC or version != PROTOCOL_VERSION:
+                typer.echo(
+                    f"Unsupported preview stream (magic {magic}, version {version})",
+                    err=True,
+                )
+                break
 
             # Receive frame data
-            frame_size = shape[0] * shape[1] * shape[2]
-            frame_data = _recv_all(sock, frame_size)
+            frame_data = _recv_all(sock, header[-1])
             if not frame_data:
                 break
 
             # Reconstruct frame
-            frame = np.frombuffer(frame_data, dtype=np.uint8).reshape(shape)
+            frame = decode_frame(header, frame_data)
 
             if output and video_writer is None:
                 height, width, _ = frame.shape
@@ -0,0 +1,49 @@
+import resource
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class StageTimer:
+    """Collects wall-clock samples for named processing stages."""
+
+    def __init__(self):
+        self._samples: dict[str, list[float]] = defaultdict(list)
+
+    def record(self, stage: str, seconds: float) -> None:
+        self._samples[stage].append(seconds)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def reset(self) -> None:
+        self._samples.clear()
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """Returns per-stage statistics in milliseconds."""
+        summary = {}
+        for stage, samples in sorted(self._samples.items()):
+            values = np.array(samples) * 1000
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            summary[stage] = {
+                "count": len(values),
+                "total": float(values.sum()),
+                "mean": float(values.mean()),
+                "p50": float(p50),
+                "p95": float(p95),
+                "p99": float(p99),
+                "max": float(values.max()),
+            }
+        return summary
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
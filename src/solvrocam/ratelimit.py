@@ -0,0 +1,305 @@
+"""Rate control for calls made from several threads or an event loop.
+
+Everything measures time with a monotonic `clock`, so wall-clock jumps from
+NTP don't matter. Delayed (trailing) calls are started through a `schedule`
+function taking a delay and a callback and returning a cancel function. It
+defaults to a daemon `threading.Timer`, or `loop.call_later` for coroutine
+functions. Passing a fake clock and scheduler makes the behaviour
+deterministic.
+"""
+
+import asyncio
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any, Generic, TypeVar
+
+Clock = Callable[[], float]
+Cancel = Callable[[], None]
+Schedule = Callable[[float, Callable[[], None]], Cancel]
+
+K = TypeVar("K", bound=Hashable)
+
+
+def thread_schedule(delay: float, callback: Callable[[], None]) -> Cancel:
+    timer = threading.Timer(delay, callback)
+    timer.daemon = True
+    timer.start()
+    return timer.cancel
+
+
+def loop_schedule(delay: float, callback: Callable[[], None]) -> Cancel:
+    """Schedules on the running event loop, must be called from inside it."""
+    return asyncio.get_running_loop().call_later(delay, callback).cancel
+
+
+def _runner(func: Callable) -> Callable:
+    """Makes calling a coroutine function start a task on the running loop."""
+    if inspect.iscoroutinefunction(func):
+        return lambda *args, **kwargs: asyncio.ensure_future(func(*args, **kwargs))
+    return func
+
+
+class Debouncer:
+    """Calls `func` once calls stopped coming for `wait` seconds.
+
+    With `leading` the first call of a burst goes through immediately, with
+    `trailing` the last call of a burst runs once the burst is over. A burst
+    with a single call and both edges enabled only runs once.
+    """
+
+    def __init__(
+        self,
+        func: Callable,
+        wait: float,
+        leading: bool = False,
+        trailing: bool = True,
+        schedule: Schedule | None = None,
+    ):
+        self._func = _runner(func)
+        self._wait = wait
+        self._leading = leading
+        self._trailing = trailing
+        self._schedule = schedule or (
+            loop_schedule if inspect.iscoroutinefunction(func) else thread_schedule
+        )
+        self._lock = threading.Lock()
+        self._cancel: Cancel | None = None
+        self._pending: tuple[tuple, dict] | None = None
+
+    def __call__(self, *args, **kwargs) -> Any:
+        with self._lock:
+            run_now = self._leading and self._cancel is None
+            if not run_now:
+                self._pending = (args, kwargs)
+            if self._cancel is not None:
+                self._cancel()
+            self._cancel = self._schedule(self._wait, self._fire)
+        if run_now:
+            return self._func(*args, **kwargs)
+        return None
+
+    def _fire(self) -> None:
+        with self._lock:
+            self._cancel = None
+            pending, self._pending = self._pending, None
+        if pending is not None and self._trailing:
+            self._func(*pending[0], **pending[1])
+
+    def cancel(self) -> None:
+        """Drops the pending trailing call."""
+        with self._lock:
+            if self._cancel is not None:
+                self._cancel()
+            self._cancel = None
+            self._pending = None
+
+    def flush(self) -> None:
+        """Runs the pending trailing call right away."""
+        with self._lock:
+            if self._cancel is not None:
+                self._cancel()
+        self._fire()
+
+
+class Throttle:
+    """Lets `func` run at most once every `interval` seconds.
+
+    Calls within the interval are dropped, unless `trailing` is set, then the
+    latest of them runs as soon as the interval is over.
+    """
+
+    def __init__(
+        self,
+        func: Callable,
+        interval: float,
+        trailing: bool = False,
+        clock: Clock = time.monotonic,
+        schedule: Schedule | None = None,
+    ):
+        self._func = _runner(func)
+        self._interval = interval
+        self._trailing = trailing
+        self._clock = clock
+        self._schedule = schedule or (
+            loop_schedule if inspect.iscoroutinefunction(func) else thread_schedule
+        )
+        self._lock = threading.Lock()
+        self._last: float | None = None
+        self._cancel: Cancel | None = None
+        self._pending: tuple[tuple, dict] | None = None
+
+    def __call__(self, *args, **kwargs) -> Any:
+        with self._lock:
+            now = self._clock()
+            elapsed = None if self._last is None else now - self._last
+            if self._cancel is None and (elapsed is None or elapsed >= self._interval):
+                self._last = now
+                run_now = True
+            else:
+                run_now = False
+                if self._trailing:
+                    self._pending = (args, kwargs)
+                    if self._cancel is None:
+                        assert elapsed is not None
+                        self._cancel = self._schedule(
+                            self._interval - elapsed, self._fire
+                        )
+        if run_now:
+            return self._func(*args, **kwargs)
+        return None
+
+    def ready(self) -> bool:
+        """Whether a call right now would run right away."""
+        with self._lock:
+            return self._cancel is None and (
+                self._last is None or self._clock() - self._last >= self._interval
+            )
+
+    def _fire(self) -> None:
+        with self._lock:
+            self._cancel = None
+            pending, self._pending = self._pending, None
+            if pending is not None:
+                self._last = self._clock()
+        if pending is not None:
+            self._func(*pending[0], **pending[1])
+
+    def cancel(self) -> None:
+        """Drops the pending trailing call."""
+        with self._lock:
+            if self._cancel is not None:
+                self._cancel()
+            self._cancel = None
+            self._pending = None
+
+    def flush(self) -> None:
+        """Runs the pending trailing call right away."""
+        with self._lock:
+            if self._cancel is not None:
+                self._cancel()
+        self._fire()
+
+
+class TokenBucket:
+    """Allows bursts of up to `capacity` calls, refilled at `rate` per second."""
+
+    def __init__(self, rate: float, capacity: float, clock: Clock = time.monotonic):
+        self._rate = rate
+        self._capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(
+            self._capacity, self._tokens + (now - self._updated) * self._rate
+        )
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def delay(self, tokens: float = 1) -> float:
+        """Seconds until `tokens` are available."""
+        with self._lock:
+            self._refill()
+            return max(tokens - self._tokens, 0) / self._rate
+
+    def acquire(self, tokens: float = 1, timeout: float | None = None) -> bool:
+        """Blocks until `tokens` are taken, or returns False after `timeout`."""
+        deadline = None if timeout is None else self._clock() + timeout
+        while not self.try_acquire(tokens):
+            delay = self.delay(tokens)
+            if deadline is not None:
+                remaining = deadline - self._clock()
+                if remaining < delay:
+                    return False
+            time.sleep(delay)
+        return True
+
+    async def acquire_async(self, tokens: float = 1) -> None:
+        while not self.try_acquire(tokens):
+            await asyncio.sleep(self.delay(tokens))
+
+
+class KeyedLimiter(Generic[K]):
+    """One token bucket per key, e.g. per log message or per endpoint.
+
+    Only the `max_keys` most recently used keys are remembered.
+    """
+
+    def __init__(self, factory: Callable[[], TokenBucket], max_keys: int = 1024):
+        self._factory = factory
+        self._max_keys = max_keys
+        self._buckets: OrderedDict[K, TokenBucket] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, key: K, tokens: float = 1) -> bool:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = self._factory()
+                while len(self._buckets) > self._max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+        return bucket.try_acquire(tokens)
+
+
+class _PerInstance:
+    """Decorator state, kept per instance when decorating a method."""
+
+    def __init__(self, func: Callable, factory: Callable[[Callable], Callable]):
+        functools.update_wrapper(self, func)
+        self._func = func
+        self._factory = factory
+        self._limited = factory(func)
+        self._name = f"_{func.__name__}_limited"
+
+    def __call__(self, *args, **kwargs):
+        return self._limited(*args, **kwargs)
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        limited = instance.__dict__.get(self._name)
+        if limited is None:
+            limited = instance.__dict__.setdefault(
+                self._name, self._factory(self._func.__get__(instance, owner))
+            )
+        return limited
+
+
+def debounce(
+    wait: float,
+    leading: bool = False,
+    trailing: bool = True,
+    schedule: Schedule | None = None,
+) -> Callable[[Callable], Callable]:
+    """Decorator form of Debouncer, methods are debounced per instance."""
+    return lambda func: _PerInstance(
+        func, lambda bound: Debouncer(bound, wait, leading, trailing, schedule)
+    )
+
+
+def throttle(
+    interval: float,
+    trailing: bool = False,
+    clock: Clock = time.monotonic,
+    schedule: Schedule | None = None,
+) -> Callable[[Callable], Callable]:
+    """Decorator form of Throttle, methods are throttled per instance."""
+    return lambda func: _PerInstance(
+        func, lambda bound: Throttle(bound, interval, trailing, clock, schedule)
+    )
@@ -0,0 +1,165 @@
+import os
+from pathlib import Path
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+import yaml
+
+
+def default_regions_path() -> Path | None:
+    regions = os.getenv("REGIONS_CONFIG")
+    if regions:
+        return Path(regions)
+    path = Path("/home/solvrocam/hardware-solvro-bot-office-cam/regions.yaml")
+    return path if path.exists() else None
+
+
+class Regions:
+    """Polygons of the frame where people are counted.
+
+    Coordinates are fractions of the frame width and height, so the same
+    polygons apply to every stream and resolution. A person is inside when
+    the bottom center of their box, roughly their feet, is.
+    """
+
+    def __init__(self, polygons: list[npt.ArrayLike]):
+        self.polygons = [np.asarray(polygon, dtype=np.float64) for polygon in polygons]
+        if not self.polygons or any(
+            polygon.ndim != 2 or polygon.shape[0] < 3 or polygon.shape[1] != 2
+            for polygon in self.polygons
+        ):
+            raise ValueError("Regions need at least one polygon of 3 or more points")
+        self._masks: dict[tuple[int, int], npt.NDArray[np.bool_]] = {}
+
+    @property
+    def bounds(self) -> tuple[float, float, float, float]:
+        """Bounding box of all polygons as x1, y1, x2, y2 fractions."""
+        points = np.clip(np.concatenate(self.polygons), 0, 1)
+        x1, y1 = points.min(axis=0)
+        x2, y2 = points.max(axis=0)
+        return float(x1), float(y1), float(x2), float(y2)
+
+    def pixel_bounds(
+        self, width: int, height: int, align: int = 1
+    ) -> tuple[int, int, int, int]:
+        """Bounds in pixels, widened to multiples of `align`."""
+        x1, y1, x2, y2 = self.bounds
+        return (
+            int(x1 * width) // align * align,
+            int(y1 * height) // align * align,
+            min(-(-int(np.ceil(x2 * width)) // align) * align, width),
+            min(-(-int(np.ceil(y2 * height)) // align) * align, height),
+        )
+
+    def relative_to(self, bounds: tuple[float, float, float, float]) -> "Regions":
+        """Returns the polygons in the coordinates of a crop of the frame."""
+        x1, y1, x2, y2 = bounds
+        origin = np.array([x1, y1])
+        size = np.array([x2 - x1, y2 - y1])
+        return Regions([(polygon - origin) / size for polygon in self.polygons])
+
+    def _mask(self, height: int, width: int) -> npt.NDArray[np.bool_]:
+        mask = self._masks.get((height, width))
+        if mask is None:
+            canvas = np.zeros((height, width), dtype=np.uint8)
+            cv2.fillPoly(
+                canvas,
+                [
+                    np.round(polygon * [width, height]).astype(np.int32)
+                    for polygon in self.polygons
+                ],
+                1,
+            )
+            mask = self._masks[(height, width)] = canvas.astype(bool)
+        return mask
+
+    def contains(
+        self, boxes: np.ndarray, shape: tuple[int, ...]
+    ) -> npt.NDArray[np.bool_]:
+        """Which xyxy boxes of an image of `shape` stand inside the regions."""
+        height, width = shape[:2]
+        mask = self._mask(height, width)
+        x = np.clip((boxes[:, 0] + boxes[:, 2]) // 2, 0, width - 1).astype(int)
+        y = np.clip(boxes[:, 3] - 1, 0, height - 1).astype(int)
+        return mask[y, x]
+
+
+def load_regions(path: Path | None) -> tuple[Regions | None, dict]:
+    """Reads the regions and the tiling options from a YAML file.
+
+    ```yaml
+    regions:
+      - [[0.0, 0.3], [1.0, 0.3], [1.0, 1.0], [0.0, 1.0]]
+    tiles:
+      rows: 1
+      columns: 3
+      overlap: 0.15
+    ```
+    """
+    if path is None:
+        return None, {}
+    config = yaml.safe_load(path.read_text()) or {}
+    polygons = config.get("regions")
+    return (Regions(polygons) if polygons else None), config.get("tiles") or {}
+
+
+def plan_tiles(
+    bounds: tuple[int, int, int, int],
+    input_size: tuple[int, int],
+    rows: int = 1,
+    columns: int | None = None,
+    overlap: float = 0.15,
+) -> list[tuple[int, int, int, int]]:
+    """Splits the pixel bounds into a grid of equally sized, overlapping tiles.
+
+    Without `columns`, enough are used for the tiles to roughly match the
+    aspect ratio of the detector input (width, height).
+    """
+    x1, y1, x2, y2 = bounds
+    width, height = x2 - x1, y2 - y1
+    if columns is None:
+        tile_aspect = (width / height) * rows
+        columns = max(1, round(tile_aspect / (input_size[0] / input_size[1])))
+
+    # Tiles overlap their neighbours by `overlap` of their own size
+    tile_width = round(width / (columns - (columns - 1) * overlap))
+    tile_height = round(height / (rows - (rows - 1) * overlap))
+    tiles = []
+    for row in range(rows):
+        top = y1 + round(row * (height - tile_height) / max(rows - 1, 1))
+        for column in range(columns):
+            left = x1 + round(column * (width - tile_width) / max(columns - 1, 1))
+            tiles.append((left, top, left + tile_width, top + tile_height))
+    return tiles
+
+
+def merge_tiles(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    tiles: np.ndarray,
+    threshold: float = 0.6,
+) -> np.ndarray:
+    """Returns the indices of detections kept after merging overlapping tiles.
+
+    A person in the overlap of two tiles is found twice, often cut off in one
+    of them, so the overlap is measured against the smaller box. Only boxes
+    from different tiles suppress each other, each tile went through NMS.
+    """
+    order = np.argsort(-scores)
+    areas = np.prod(boxes[:, 2:] - boxes[:, :2], axis=1)
+    keep: list[int] = []
+    for index in order:
+        if keep:
+            kept = np.array(keep)
+            top_left = np.maximum(boxes[index, :2], boxes[kept, :2])
+            bottom_right = np.minimum(boxes[index, 2:], boxes[kept, 2:])
+            intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=1)
+            smaller = np.minimum(areas[index], areas[kept]) + 1e-7
+            duplicate = (intersection / smaller > threshold) & (
+                tiles[kept] != tiles[index]
+            )
+            if duplicate.any():
+                continue
+        keep.append(int(index))
+    return np.array(keep, dtype=int)
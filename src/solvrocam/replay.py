@@ -0,0 +1,146 @@
+import logging
+import time
+from pathlib import Path
+
+import typer
+from typing_extensions import Annotated
+
+from solvrocam.logs import setup_logging
+from solvrocam.person_trackers.person_tracker import TrackerBackend, create_tracker
+from solvrocam.preview import CV2Preview
+from solvrocam.snapshot import SnapshotEncoder
+from solvrocam.sources import EndOfStream, FrameRecorder, open_source
+
+app = typer.Typer()
+
+
+@app.command()
+def replay(
+    source: Annotated[
+        str,
+        typer.Argument(
+            help='Recording, video file, directory of frames or "synthetic"',
+        ),
+    ],
+    realtime: Annotated[
+        bool,
+        typer.Option(
+            "--realtime/--max-speed",
+            help="Play frames at their recorded pace or as fast as they are read",
+        ),
+    ] = True,
+    loop: Annotated[
+        bool,
+        typer.Option(help="Start over when the source runs out"),
+    ] = False,
+    tracker: Annotated[
+        TrackerBackend,
+        typer.Option(
+            "--tracker",
+            "-t",
+            case_sensitive=False,
+            envvar="PERSON_TRACKER",
+            help="Person tracker implementation",
+        ),
+    ] = TrackerBackend.ULTRALYTICS,
+):
+    """
+    Run the camera service on frames from a recording instead of the camera.
+    """
+    logger = logging.getLogger(__name__)
+    setup_logging(logger)
+
+    # lazy import to improve cli responsiveness, these imports take 1s
+    from solvrocam.detection import Solvrocam
+
+    try:
+        frame_source = open_source(source, realtime=realtime, loop=loop)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+
+    snapshots = SnapshotEncoder()
+    solvrocam = Solvrocam(
+        CV2Preview(logger, snapshots), create_tracker(tracker), logger, snapshots
+    )
+    solvrocam.start_camera(frame_source)
+
+    exit_code = 1
+    try:
+        while solvrocam.capture_and_queue():
+            pass
+        logger.info("Frame source ran out, shutting down...")
+        exit_code = 0
+    except KeyboardInterrupt:
+        logger.info("Received keyboard interrupt, shutting down...")
+        exit_code = 0
+    finally:
+        solvrocam.stop_camera(exit_code)
+
+
+@app.command()
+def record(
+    output: Annotated[
+        Path,
+        typer.Argument(file_okay=False, help="Directory to write the recording to"),
+    ],
+    source: Annotated[
+        str,
+        typer.Option(
+            "--source",
+            "-s",
+            help='"camera", a video file, a directory of frames or "synthetic"',
+        ),
+    ] = "camera",
+    seconds: Annotated[
+        float | None,
+        typer.Option(help="Stop recording after this many seconds"),
+    ] = None,
+    frames: Annotated[
+        int | None,
+        typer.Option("--frames", "-n", help="Stop recording after this many frames"),
+    ] = None,
+    codec: Annotated[
+        str,
+        typer.Option(help='"raw" keeps frames exactly, "jpeg" is smaller'),
+    ] = "raw",
+    stream: Annotated[
+        str,
+        typer.Option(
+            envvar="DETECTION_STREAM",
+            help="Camera stream to record, lores or main",
+        ),
+    ] = "lores",
+):
+    """
+    Record frames and their timestamps for replay.
+    """
+    logger = logging.getLogger(__name__)
+    setup_logging(logger)
+
+    if seconds is None and frames is None and source in ("camera", "synthetic"):
+        raise typer.BadParameter("Live sources need --seconds or --frames")
+    try:
+        frame_source = open_source(source, stream=stream)
+        recorder = FrameRecorder(output, frame_source.frame_format, codec)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+
+    frame_source.start()
+    deadline = None if seconds is None else time.monotonic() + seconds
+    try:
+        with recorder:
+            while (frames is None or recorder.frames < frames) and (
+                deadline is None or time.monotonic() < deadline
+            ):
+                frame_source.capture(recorder.write)
+    except EndOfStream:
+        pass
+    except KeyboardInterrupt:
+        logger.info("Received keyboard interrupt, stopping the recording...")
+    finally:
+        frame_source.stop()
+    logger.info(f"Recorded {recorder.frames} frames to {output}")
+
+
+if __name__ == "__main__":
+    app()
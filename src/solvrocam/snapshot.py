@@ -0,0 +1,49 @@
+import os
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+import simplejpeg
+
+
+class SnapshotEncoder:
+    """Encodes frames to JPEG with simplejpeg.
+
+    Frames wider than `max_width` are downscaled first, 0 keeps the full
+    resolution.
+    """
+
+    def __init__(self, quality: int | None = None, max_width: int | None = None):
+        self.quality = (
+            int(os.getenv("SNAPSHOT_QUALITY", "85")) if quality is None else quality
+        )
+        self.max_width = (
+            int(os.getenv("SNAPSHOT_WIDTH", "0")) if max_width is None else max_width
+        )
+
+    def encode(
+        self,
+        frame: npt.NDArray[np.uint8],
+        quality: int | None = None,
+        max_width: int | None = None,
+    ) -> bytes:
+        quality = self.quality if quality is None else quality
+        max_width = self.max_width if max_width is None else max_width
+
+        height, width = frame.shape[:2]
+        if max_width and width > max_width:
+            frame = cv2.resize(
+                frame,
+                (max_width, round(height * max_width / width)),
+                interpolation=cv2.INTER_AREA,
+            )
+            height, width = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        # 4:2:0 like cv2.imencode, simplejpeg defaults to the slower 4:4:4
+        return simplejpeg.encode_jpeg(
+            np.ascontiguousarray(frame).reshape(height, width, channels),
+            quality=quality,
+            colorspace="BGR" if channels == 3 else "GRAY",
+            colorsubsampling="420" if channels == 3 else "Gray",
+            fastdct=True,
+        )
@@ -0,0 +1,470 @@
+import json
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from typing import Any, TypeVar
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+
+try:
+    from picamera2 import MappedArray, Picamera2  # pyright: ignore[reportMissingImports]
+    from libcamera import Transform  # pyright: ignore[reportMissingImports]
+except ModuleNotFoundError:
+    pass
+
+T = TypeVar("T")
+
+IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".png", ".bmp", ".tiff"]
+
+# Receives a frame and the monotonic time it was captured at
+Sink = Callable[[npt.NDArray[np.uint8], float], T]
+
+
+class EndOfStream(Exception):
+    pass
+
+
+class FrameSource(ABC):
+    """Where Solvrocam gets its frames from, the camera or a stand-in for it."""
+
+    # Pixel layout of the frames, "BGR" or "YUV420" (I420 planes stacked vertically)
+    frame_format = "BGR"
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    @abstractmethod
+    def capture(self, sink: Sink[T]) -> T:
+        """Passes the next frame to `sink` and returns what it returned.
+
+        The frame may be a view of a buffer that is reused after the call,
+        sinks copy what they keep. Raises EndOfStream when there are no more.
+        """
+
+    def still(self) -> npt.NDArray[np.uint8] | None:
+        """A higher resolution BGR image of the scene, if the source has one."""
+        return None
+
+    def set_frame_rate(self, fps: float) -> None:
+        """Captures at most `fps` frames per second, where the source can."""
+
+    def __iter__(self) -> Iterator[npt.NDArray[np.uint8]]:
+        """Yields frames owned by the caller until the source runs out."""
+        while True:
+            try:
+                yield self.capture(lambda frame, _: frame.copy())
+            except EndOfStream:
+                return
+
+
+class Picamera2Source(FrameSource):
+    """Captures one stream of the Raspberry Pi camera number `camera_num`.
+
+    "lores" is the small YUV420 stream also used for RTMP, "main" the full
+    resolution RGB one.
+    """
+
+    def __init__(self, stream: str = "lores", camera_num: int = 0):
+        self.stream = stream
+        self.camera_num = camera_num
+        self.frame_format = "YUV420" if stream == "lores" else "BGR"
+        self.frame_rate = 30.0
+        self.picam2: Picamera2 | None = None
+
+    def start(self) -> None:
+        self.picam2 = Picamera2(self.camera_num)
+
+        main_size = (4608, 2592)
+        main_format = "RGB888"
+        # This resolution MUST be at most 1920x1080 or else the encoder fails
+        lores_size = (1920, 1080)
+        # lores stream MUST be YUV420
+        lores_format = "YUV420"
+        video_config = self.picam2.create_video_configuration(
+            main={"size": main_size, "format": main_format},
+            lores={"size": lores_size, "format": lores_format},
+            display=None,
+            transform=Transform(hflip=True, vflip=True),
+            encode="lores",
+            buffer_count=5,
+            controls={"FrameRate": self.frame_rate},
+        )
+
+        self.picam2.configure(video_config)
+        self.picam2.start()
+
+    def stop(self) -> None:
+        if self.picam2:
+            if self.picam2.encoders:
+                self.picam2.stop_recording()
+            self.picam2.stop()
+
+    def set_frame_rate(self, fps: float) -> None:
+        self.frame_rate = fps
+        if self.picam2 is not None:
+            # Applied to the running camera, the encoder follows its frame rate
+            self.picam2.set_controls({"FrameRate": fps})
+
+    def capture(self, sink: Sink[T]) -> T:
+        assert self.picam2 is not None
+        # capture async so that if the camera crashes the thread doesn't hang waiting
+        # async allows to wait with a timeout
+        job = self.picam2.capture_request(wait=False)
+        request = self.picam2.wait(job, timeout=0.3)
+        try:
+            # Hands out the camera buffer itself, no copy
+            with MappedArray(request, self.stream) as mapped:
+                return sink(mapped.array, time.monotonic())
+        finally:
+            request.release()
+
+    def still(self) -> npt.NDArray[np.uint8] | None:
+        if self.picam2 is None or self.stream == "main":
+            return None
+        # The main stream is only copied out of the camera buffers on demand
+        job = self.picam2.capture_array("main", wait=False)
+        return self.picam2.wait(job, timeout=0.3)
+
+
+class PlaybackSource(FrameSource):
+    """Plays frames that aren't live, as fast as they are read or in real time.
+
+    In real time frames come at their recorded times, or at `fps` when there
+    are none, so a slow pipeline drops frames like it would on the camera.
+    """
+
+    def __init__(self, realtime: bool = False, loop: bool = False, fps: float = 30.0):
+        self.realtime = realtime
+        self.loop = loop
+        self.fps = fps
+        # Frames closer than this to the previous one are skipped in real time,
+        # like a camera capturing at a lower frame rate
+        self.max_frame_rate: float | None = None
+        self._playing: Iterator[npt.NDArray[np.uint8]] | None = None
+
+    @abstractmethod
+    def _frames(self) -> Iterator[tuple[npt.NDArray[np.uint8], float | None]]:
+        """Yields every frame once, with its time since the first one if known."""
+
+    def _play(self) -> Iterator[npt.NDArray[np.uint8]]:
+        started: float | None = None
+        # Media time of the start of the current pass when looping
+        offset = 0.0
+        last_played = float("-inf")
+        while True:
+            media_time = -1 / self.fps
+            for index, (frame, recorded) in enumerate(self._frames()):
+                media_time = index / self.fps if recorded is None else recorded
+                if self.realtime:
+                    if self.max_frame_rate:
+                        # Some slack for timestamps jittering around the rate
+                        if (
+                            offset + media_time - last_played
+                            < 0.9 / self.max_frame_rate
+                        ):
+                            continue
+                        last_played = offset + media_time
+                    if started is None:
+                        started = time.monotonic() - offset - media_time
+                    delay = started + offset + media_time - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                yield frame
+            if not self.loop or media_time < 0:
+                return
+            offset += media_time + 1 / self.fps
+
+    def set_frame_rate(self, fps: float) -> None:
+        self.max_frame_rate = fps
+
+    def start(self) -> None:
+        self._playing = self._play()
+
+    def capture(self, sink: Sink[T]) -> T:
+        if self._playing is None:
+            self.start()
+        assert self._playing is not None
+        frame = next(self._playing, None)
+        if frame is None:
+            raise EndOfStream
+        return sink(frame, time.monotonic())
+
+    def __iter__(self) -> Iterator[npt.NDArray[np.uint8]]:
+        # Decoded frames aren't reused, no need to copy them
+        return self._play()
+
+
+class VideoSource(PlaybackSource):
+    def __init__(self, path: Path, realtime: bool = False, loop: bool = False):
+        self.path = path
+        cap = cv2.VideoCapture(str(path))
+        if not cap.isOpened():
+            raise ValueError(f"Failed to open video: {path}")
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        cap.release()
+        super().__init__(realtime, loop, fps if fps > 0 else 30.0)
+
+    def _frames(self) -> Iterator[tuple[npt.NDArray[np.uint8], float | None]]:
+        cap = cv2.VideoCapture(str(self.path))
+        try:
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                yield frame.astype(np.uint8), None
+        finally:
+            cap.release()
+
+
+class ImageDirectorySource(PlaybackSource):
+    def __init__(
+        self,
+        path: Path,
+        realtime: bool = False,
+        loop: bool = False,
+        fps: float = 30.0,
+    ):
+        super().__init__(realtime, loop, fps)
+        self.paths = sorted(
+            image_path
+            for image_path in path.iterdir()
+            if image_path.suffix.lower() in IMAGE_EXTENSIONS
+        )
+
+    def _frames(self) -> Iterator[tuple[npt.NDArray[np.uint8], float | None]]:
+        for image_path in self.paths:
+            frame = cv2.imread(str(image_path))
+            if frame is not None:
+                yield frame.astype(np.uint8), None
+
+
+class SyntheticSource(PlaybackSource):
+    """Boxes walking across a gradient, for exercising the pipeline.
+
+    The frames are deterministic for a `seed`. Without `frames` the source
+    never runs out.
+    """
+
+    def __init__(
+        self,
+        size: tuple[int, int] = (1920, 1080),
+        people: int = 3,
+        frames: int | None = None,
+        realtime: bool = False,
+        fps: float = 30.0,
+        seed: int = 0,
+    ):
+        super().__init__(realtime, loop=False, fps=fps)
+        self.size = size
+        self.frames = frames
+        width, height = size
+        rng = np.random.default_rng(seed)
+        self._positions = rng.uniform([0, 0.3], [1, 0.7], (people, 2)) * size
+        self._velocities = rng.uniform(-3, 3, (people, 2))
+        self._colors = rng.integers(0, 255, (people, 3))
+        self._background = np.empty((height, width, 3), dtype=np.uint8)
+        self._background[:] = np.linspace(40, 200, width, dtype=np.uint8)[:, None]
+
+    def _frames(self) -> Iterator[tuple[npt.NDArray[np.uint8], float | None]]:
+        height = self.size[1]
+        box = np.array([height / 10, height / 4])
+        index = 0
+        while self.frames is None or index < self.frames:
+            frame = self._background.copy()
+            # Bounce back and forth between the edges
+            span = np.array(self.size) - box
+            positions = (self._positions + self._velocities * index) % (2 * span)
+            positions = span - np.abs(positions - span)
+            for (x, y), color in zip(positions.astype(int), self._colors):
+                cv2.rectangle(
+                    frame,
+                    (x, y),
+                    (x + int(box[0]), y + int(box[1])),
+                    color.tolist(),
+                    -1,
+                )
+            yield frame, None
+            index += 1
+
+
+class FrameRecorder:
+    """Dumps frames and their capture times to a directory, for RecordingSource.
+
+    Frames are appended to chunk files of `chunk_frames` frames each, next to
+    an index of their timestamps and sizes written when the chunk is full.
+    "raw" keeps frames exactly, YUV420 included, "jpeg" is a lot smaller but
+    replays as BGR.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        frame_format: str = "BGR",
+        codec: str = "raw",
+        chunk_frames: int = 300,
+        quality: int = 90,
+    ):
+        if codec not in ("raw", "jpeg"):
+            raise ValueError(f"Unknown codec: {codec}")
+        self.path = path
+        self.frame_format = frame_format
+        self.codec = codec
+        self.quality = quality
+        self._chunk_frames = chunk_frames
+        self._chunk = 0
+        self._file: Any = None
+        self._timestamps: list[float] = []
+        self._sizes: list[int] = []
+        self._shape: tuple[int, ...] | None = None
+        self.frames = 0
+        path.mkdir(parents=True, exist_ok=True)
+
+    def write(self, frame: npt.NDArray[np.uint8], timestamp: float) -> None:
+        if self._shape is None:
+            self._shape = frame.shape
+            (self.path / "meta.json").write_text(
+                json.dumps(
+                    {
+                        "version": 1,
+                        "format": self.frame_format,
+                        "codec": self.codec,
+                        "shape": frame.shape,
+                        "dtype": frame.dtype.str,
+                    }
+                )
+            )
+        elif frame.shape != self._shape:
+            raise ValueError(f"Frame shape changed to {frame.shape}")
+
+        if self._file is None:
+            self._file = open(self.path / f"{self._chunk:05d}.bin", "wb")
+        data = self._encode(frame)
+        self._file.write(data)
+        self._timestamps.append(timestamp)
+        self._sizes.append(len(data))
+        self.frames += 1
+        if len(self._timestamps) >= self._chunk_frames:
+            self._close_chunk()
+
+    def _encode(self, frame: npt.NDArray[np.uint8]) -> bytes | memoryview:
+        if self.codec == "raw":
+            return memoryview(np.ascontiguousarray(frame)).cast("B")
+        import simplejpeg
+
+        if self.frame_format == "YUV420":
+            height = frame.shape[0] * 2 // 3
+            width = frame.shape[1]
+            planes = frame.reshape(-1)
+            y = planes[: width * height].reshape(height, width)
+            u = planes[width * height : width * height * 5 // 4]
+            v = planes[width * height * 5 // 4 :]
+            return simplejpeg.encode_jpeg_yuv_planes(
+                y,
+                u.reshape(height // 2, width // 2),
+                v.reshape(height // 2, width // 2),
+                quality=self.quality,
+                fastdct=True,
+            )
+        return simplejpeg.encode_jpeg(
+            np.ascontiguousarray(frame),
+            quality=self.quality,
+            colorspace="BGR",
+            colorsubsampling="420",
+            fastdct=True,
+        )
+
+    def _close_chunk(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        np.savez(
+            self.path / f"{self._chunk:05d}.npz",
+            timestamps=np.array(self._timestamps, dtype=np.float64),
+            sizes=np.array(self._sizes, dtype=np.int64),
+        )
+        self._file = None
+        self._timestamps = []
+        self._sizes = []
+        self._chunk += 1
+
+    def close(self) -> None:
+        self._close_chunk()
+
+    def __enter__(self) -> "FrameRecorder":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class RecordingSource(PlaybackSource):
+    """Replays a FrameRecorder directory, in real time at the recorded pace."""
+
+    def __init__(self, path: Path, realtime: bool = False, loop: bool = False):
+        super().__init__(realtime, loop)
+        self.path = path
+        meta = json.loads((path / "meta.json").read_text())
+        self.codec = meta["codec"]
+        self.shape = tuple(meta["shape"])
+        self.dtype = np.dtype(meta["dtype"])
+        # JPEG only decodes back to BGR
+        self.frame_format = meta["format"] if self.codec == "raw" else "BGR"
+        # A chunk without an index wasn't finished, e.g. the recorder crashed
+        self.chunks = sorted(
+            chunk for chunk in path.glob("*.bin") if chunk.with_suffix(".npz").exists()
+        )
+
+    def _frames(self) -> Iterator[tuple[npt.NDArray[np.uint8], float | None]]:
+        first: float | None = None
+        for chunk in self.chunks:
+            index = np.load(chunk.with_suffix(".npz"))
+            offsets = np.concatenate([[0], np.cumsum(index["sizes"])])
+            if self.codec == "raw":
+                data = np.memmap(chunk, dtype=np.uint8, mode="r")
+            else:
+                data = chunk.read_bytes()
+            for timestamp, start, end in zip(
+                index["timestamps"], offsets[:-1], offsets[1:]
+            ):
+                if first is None:
+                    first = float(timestamp)
+                yield self._decode(data[start:end]), float(timestamp) - first
+
+    def _decode(self, data) -> npt.NDArray[np.uint8]:
+        if self.codec == "raw":
+            return data.view(self.dtype).reshape(self.shape)
+        import simplejpeg
+
+        return simplejpeg.decode_jpeg(data, colorspace="BGR")
+
+
+def open_source(
+    spec: str,
+    realtime: bool = False,
+    loop: bool = False,
+    stream: str = "lores",
+) -> FrameSource:
+    """Opens "camera", "synthetic", a recording, a video or a directory of images.
+
+    "camera:N" opens another camera than the first one.
+    """
+    if spec == "camera":
+        return Picamera2Source(stream)
+    if spec.startswith("camera:") and spec[7:].isdigit():
+        return Picamera2Source(stream, int(spec[7:]))
+    if spec == "synthetic":
+        return SyntheticSource(realtime=realtime)
+    path = Path(spec)
+    if (path / "meta.json").exists():
+        return RecordingSource(path, realtime, loop)
+    if path.is_dir():
+        return ImageDirectorySource(path, realtime, loop)
+    if path.exists():
+        return VideoSource(path, realtime, loop)
+    raise ValueError(f"No such frame source: {spec}")
@@ -0,0 +1,93 @@
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+
+def process_started() -> float:
+    """time.monotonic() of when this process was started.
+
+    Includes the interpreter startup and the imports, which happen before any
+    of our code runs. Falls back to now where /proc isn't there.
+    """
+    try:
+        with open("/proc/self/stat") as stat:
+            # The command name may contain spaces, fields are counted after it
+            start_ticks = int(stat.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as uptime:
+            since_boot = float(uptime.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return time.monotonic()
+    age = since_boot - start_ticks / os.sysconf("SC_CLK_TCK")
+    return time.monotonic() - max(age, 0.0)
+
+
+def notify(state: str) -> bool:
+    """Sends a state like "READY=1" to systemd, returns whether it was delivered.
+
+    Does nothing unless the service runs with Type=notify.
+    """
+    try:
+        from systemd import daemon  # pyright: ignore[reportMissingImports]
+
+        return daemon.notify(state)
+    except ImportError:
+        pass
+
+    address = os.getenv("NOTIFY_SOCKET")
+    if not address:
+        return False
+    if address.startswith("@"):
+        # Abstract namespace socket
+        address = "\0" + address[1:]
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.connect(address)
+            sock.sendall(state.encode())
+        return True
+    except OSError:
+        return False
+
+
+class StartupProfile:
+    """Times the steps of starting the service, from when the process started.
+
+    Steps on different threads may overlap, e.g. loading the model while the
+    camera is configured.
+    """
+
+    def __init__(self, report: bool = False):
+        # Whether to print the profile once the first frame is processed
+        self.report = report
+        self.started = process_started()
+        self._steps: list[tuple[str, float, float]] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def step(self, name: str):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._add(name, start, time.monotonic())
+
+    def mark(self, name: str) -> None:
+        now = time.monotonic()
+        self._add(name, now, now)
+
+    def _add(self, name: str, start: float, end: float) -> None:
+        with self._lock:
+            self._steps.append((name, start - self.started, end - self.started))
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def format(self) -> str:
+        with self._lock:
+            steps = sorted(self._steps, key=lambda step: step[1])
+        lines = [f"{'step':<28}{'start':>8}{'end':>8}{'took':>8}"]
+        for name, start, end in steps:
+            lines.append(f"{name:<28}{start:>8.2f}{end:>8.2f}{end - start:>8.2f}")
+        return "\n".join(lines)
@@ -0,0 +1,373 @@
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+from enum import StrEnum, auto, unique
+from pathlib import Path
+from queue import Empty, Full, Queue
+
+from picamera2 import Picamera2  # pyright: ignore[reportMissingImports]
+from picamera2.encoders import H264Encoder  # pyright: ignore[reportMissingImports]
+from picamera2.outputs import Output, PyavOutput  # pyright: ignore[reportMissingImports]
+
+from solvrocam.metrics import Metrics
+
+
+@unique
+class StreamState(StrEnum):
+    CONNECTING = auto()
+    LIVE = auto()
+    DOWN = auto()
+    STOPPED = auto()
+
+
+def _wake(queue: Queue | None) -> None:
+    """Ends the connection thread reading `queue` without waiting for its timeout."""
+    if queue is not None:
+        try:
+            queue.put_nowait(None)
+        except Full:
+            pass
+
+
+class SegmentedFileOutput(Output):
+    """Writes the H.264 stream to files of about `seconds` each in `directory`.
+
+    Segments start on keyframes so each plays on its own, the oldest are
+    deleted once all of them take more than `max_bytes`.
+    """
+
+    def __init__(
+        self, directory: Path, seconds: float = 60.0, max_bytes: int = 1 << 30
+    ):
+        super().__init__()
+        self._directory = directory
+        self._seconds = seconds
+        self._max_bytes = max_bytes
+        self._file = None
+        self._started = 0.0
+
+    def start(self):
+        self._directory.mkdir(parents=True, exist_ok=True)
+        super().start()
+
+    def stop(self):
+        super().stop()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def outputframe(
+        self, frame, keyframe=True, timestamp=None, packet=None, audio=False
+    ):
+        if not self.recording or audio:
+            return
+        if keyframe and (
+            self._file is None or time.monotonic() - self._started >= self._seconds
+        ):
+            self._rotate()
+        if self._file is not None:
+            self._file.write(frame)
+
+    def _rotate(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        name = time.strftime("%Y%m%d-%H%M%S.h264")
+        self._file = open(self._directory / name, "wb")
+        self._started = time.monotonic()
+
+        segments = sorted(self._directory.glob("*.h264"))
+        sizes = [segment.stat().st_size for segment in segments]
+        total = sum(sizes)
+        for segment, size in zip(segments[:-1], sizes):
+            if total <= self._max_bytes:
+                break
+            segment.unlink()
+            total -= size
+
+
+class SupervisedOutput(Output):
+    """Sits between the encoder and an output that may fail, and replaces it.
+
+    The encoder only queues frames here, a connection thread writes them to
+    the real output, so a stalled network connection can't hold up the
+    encoder or the other outputs. The output is considered dead when it
+    reports an error or doesn't make progress on the queued frames for
+    `stall_timeout` seconds, it is then recreated with `factory` after an
+    exponential backoff.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        factory: Callable[[], Output],
+        logger: logging.Logger,
+        metrics: Metrics | None = None,
+        stall_timeout: float = 5.0,
+        max_backoff: float = 30.0,
+        queue_size: int = 120,
+    ):
+        super().__init__()
+        self.name = name
+        self._factory = factory
+        self._logger = logger
+        self._stall_timeout = stall_timeout
+        self._max_backoff = max_backoff
+        self._queue_size = queue_size
+
+        self._lock = threading.Lock()
+        self.state = StreamState.STOPPED
+        # Bumped for every connection, a replaced connection thread that
+        # wakes up late sees it's stale and gives up
+        self._generation = 0
+        self._queue: Queue | None = None
+        # Calls the encoder made to describe its streams, replayed on reconnects
+        self._streams: list[tuple[tuple, dict]] = []
+        self._failures = 0
+        self._retry_at = 0.0
+        self._waiting_for_keyframe = True
+        self._last_received = 0.0
+        self._last_progress = 0.0
+        self._last_pts: int | None = None
+
+        metrics = metrics or Metrics()
+        self._up = metrics.gauge(
+            "stream_up", "Whether the stream output is live", output=name
+        )
+        self._bytes = metrics.counter(
+            "stream_bytes_sent",
+            "Encoded bytes written to the stream output",
+            output=name,
+        )
+        self._dropped = metrics.counter(
+            "stream_frames_dropped",
+            "Encoded frames not written while the stream output was down",
+            output=name,
+        )
+        self._connects = metrics.counter(
+            "stream_connection_attempts",
+            "Times the stream output was (re)created",
+            output=name,
+        )
+
+    def _add_stream(self, encoder_stream, *args, **kwargs):
+        self._streams.append(((encoder_stream, *args), kwargs))
+
+    def start(self):
+        super().start()
+        # The encoder describes its streams again after every start
+        self._streams = []
+        with self._lock:
+            self._retry_at = 0.0
+            self.state = StreamState.DOWN
+
+    def stop(self):
+        super().stop()
+        with self._lock:
+            self._generation += 1
+            queue, self._queue = self._queue, None
+            self.state = StreamState.STOPPED
+        self._up.set(0)
+        _wake(queue)
+
+    def outputframe(
+        self, frame, keyframe=True, timestamp=None, packet=None, audio=False
+    ):
+        self._last_received = time.monotonic()
+        queue = self._queue
+        if queue is None or self.state != StreamState.LIVE:
+            self._dropped.inc()
+            return
+        if self._waiting_for_keyframe:
+            if not keyframe:
+                self._dropped.inc()
+                return
+            self._waiting_for_keyframe = False
+        try:
+            queue.put_nowait((frame, keyframe, timestamp, packet, audio))
+        except Full:
+            self._dropped.inc()
+
+    def check(self) -> None:
+        """Replaces the output if it died, called periodically by the supervisor."""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == StreamState.LIVE and (
+                self._last_received - self._last_progress > self._stall_timeout
+            ):
+                self._fail_locked("stalled")
+            if self.state != StreamState.DOWN or now < self._retry_at:
+                return
+            self._generation += 1
+            generation = self._generation
+            self.state = StreamState.CONNECTING
+        self._connects.inc()
+        threading.Thread(
+            target=self._connection, args=(generation,), daemon=True
+        ).start()
+
+    def _fail_locked(self, reason: str) -> None:
+        self._generation += 1
+        queue, self._queue = self._queue, None
+        _wake(queue)
+        self._failures += 1
+        delay = min(2.0 ** (self._failures - 1), self._max_backoff)
+        self._retry_at = time.monotonic() + delay
+        self.state = StreamState.DOWN
+        self._up.set(0)
+        self._logger.error(
+            f"Stream output {self.name} {reason}, reconnecting in {delay:.0f} seconds"
+        )
+
+    def _fail(self, generation: int, reason: str) -> None:
+        with self._lock:
+            if generation == self._generation:
+                self._fail_locked(reason)
+
+    def _connection(self, generation: int) -> None:
+        try:
+            output = self._factory()
+            if hasattr(output, "error_callback"):
+                output.error_callback = lambda e: self._fail(generation, f"failed: {e}")
+            output.start()
+            for args, kwargs in self._streams:
+                output._add_stream(*args, **kwargs)
+        except Exception as e:
+            self._fail(generation, f"failed to start: {e}")
+            return
+
+        queue: Queue = Queue(maxsize=self._queue_size)
+        with self._lock:
+            if generation != self._generation:
+                self._stop_output(output)
+                return
+            self._queue = queue
+            self._waiting_for_keyframe = True
+            self._last_progress = time.monotonic()
+            self._last_pts = None
+            self.state = StreamState.LIVE
+        self._up.set(1)
+        self._logger.info(f"Stream output {self.name} is live")
+
+        while generation == self._generation:
+            try:
+                item = queue.get(timeout=1)
+            except Empty:
+                continue
+            if item is None:
+                break
+            frame, keyframe, timestamp, packet, audio = item
+            try:
+                output.outputframe(frame, keyframe, timestamp, packet, audio)
+            except Exception as e:
+                self._fail(generation, f"failed: {e}")
+                break
+            if frame is not None:
+                self._bytes.inc(len(frame))
+            # Progress means the timestamps written keep moving forward
+            if timestamp is not None and (
+                self._last_pts is None or timestamp > self._last_pts
+            ):
+                self._last_pts = timestamp
+                self._last_progress = time.monotonic()
+                with self._lock:
+                    if generation == self._generation:
+                        self._failures = 0
+        self._stop_output(output)
+
+    def _stop_output(self, output: Output) -> None:
+        try:
+            output.stop()
+        except Exception as e:
+            self._logger.warning(f"Failed to close stream output {self.name}: {e}")
+
+
+def outputs_from_env(
+    logger: logging.Logger, metrics: Metrics | None = None
+) -> list[SupervisedOutput]:
+    """RTMP_SERVER streams to a server, STREAM_SEGMENTS records to a directory."""
+    outputs = []
+    rtmp_server = os.getenv("RTMP_SERVER")
+    if rtmp_server:
+        outputs.append(
+            SupervisedOutput(
+                "rtmp",
+                lambda: PyavOutput(rtmp_server, format="flv"),
+                logger,
+                metrics,
+            )
+        )
+    segments = os.getenv("STREAM_SEGMENTS")
+    if segments:
+        seconds = float(os.getenv("STREAM_SEGMENT_SECONDS", "60"))
+        max_bytes = int(os.getenv("STREAM_SEGMENTS_MB", "1024")) << 20
+        outputs.append(
+            SupervisedOutput(
+                "segments",
+                lambda: SegmentedFileOutput(Path(segments), seconds, max_bytes),
+                logger,
+                metrics,
+            )
+        )
+    return outputs
+
+
+class StreamSupervisor:
+    """Streams the encoded camera feed to several outputs and keeps them up.
+
+    The encoder runs as long as the camera, each output is checked every
+    `interval` seconds and reconnected on its own.
+    """
+
+    def __init__(
+        self,
+        picam2: Picamera2,
+        outputs: list[SupervisedOutput],
+        logger: logging.Logger,
+        interval: float = 1.0,
+        max_backoff: float = 30.0,
+    ):
+        self._picam2 = picam2
+        self.outputs = outputs
+        self._logger = logger
+        self._interval = interval
+        self._max_backoff = max_backoff
+        self._encoder = H264Encoder(repeat=True)
+
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._supervise, daemon=True)
+        self._thread.start()
+
+    def _supervise(self) -> None:
+        failures = 0
+        retry_at = 0.0
+        while not self._stopped.is_set():
+            if self._encoder not in self._picam2.encoders:
+                if time.monotonic() >= retry_at:
+                    try:
+                        self._picam2.start_encoder(self._encoder, self.outputs)
+                        failures = 0
+                        self._logger.info("Stream encoder started.")
+                    except Exception as e:
+                        failures += 1
+                        delay = min(2.0 ** (failures - 1), self._max_backoff)
+                        retry_at = time.monotonic() + delay
+                        self._logger.error(
+                            f"Failed to start the stream encoder: {e}. "
+                            f"Retrying in {delay:.0f} seconds..."
+                        )
+            else:
+                for output in self.outputs:
+                    output.check()
+            self._stopped.wait(self._interval)
+
+    @property
+    def states(self) -> dict[str, StreamState]:
+        return {output.name: output.state for output in self.outputs}
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+        if self._encoder in self._picam2.encoders:
+            self._picam2.stop_encoder(self._encoder)
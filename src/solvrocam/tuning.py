@@ -0,0 +1,230 @@
+import logging
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import cv2
+import numpy as np
+import typer
+import yaml
+from typing_extensions import Annotated
+
+from solvrocam.logs import setup_logging
+from solvrocam.person_trackers.person_tracker import (
+    default_tracker_config_path,
+    parse_frame_size,
+)
+from solvrocam.profiling import StageTimer
+
+app = typer.Typer()
+
+MODELS_DIR = Path(__file__).parent / "person_trackers" / "models"
+DEFAULT_SIZE = (864, 480)
+
+
+@dataclass
+class Variant:
+    # NCNN exports have a fixed network input, smaller inputs need their own
+    # export of the model
+    model: Path
+    precision: str
+    # Width, height the frames are downscaled to before detection
+    frame_size: tuple[int, int]
+
+    def __str__(self) -> str:
+        width, height = self.frame_size
+        return f"{self.model.name} {self.precision} {width}x{height}"
+
+
+def _parse_size(size: str) -> tuple[int, int]:
+    try:
+        return parse_frame_size(size.lower().split("x"))
+    except ValueError as e:
+        raise typer.BadParameter(f"Sizes are an even WIDTHxHEIGHT: {e}")
+
+
+def _count_people(variant: Variant, source: str, limit: int, warmup: int):
+    """Runs the variant over the clip, returns the counts and its timings."""
+    from solvrocam.person_trackers.ncnn_bytetracker import NCNNByteTracker
+    from solvrocam.sources import open_source
+
+    tracker = NCNNByteTracker(str(variant.model), precision=variant.precision)
+    tracker.warm_up()
+    frame_source = open_source(source)
+    timer = StageTimer()
+    counts = []
+    for index, frame in enumerate(frame_source):
+        if index >= limit:
+            break
+        if frame_source.frame_format == "YUV420":
+            frame = cv2.cvtColor(frame, cv2.COLOR_YUV2BGR_I420)
+        frame = cv2.resize(frame, variant.frame_size, interpolation=cv2.INTER_AREA)
+        start = time.perf_counter()
+        result = tracker.track_person(frame)
+        if index >= warmup:
+            timer.record("detection", time.perf_counter() - start)
+        counts.append(len(result.ids) if result.ids is not None else 0)
+    return np.array(counts), timer.summary().get("detection")
+
+
+@app.command()
+def tune(
+    source: Annotated[
+        str,
+        typer.Argument(help="Video, directory of frames or recording to tune on"),
+    ],
+    labels: Annotated[
+        Path | None,
+        typer.Option(
+            exists=True,
+            dir_okay=False,
+            help="People count of every frame, one per line. Without it the "
+            "counts of the current configuration are the reference",
+        ),
+    ] = None,
+    models: Annotated[
+        list[Path] | None,
+        typer.Option(
+            "--model",
+            "-m",
+            exists=True,
+            file_okay=False,
+            help="NCNN model directory to try, e.g. an int8 export, "
+            "by default all bundled models",
+        ),
+    ] = None,
+    sizes: Annotated[
+        list[str] | None,
+        typer.Option(
+            "--size",
+            "-s",
+            help="Frame WIDTHxHEIGHT to try detecting people at, only worth it "
+            "with a model exported for that input size",
+        ),
+    ] = None,
+    precisions: Annotated[
+        list[str] | None,
+        typer.Option("--precision", "-p", help="NCNN precision to try, fp16 or fp32"),
+    ] = None,
+    min_agreement: Annotated[
+        float,
+        typer.Option(help="Share of frames whose count must match the reference"),
+    ] = 0.95,
+    min_speedup: Annotated[
+        float,
+        typer.Option(
+            help="How much lower the p50 latency of a variant must be to replace "
+            "the current configuration, 0.1 is 10%"
+        ),
+    ] = 0.1,
+    limit: Annotated[
+        int,
+        typer.Option("--limit", "-n", help="Frames of the clip to use"),
+    ] = 300,
+    warmup: Annotated[
+        int,
+        typer.Option(help="Frames not measured after loading each variant"),
+    ] = 5,
+    output: Annotated[
+        Path | None,
+        typer.Option(
+            "--output",
+            "-o",
+            envvar="TRACKER_CONFIG",
+            dir_okay=False,
+            help="Where to write the winning configuration",
+        ),
+    ] = None,
+    dry_run: Annotated[
+        bool,
+        typer.Option(help="Only report, don't write the configuration"),
+    ] = False,
+):
+    """
+    Pick the fastest detector variant that counts like the reference.
+    """
+    logger = logging.getLogger(__name__)
+    setup_logging(logger)
+
+    output = output or default_tracker_config_path()
+    if output is None and not dry_run:
+        raise typer.BadParameter("Pass --output or set TRACKER_CONFIG")
+
+    model_dirs = models or sorted(
+        path.parent for path in MODELS_DIR.glob("*_ncnn_model/metadata.yaml")
+    )
+    frame_sizes = [_parse_size(size) for size in sizes] if sizes else [DEFAULT_SIZE]
+    precisions = precisions or ["fp16", "fp32"]
+    for precision in precisions:
+        if precision not in ("fp16", "fp32"):
+            raise typer.BadParameter(f"Unknown precision {precision}")
+
+    # The defaults come first, they give the reference counts without labels
+    baseline = Variant(MODELS_DIR / "yolo11n_ncnn_model", "fp16", DEFAULT_SIZE)
+    variants = [baseline] + [
+        variant
+        for model in model_dirs
+        for precision in precisions
+        for size in frame_sizes
+        if (variant := Variant(model, precision, size)) != baseline
+    ]
+
+    reference = None
+    if labels is not None:
+        reference = np.loadtxt(labels, dtype=int, ndmin=1)
+
+    results = []
+    for variant in variants:
+        logger.info(f"Measuring {variant}...")
+        counts, timings = _count_people(variant, source, limit, warmup)
+        if timings is None:
+            typer.echo(f"The clip needs more than {warmup} frames", err=True)
+            raise typer.Exit(code=1)
+        if reference is None:
+            reference = counts
+        frames = min(len(counts), len(reference))
+        errors = np.abs(counts[:frames] - reference[:frames])
+        results.append((variant, timings, float(np.mean(errors == 0)), errors.mean()))
+
+    typer.echo(f"{'variant':<36}{'p50 ms':>9}{'p95 ms':>9}{'agree':>8}{'mae':>7}")
+    for variant, timings, agreement, mae in results:
+        typer.echo(
+            f"{str(variant):<36}{timings['p50']:>9.2f}{timings['p95']:>9.2f}"
+            f"{agreement:>8.1%}{mae:>7.2f}"
+        )
+
+    candidates = [result for result in results if result[2] >= min_agreement]
+    if not candidates:
+        typer.echo(f"No variant agrees on {min_agreement:.0%} of frames", err=True)
+        raise typer.Exit(code=1)
+    winner, timings, agreement, _ = min(candidates, key=lambda result: result[1]["p50"])
+    typer.echo(f"Fastest matching variant: {winner} ({timings['p50']:.2f} ms)")
+    if results[0] in candidates and winner != baseline:
+        # Latencies of the same network input only differ by noise
+        baseline_p50 = results[0][1]["p50"]
+        if timings["p50"] > baseline_p50 * (1 - min_speedup):
+            typer.echo(
+                f"Less than {min_speedup:.0%} faster than {baseline} "
+                f"({baseline_p50:.2f} ms), keeping it"
+            )
+            winner, timings, agreement, _ = results[0]
+
+    if dry_run or output is None:
+        return
+    config = {
+        "model": str(winner.model.resolve()),
+        "precision": winner.precision,
+        "frame_size": list(winner.frame_size),
+    }
+    config["measured"] = {
+        "source": source,
+        "p50_ms": round(timings["p50"], 2),
+        "agreement": round(agreement, 4),
+    }
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(yaml.safe_dump(config, sort_keys=False))
+    typer.echo(f"Configuration written to {output}")
+
+
+if __name__ == "__main__":
+    app()
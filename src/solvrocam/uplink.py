@@ -0,0 +1,260 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+from queue import Empty, Full, Queue
+
+import numpy as np
+import numpy.typing as npt
+from requests import RequestException, Response, Session
+from requests.adapters import HTTPAdapter
+
+from solvrocam.metrics import Metrics
+
+
+def print_response(res: Response) -> str:
+    return "HTTP/1.1 {status_code}\n{headers}\n{body}".format(
+        status_code=res.status_code,
+        headers="\n".join("{}: {}".format(k, v) for k, v in res.headers.items()),
+        body=res.text,
+    )
+
+
+def default_outbox_dir() -> Path | None:
+    outbox = os.getenv("OUTBOX_DIR")
+    if outbox:
+        return Path(outbox)
+    if os.path.exists("/home/solvrocam/"):
+        return Path("/home/solvrocam/hardware-solvro-bot-office-cam/outbox")
+    return None
+
+
+@dataclass
+class Ping:
+    timestamp: str
+    count: int
+    # Name of the camera when the service runs several, they may share a URL
+    camera: str | None = None
+    # Encoded to JPEG on the uplink thread, so the processing loop never waits on it
+    frame: npt.NDArray[np.uint8] | None = None
+    image: bytes | None = None
+
+
+def _fields(ping: Ping) -> dict:
+    """The form fields of a ping, without its image."""
+    fields: dict = {"timestamp": ping.timestamp, "count": ping.count}
+    if ping.camera is not None:
+        fields["camera"] = ping.camera
+    return fields
+
+
+class CoreUplink:
+    """Sends pings to the core from a dedicated thread.
+
+    Pings that can't be delivered are written to the outbox directory and
+    replayed in order once the core is reachable again.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        logger: logging.Logger,
+        encode: Callable[[npt.NDArray[np.uint8]], bytes],
+        outbox_dir: Path | None = None,
+        queue_size: int = 4,
+        timeout: tuple[float, float] = (3.05, 10),
+        retries: int = 3,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        outbox_size: int = 1000,
+        metrics: Metrics | None = None,
+    ):
+        self._url = url
+        self._logger = logger
+        self._encode = encode
+        self._outbox_dir = outbox_dir
+        self._timeout = timeout
+        self._retries = retries
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._outbox_size = outbox_size
+
+        self._session = Session()
+        # One keep-alive connection is reused for every ping
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=0)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+        self._queue: Queue[Ping] = Queue(maxsize=queue_size)
+        self._stopped = threading.Event()
+        # While the core is unreachable, pings go straight to the outbox
+        self._core_down_until = 0.0
+        self._failures = 0
+
+        metrics = metrics or Metrics()
+        self._sent = metrics.counter("uplink_pings_sent", "Pings delivered to the core")
+        self._post_failures = metrics.counter(
+            "uplink_failures", "Failed attempts to reach the core"
+        )
+        self._dropped = metrics.counter(
+            "uplink_pings_dropped", "Pings lost to a full queue or outbox"
+        )
+        self._stored = metrics.counter(
+            "uplink_pings_stored", "Pings written to the outbox"
+        )
+        metrics.gauge(
+            "uplink_queue_depth", "Pings waiting to be sent", self._queue.qsize
+        )
+
+        if self._outbox_dir is not None:
+            self._outbox_dir.mkdir(parents=True, exist_ok=True)
+
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def send(self, ping: Ping) -> None:
+        """Queues a ping without blocking, dropping the oldest one if the queue is full."""
+        while True:
+            try:
+                self._queue.put_nowait(ping)
+                return
+            except Full:
+                try:
+                    dropped = self._queue.get_nowait()
+                    self._dropped.inc()
+                    self._logger.warning(
+                        f"Uplink queue full, dropping ping from {dropped.timestamp}"
+                    )
+                except Empty:
+                    pass
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stopped.set()
+        self._thread.join(timeout)
+        # Whatever didn't make it out is kept for the next run
+        while True:
+            try:
+                self._store(self._queue.get_nowait())
+            except Empty:
+                break
+        self._session.close()
+
+    def _worker(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                ping = self._queue.get(timeout=1)
+            except Empty:
+                if time.monotonic() >= self._core_down_until:
+                    self._drain_outbox()
+                continue
+
+            if ping.frame is not None:
+                ping.image = self._encode(ping.frame)
+                ping.frame = None
+
+            if time.monotonic() < self._core_down_until:
+                self._store(ping)
+            elif self._deliver(ping):
+                self._drain_outbox()
+            else:
+                self._store(ping)
+
+    def _deliver(self, ping: Ping) -> bool:
+        for attempt in range(self._retries):
+            if self._post(ping):
+                self._sent.inc()
+                self._failures = 0
+                self._core_down_until = 0.0
+                return True
+            if attempt < self._retries - 1 and self._stopped.wait(
+                self._backoff * 2**attempt
+            ):
+                break
+
+        self._failures += 1
+        delay = min(
+            self._backoff * 2 ** (self._retries + self._failures), self._max_backoff
+        )
+        self._core_down_until = time.monotonic() + delay
+        self._logger.warning(f"Core unreachable, retrying in {delay:.0f} seconds")
+        return False
+
+    def _post(self, ping: Ping) -> bool:
+        data = _fields(ping)
+        files = None
+        if ping.image is not None:
+            files = {"file": ("image.jpeg", ping.image, "image/jpeg")}
+        self._logger.info(f"Pinging core:\n{data | {'file': files is not None}}\n")
+
+        try:
+            res = self._session.post(
+                self._url, data=data, files=files, timeout=self._timeout
+            )
+        except RequestException as e:
+            self._logger.error(f"Failed to ping core: {e}")
+            self._post_failures.inc()
+            return False
+
+        self._logger.debug(print_response(res))
+        if res.status_code >= 500:
+            self._logger.error(f"Core responded with {res.status_code}")
+            self._post_failures.inc()
+            return False
+        if res.status_code >= 400:
+            # Retrying won't fix a rejected request, drop it
+            self._logger.error(f"Core rejected ping with {res.status_code}")
+        return True
+
+    def _store(self, ping: Ping) -> None:
+        if self._outbox_dir is None:
+            self._logger.warning(f"No outbox, dropping ping from {ping.timestamp}")
+            self._dropped.inc()
+            return
+        if ping.frame is not None:
+            ping.image = self._encode(ping.frame)
+            ping.frame = None
+
+        name = f"{time.time_ns()}"
+        if ping.image is not None:
+            (self._outbox_dir / f"{name}.jpeg").write_bytes(ping.image)
+        (self._outbox_dir / f"{name}.json").write_text(json.dumps(_fields(ping)))
+        self._stored.inc()
+
+        entries = sorted(self._outbox_dir.glob("*.json"))
+        for entry in entries[: max(len(entries) - self._outbox_size, 0)]:
+            self._remove(entry)
+            self._dropped.inc()
+
+    def _remove(self, entry: Path) -> None:
+        entry.unlink(missing_ok=True)
+        entry.with_suffix(".jpeg").unlink(missing_ok=True)
+
+    def _drain_outbox(self) -> None:
+        if self._outbox_dir is None:
+            return
+        for entry in sorted(self._outbox_dir.glob("*.json")):
+            if self._stopped.is_set() or not self._queue.empty():
+                # Live pings take priority over the backlog
+                return
+            try:
+                data = json.loads(entry.read_text())
+            except (OSError, ValueError) as e:
+                self._logger.error(f"Dropping unreadable outbox entry {entry}: {e}")
+                self._remove(entry)
+                continue
+
+            image_path = entry.with_suffix(".jpeg")
+            image = image_path.read_bytes() if image_path.exists() else None
+            ping = Ping(
+                timestamp=data["timestamp"],
+                count=data["count"],
+                camera=data.get("camera"),
+                image=image,
+            )
+            if not self._deliver(ping):
+                return
+            self._remove(entry)
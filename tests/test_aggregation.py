@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from solvrocam.aggregation import OccupancyAggregator
+
+
+def test_statistics_match_numpy_over_the_window():
+    counts = np.random.default_rng(0).integers(0, 8, 500)
+    aggregator = OccupancyAggregator({"minute": 60})
+    for second, count in enumerate(counts):
+        aggregator.add(int(count), timestamp=float(second))
+
+    # Samples older than a minute have left the window
+    window = counts[-60:]
+    assert aggregator.last == counts[-1]
+    for q in (0, 25, 50, 95, 100):
+        assert aggregator.percentile("minute", q) == pytest.approx(
+            np.percentile(window, q)
+        )
+    assert aggregator.median("minute") == pytest.approx(np.median(window))
+    assert aggregator.max("minute") == window.max()
+    assert aggregator.mean("minute") == pytest.approx(window.mean())
+
+
+def test_windows_share_the_samples():
+    aggregator = OccupancyAggregator({"minute": 60, "hour": 3600}, capacity=8)
+    assert aggregator.median("hour") is None
+
+    for second, count in enumerate([9, 1, 1, 1]):
+        aggregator.add(count, timestamp=second * 30.0)
+
+    assert aggregator.max("minute") == 1
+    assert aggregator.max("hour") == 9
+
+    # Overwritten slots leave the hour window too
+    for second in range(4, 12):
+        aggregator.add(2, timestamp=second * 30.0)
+    assert aggregator.max("hour") == 2
@@ -0,0 +1,120 @@
+import logging
+
+import pytest
+
+from solvrocam.governor import LEVELS, Governor, cpu_load, read_temperature
+
+BUDGET = 0.25
+
+
+class FakeSystem:
+    """A fake /sys/class/thermal tree and CPU load for the governor."""
+
+    def __init__(self, root):
+        self.root = root
+        self.load = 0.0
+        self.set_temperature(50.0)
+
+    def set_temperature(self, celsius: float, zone: int = 0) -> None:
+        path = self.root / f"thermal_zone{zone}" / "temp"
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(f"{round(celsius * 1000)}\n")
+
+    def governor(self, **kwargs) -> Governor:
+        return Governor(
+            logging.getLogger("test"),
+            budget=BUDGET,
+            thermal_root=self.root,
+            load=lambda: self.load,
+            **kwargs,
+        )
+
+
+@pytest.fixture
+def system(tmp_path):
+    return FakeSystem(tmp_path)
+
+
+def run(governor: Governor, seconds: float, processing: float, start: float):
+    """Feeds a frame every 0.1 seconds, returns the level changes and the end time."""
+    changes = []
+    frames = round(seconds * 10)
+    for frame in range(frames):
+        now = round(start + frame / 10, 1)
+        if governor.record(processing, now) is not None:
+            changes.append((now, governor.index))
+    return changes, round(start + frames / 10, 1)
+
+
+def test_read_temperature_takes_the_hottest_zone(system):
+    system.set_temperature(61.5, zone=1)
+    (system.root / "thermal_zone2").mkdir()
+    (system.root / "thermal_zone2" / "temp").write_text("not a number\n")
+
+    assert read_temperature(system.root) == 61.5
+    assert read_temperature(system.root / "missing") is None
+
+
+def test_cpu_load_counts_runnable_tasks(tmp_path, monkeypatch):
+    monkeypatch.setattr("os.cpu_count", lambda: 4)
+    stat = tmp_path / "stat"
+    stat.write_text("cpu  1 2 3 4\nprocs_running 7\nprocs_blocked 0\n")
+
+    # The reading thread doesn't count
+    assert cpu_load(stat) == 1.5
+
+
+def test_stays_at_full_quality_within_the_limits(system):
+    governor = system.governor()
+    changes, _ = run(governor, 60, BUDGET / 2, 0.0)
+
+    assert changes == []
+    assert governor.level == LEVELS[0]
+
+
+def test_steps_down_once_per_hold_while_over_budget(system):
+    governor = system.governor(hold=10)
+    changes, _ = run(governor, 25, BUDGET * 2, 0.0)
+
+    assert changes == [(1.0, 1), (11.0, 2), (21.0, 3)]
+
+
+def test_steps_back_up_after_recovering(system):
+    governor = system.governor(hold=10, recover=30)
+    _, now = run(governor, 2, BUDGET * 2, 0.0)
+    assert governor.index == 1
+
+    changes, now = run(governor, 29, BUDGET / 2, now)
+    assert changes == []
+    changes, _ = run(governor, 5, BUDGET / 2, now)
+    assert [index for _, index in changes] == [0]
+
+
+def test_steps_down_when_hot_and_up_only_after_cooling(system):
+    governor = system.governor(max_temperature=75, hysteresis=5, recover=30)
+    system.set_temperature(80.0)
+    changes, now = run(governor, 2, BUDGET / 2, 0.0)
+    assert [index for _, index in changes] == [1]
+    assert governor.temperature == 80.0
+
+    # Below the maximum but within the hysteresis
+    system.set_temperature(72.0)
+    changes, now = run(governor, 60, BUDGET / 2, now)
+    assert changes == []
+
+    system.set_temperature(65.0)
+    changes, _ = run(governor, 35, BUDGET / 2, now)
+    assert [index for _, index in changes] == [0]
+
+
+def test_load_steps_down_and_settles_before_the_next_step(system):
+    governor = system.governor(max_load=1.5, hold=10)
+    system.load = 3.0
+    changes, now = run(governor, 2, BUDGET / 2, 0.0)
+    assert [index for _, index in changes] == [1]
+
+    # The step took effect, the smoothed load follows before the hold is over
+    system.load = 1.0
+    changes, _ = run(governor, 60, BUDGET / 2, now)
+    assert changes == []
+    assert governor.load == pytest.approx(1.0, abs=0.05)
@@ -0,0 +1,44 @@
+from datetime import datetime
+
+import pytest
+from requests import Session
+from typer.testing import CliRunner
+
+from solvrocam.history import HistoryStore, app
+
+START = datetime(2026, 10, 1, 8, 0)
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = tmp_path / "history.sqlite3"
+    store = HistoryStore(path)
+    second = int(START.timestamp())
+    store.add([(second, 0), (second + 1, 2), (second + 2, 2), (second + 3, 1)])
+    store.close()
+    return path
+
+
+def test_backfill_dry_run_only_prints_the_pings(database, monkeypatch):
+    posted = []
+    monkeypatch.setattr(Session, "post", lambda self, *args, **kwargs: posted.append(1))
+
+    result = CliRunner().invoke(
+        app,
+        [
+            "backfill",
+            "--dry-run",
+            "--database",
+            str(database),
+            "--since",
+            START.isoformat(sep=" "),
+            "--until",
+            "2026-10-01 08:01:00",
+        ],
+        # Set on the camera
+        env={"CORE_URL": "http://127.0.0.1:9/"},
+    )
+
+    assert result.exit_code == 0, result.output
+    assert posted == []
+    assert [line.split()[-1] for line in result.output.splitlines()] == ["0", "2", "1"]
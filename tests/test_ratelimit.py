@@ -0,0 +1,246 @@
+import pytest
+
+from solvrocam.ratelimit import (
+    Debouncer,
+    KeyedLimiter,
+    Throttle,
+    TokenBucket,
+    debounce,
+)
+
+
+class FakeTime:
+    """A clock and a scheduler whose timers only fire when the clock advances."""
+
+    def __init__(self):
+        self.now = 0.0
+        self._timers: list[list] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def schedule(self, delay: float, callback):
+        timer = [self.now + delay, callback, False]
+        self._timers.append(timer)
+
+        def cancel():
+            timer[2] = True
+
+        return cancel
+
+    @property
+    def pending(self) -> int:
+        return sum(not cancelled for _, _, cancelled in self._timers)
+
+    def advance(self, seconds: float) -> None:
+        end = self.now + seconds
+        while True:
+            due = [t for t in self._timers if not t[2] and t[0] <= end]
+            if not due:
+                break
+            timer = min(due, key=lambda t: t[0])
+            self._timers.remove(timer)
+            self.now = max(self.now, timer[0])
+            timer[1]()
+        self.now = end
+
+
+@pytest.fixture
+def time():
+    return FakeTime()
+
+
+class Calls(list):
+    def __call__(self, *args):
+        self.append(args)
+        return len(self)
+
+
+def test_debouncer_runs_the_last_call_once_the_burst_is_over(time):
+    calls = Calls()
+    debounced = Debouncer(calls, wait=1.0, schedule=time.schedule)
+    for value in range(3):
+        debounced(value)
+        time.advance(0.5)
+    assert calls == []
+
+    time.advance(0.5)
+    assert calls == [(2,)]
+    assert time.pending == 0
+
+
+def test_debouncer_leading_edge(time):
+    calls = Calls()
+    debounced = Debouncer(
+        calls, wait=1.0, leading=True, trailing=False, schedule=time.schedule
+    )
+    assert debounced("a") == 1
+    time.advance(0.5)
+    assert debounced("b") is None
+    time.advance(1.0)
+    debounced("c")
+
+    assert calls == [("a",), ("c",)]
+
+
+def test_debouncer_single_call_with_both_edges_runs_once(time):
+    calls = Calls()
+    debounced = Debouncer(
+        calls, wait=1.0, leading=True, trailing=True, schedule=time.schedule
+    )
+    debounced("a")
+    time.advance(2.0)
+
+    assert calls == [("a",)]
+
+
+def test_debouncer_cancel_and_flush(time):
+    calls = Calls()
+    debounced = Debouncer(calls, wait=1.0, schedule=time.schedule)
+    debounced("dropped")
+    debounced.cancel()
+    time.advance(2.0)
+    assert calls == []
+
+    debounced("flushed")
+    debounced.flush()
+    assert calls == [("flushed",)]
+    time.advance(2.0)
+    assert calls == [("flushed",)]
+
+
+def test_debounce_decorator_is_per_instance(time):
+    class Sensor:
+        def __init__(self, name):
+            self.name = name
+            self.reports = []
+
+        @debounce(1.0, schedule=time.schedule)
+        def report(self, value):
+            self.reports.append((self.name, value))
+
+    first, second = Sensor("first"), Sensor("second")
+    first.report(1)
+    second.report(2)
+    time.advance(1.0)
+
+    assert first.reports == [("first", 1)]
+    assert second.reports == [("second", 2)]
+
+
+def test_throttle_drops_calls_within_the_interval(time):
+    calls = Calls()
+    throttled = Throttle(calls, interval=1.0, clock=time, schedule=time.schedule)
+    throttled("a")
+    time.advance(0.5)
+    throttled("b")
+    time.advance(0.5)
+    throttled("c")
+
+    assert calls == [("a",), ("c",)]
+    assert time.pending == 0
+
+
+def test_throttle_trailing_edge_runs_the_latest_call(time):
+    calls = Calls()
+    throttled = Throttle(
+        calls, interval=1.0, trailing=True, clock=time, schedule=time.schedule
+    )
+    throttled("a")
+    time.advance(0.3)
+    throttled("b")
+    time.advance(0.3)
+    throttled("c")
+    assert calls == [("a",)]
+
+    # Fires when the interval since "a" is over, with the latest arguments
+    time.advance(0.4)
+    assert calls == [("a",), ("c",)]
+
+    # The trailing call starts a new interval
+    time.advance(0.5)
+    throttled("d")
+    assert calls == [("a",), ("c",)]
+    time.advance(0.5)
+    assert calls == [("a",), ("c",), ("d",)]
+
+
+def test_throttle_flush_runs_the_pending_call(time):
+    calls = Calls()
+    throttled = Throttle(
+        calls, interval=1.0, trailing=True, clock=time, schedule=time.schedule
+    )
+    throttled("a")
+    throttled("b")
+    throttled.flush()
+    assert calls == [("a",), ("b",)]
+
+    time.advance(5.0)
+    assert calls == [("a",), ("b",)]
+
+
+def test_throttle_ready_tells_whether_a_call_runs_now(time):
+    calls = Calls()
+    throttled = Throttle(
+        calls, interval=1.0, trailing=True, clock=time, schedule=time.schedule
+    )
+    assert throttled.ready()
+    throttled("a")
+    assert not throttled.ready()
+
+    time.advance(1.0)
+    assert throttled.ready()
+    throttled("b")
+    throttled("c")
+    assert calls == [("a",), ("b",)]
+    # "c" waits for the interval, then starts a new one
+    time.advance(1.0)
+    assert calls == [("a",), ("b",), ("c",)]
+    assert not throttled.ready()
+
+
+def test_token_bucket_bursts_and_refills(time):
+    bucket = TokenBucket(rate=2.0, capacity=3, clock=time)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+    assert bucket.delay() == pytest.approx(0.5)
+
+    time.advance(0.5)
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+    # Never refills past the capacity
+    time.advance(60)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+
+def test_token_bucket_acquire_gives_up_before_the_timeout(time):
+    bucket = TokenBucket(rate=1.0, capacity=1, clock=time)
+    assert bucket.acquire()
+    # A token is a second away, waiting half a second can't get it
+    assert not bucket.acquire(timeout=0.5)
+
+
+def test_keyed_limiter_limits_keys_separately(time):
+    limiter: KeyedLimiter[str] = KeyedLimiter(
+        lambda: TokenBucket(rate=1.0, capacity=1, clock=time)
+    )
+    assert limiter.try_acquire("a")
+    assert not limiter.try_acquire("a")
+    assert limiter.try_acquire("b")
+
+    time.advance(1.0)
+    assert limiter.try_acquire("a")
+
+
+def test_keyed_limiter_forgets_the_least_recently_used_key(time):
+    limiter: KeyedLimiter[str] = KeyedLimiter(
+        lambda: TokenBucket(rate=1.0, capacity=1, clock=time), max_keys=2
+    )
+    assert limiter.try_acquire("a")
+    assert limiter.try_acquire("b")
+    assert not limiter.try_acquire("a")
+    # "b" is now the least recently used and makes room for "c"
+    assert limiter.try_acquire("c")
+
+    assert limiter.try_acquire("b")
+    assert not limiter.try_acquire("c")
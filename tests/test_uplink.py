@@ -0,0 +1,192 @@
+import json
+import logging
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import default
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import numpy as np
+import pytest
+
+from solvrocam.uplink import CoreUplink, Ping
+
+logger = logging.getLogger(__name__)
+
+
+def wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for the uplink")
+        time.sleep(0.01)
+
+
+class StubCore:
+    """HTTP server answering pings with `status`, or the next of `statuses`."""
+
+    def __init__(self):
+        self.status = 200
+        self.statuses: list[int] = []
+        # Called with the fields of every request before it is answered
+        self.on_request = lambda fields: None
+        # Form fields of every request and the status it got
+        self.requests: list[tuple[dict, int]] = []
+        core = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                fields = core._parse(self.headers["Content-Type"], body)
+                status = core.statuses.pop(0) if core.statuses else core.status
+                core.on_request(fields)
+                core.requests.append((fields, status))
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_port}/office/camera"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    @property
+    def delivered(self) -> list[dict]:
+        return [fields for fields, status in self.requests if status < 400]
+
+    def _parse(self, content_type: str, body: bytes) -> dict:
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            return {key: values[0] for key, values in parse_qs(body.decode()).items()}
+        message = BytesParser(policy=default).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body
+        )
+        return {
+            part.get_param("name", header="content-disposition"): part.get_content()
+            for part in message.iter_parts()
+        }
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def core():
+    core = StubCore()
+    yield core
+    core.stop()
+
+
+def uplink(url: str, **kwargs) -> CoreUplink:
+    kwargs.setdefault("backoff", 0.01)
+    kwargs.setdefault("max_backoff", 0.05)
+    return CoreUplink(url, logger, lambda frame: b"jpeg", **kwargs)
+
+
+def test_delivers_ping_with_encoded_still(core):
+    sender = uplink(core.url)
+    sender.send(Ping(timestamp="t1", count=2, frame=np.zeros((4, 4, 3), np.uint8)))
+    wait_for(lambda: core.delivered)
+    sender.stop()
+
+    assert core.delivered == [{"timestamp": "t1", "count": "2", "file": b"jpeg"}]
+
+
+def test_ping_names_its_camera_through_the_outbox(core, tmp_path):
+    core.statuses = [503]
+    sender = uplink(core.url, outbox_dir=tmp_path, retries=1)
+    sender.send(Ping(timestamp="t1", count=1, camera="kitchen"))
+    wait_for(lambda: core.delivered)
+    sender.stop()
+
+    assert core.delivered == [{"timestamp": "t1", "count": "1", "camera": "kitchen"}]
+
+
+def test_retries_server_errors(core):
+    core.statuses = [500, 503]
+    sender = uplink(core.url, retries=3)
+    sender.send(Ping(timestamp="t1", count=1))
+    wait_for(lambda: core.delivered)
+    sender.stop()
+
+    assert [status for _, status in core.requests] == [500, 503, 200]
+
+
+def test_rejected_ping_is_not_retried(core, tmp_path):
+    core.status = 400
+    sender = uplink(core.url, outbox_dir=tmp_path)
+    sender.send(Ping(timestamp="t1", count=1))
+    wait_for(lambda: core.requests)
+    sender.stop()
+
+    assert len(core.requests) == 1
+    assert not list(tmp_path.iterdir())
+
+
+def test_outbox_is_replayed_in_order_once_core_is_back(core, tmp_path):
+    core.status = 503
+    sender = uplink(core.url, outbox_dir=tmp_path, retries=1)
+    for count in range(3):
+        sender.send(Ping(timestamp=f"t{count}", count=count))
+        wait_for(lambda n=count + 1: len(list(tmp_path.glob("*.json"))) == n)
+    entries = sorted(tmp_path.glob("*.json"))
+    assert [json.loads(entry.read_text())["count"] for entry in entries] == [0, 1, 2]
+
+    core.status = 200
+    wait_for(lambda: len(core.delivered) == 3)
+    wait_for(lambda: not list(tmp_path.iterdir()))
+    sender.stop()
+
+    assert [fields["timestamp"] for fields in core.delivered] == ["t0", "t1", "t2"]
+
+
+def test_live_ping_goes_out_before_the_rest_of_the_outbox(core, tmp_path):
+    for index in range(3):
+        (tmp_path / f"{index}.json").write_text(
+            json.dumps({"timestamp": f"old{index}", "count": index})
+        )
+    sender = uplink(core.url, outbox_dir=tmp_path)
+
+    def queue_live_ping(fields):
+        if fields["timestamp"] == "old0":
+            sender.send(Ping(timestamp="live", count=1))
+
+    # Draining pauses between entries while a live ping waits
+    core.on_request = queue_live_ping
+    wait_for(lambda: len(core.delivered) == 4)
+    sender.stop()
+
+    assert [fields["timestamp"] for fields in core.delivered] == [
+        "old0",
+        "live",
+        "old1",
+        "old2",
+    ]
+
+
+def test_failed_live_ping_is_queued_behind_the_outbox(core, tmp_path):
+    (tmp_path / "1.json").write_text(json.dumps({"timestamp": "old", "count": 5}))
+    core.statuses = [503]
+    sender = uplink(core.url, outbox_dir=tmp_path, retries=1)
+    sender.send(Ping(timestamp="live", count=1))
+    wait_for(lambda: len(core.delivered) == 2)
+    sender.stop()
+
+    # The live ping failed once and went to the outbox after the old one
+    assert [fields["timestamp"] for fields in core.delivered] == ["old", "live"]
+
+
+def test_stop_keeps_undelivered_pings(tmp_path):
+    # Nothing listens there, every attempt fails
+    sender = uplink("http://127.0.0.1:9/office/camera", outbox_dir=tmp_path, backoff=10)
+    for count in range(3):
+        sender.send(Ping(timestamp=f"t{count}", count=count))
+    sender.stop()
+
+    counts = [
+        json.loads(entry.read_text())["count"] for entry in tmp_path.glob("*.json")
+    ]
+    assert sorted(counts) == [0, 1, 2]